@@ -0,0 +1,264 @@
+"""
+Rebuilds the stored monthly and yearly counts from the full history of the sources.
+
+Usage:
+    python backfill.py [--regions US Europe Russia China] [--since YEAR] [--jobs N] [--restart] [--from-events]
+
+The history of every region is split into years that are crawled concurrently, at most
+--jobs at a time, and counted while the pages stream in. Finished years are checkpointed
+in items/cache/backfill, so an interrupted backfill continues where it stopped; --restart
+discards the checkpoint. Months and years found in the sources replace the stored values,
+years the sources do not cover (seeded by hand) are kept.
+
+Crawled rows are appended to the IPO event store as well. With --from-events nothing is
+crawled: the counts are rebuilt from the events stored by earlier crawls, a local query.
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import time
+from typing import AsyncIterator
+
+import pandas as pd
+import pendulum
+from loguru import logger
+
+from main import REGIONS, build_parsers, open_store
+from src import AggregateStore, Config, DataValidator, EntityIndex, EventStore, HttpTransport, ResponseCache, RunCheckpoint
+
+
+class BackfillProgress:
+    def __init__(self, total: int, done: int) -> None:
+        self.total = total
+        self.done = done
+        self._restored = done
+        self._started = time.perf_counter()
+
+    def advance(self, region: str, year: int, quantity: int) -> None:
+        self.done += 1
+        elapsed = time.perf_counter() - self._started
+        crawled = self.done - self._restored
+        left = (self.total - self.done) * elapsed / crawled
+        logger.info(
+            f'Backfill {self.done}/{self.total} ({self.done / self.total:.0%}): {region} {year} - {quantity} IPOs, '
+            f'{elapsed:.0f} s elapsed, ~{left:.0f} s left.'
+        )
+
+
+async def deduplicated(batches: AsyncIterator[pd.DataFrame],
+                       entities: EntityIndex,
+                       source: str,
+                       region: str
+                       ) -> AsyncIterator[pd.DataFrame]:
+
+    async for batch in batches:
+        batch = batch[entities.add_frame(source, region, batch)]
+        if not batch.empty:
+            yield batch.reset_index(drop=True)
+
+
+async def recorded(batches: AsyncIterator[pd.DataFrame],
+                   events: EventStore,
+                   source: str,
+                   region: str
+                   ) -> AsyncIterator[pd.DataFrame]:
+
+    async for batch in batches:
+        events.append(source, region, batch)
+        yield batch
+
+
+async def crawl_year(parser,
+                     validator: DataValidator,
+                     region: str,
+                     year: int,
+                     events: EventStore | None = None,
+                     entities: EntityIndex | None = None
+                     ) -> pd.DataFrame:
+
+    today = pendulum.now('Europe/Moscow').date()
+    since = pendulum.date(year, 1, 1)
+    until = min(pendulum.date(year, 12, 31), today)
+
+    batches = parser.iter_batches(since=since, until=until)
+    if entities is not None:
+        batches = deduplicated(batches, entities, parser.SOURCE, region)
+    if events is not None:
+        batches = recorded(batches, events, parser.SOURCE, region)
+    counts = await validator.validate_batches(batches, parser.SOURCE)
+
+    # Sources crawling several countries keep only the region's own
+    if 'Country' in counts.columns:
+        counts = validator.split_by_country(counts).get(region, counts.iloc[0:0].drop(columns='Country'))
+
+    return counts
+
+
+async def backfill_units(units: list[tuple[str, int]],
+                         parsers: dict,
+                         validator: DataValidator,
+                         checkpoint: RunCheckpoint,
+                         jobs: int,
+                         events: EventStore | None = None,
+                         entities: EntityIndex | None = None
+                         ) -> dict[str, list[pd.DataFrame]]:
+
+    counts = {region: [] for region, _ in units}
+    pending = []
+    for region, year in units:
+        if checkpoint.is_done('validated', f'{region}:{year}'):
+            counts[region].append(checkpoint.load_frame(f'validated_{region}_{year}'))
+        else:
+            pending.append((region, year))
+
+    progress = BackfillProgress(total=len(units), done=len(units) - len(pending))
+    logger.info(f'Backfill of {len(units)} years, {len(units) - len(pending)} taken from the checkpoint.')
+
+    semaphore = asyncio.Semaphore(jobs)
+
+    async def run(region: str, year: int) -> None:
+        async with semaphore:
+            try:
+                df = await crawl_year(parsers[region], validator, region, year, events, entities)
+            except Exception as e:
+                logger.error(f'Backfill of {region} {year} failed, it is retried on the next run: {e}')
+                return
+        checkpoint.save_frame(f'validated_{region}_{year}', df)
+        checkpoint.mark_done('parsed', f'{region}:{year}')
+        checkpoint.mark_done('validated', f'{region}:{year}')
+        counts[region].append(df)
+        progress.advance(region, year, int(df['Quantity'].sum()))
+
+    await asyncio.gather(*(run(region, year) for region, year in pending))
+
+    return counts
+
+
+def rebuild_region(region: str,
+                   frames: list[pd.DataFrame],
+                   store: AggregateStore
+                   ) -> None:
+
+    counts = pd.concat(frames, axis=0, ignore_index=True) if frames else pd.DataFrame(columns=['Year', 'Month', 'Quantity'])
+    counts = counts[counts['Quantity'] > 0]
+    if counts.empty:
+        logger.warning(f'Backfill found no IPOs for {region} region, its stored counts are kept.')
+        return
+
+    # Only years with IPOs in the sources are replaced, years seeded by hand stay as they are
+    year_counts = counts[['Year', 'Quantity']].groupby('Year').sum().reset_index()
+    with store.transaction():
+        month_report = store.upsert(region, 'month', counts)
+        year_report = store.upsert(region, 'year', year_counts)
+
+    logger.info(
+        f'Backfill of {region} region rebuilt {len(counts)} months ({month_report.summary()}) and '
+        f'{len(year_counts)} years ({year_report.summary()}), {year_counts["Year"].min()}-{year_counts["Year"].max()}.'
+    )
+
+
+def rebuild_from_events(config: Config, regions: list[str], since: int | None) -> None:
+
+    store = open_store(config)
+    events = EventStore(config.get_store_path())
+    # Only the sources of the regions are needed, nothing is crawled
+    parsers = build_parsers(config, transport=None)
+
+    logger.info('START: Backfill from the IPO events.')
+
+    for region in regions:
+        counts = events.month_counts(parsers[region].SOURCE, region, since_year=since)
+        rebuild_region(region, [counts], store)
+
+    events.close()
+    store.close()
+
+    logger.info('END: Backfill from the IPO events.')
+
+
+async def backfill(regions: list[str], since: int | None, jobs: int | None, restart: bool) -> None:
+
+    config = Config()
+    parsing_settings = config.get_parsing_settings()
+    backfill_settings = parsing_settings.get('backfill', dict())
+
+    checkpoint_dir = os.path.join(config.get_cache_dir(), 'backfill')
+    if restart:
+        shutil.rmtree(checkpoint_dir, ignore_errors=True)
+    checkpoint = RunCheckpoint(checkpoint_dir, run_id='backfill')
+
+    cache_settings = dict(parsing_settings.get('cache', dict()))
+    if cache_settings.pop('enabled', False):
+        response_cache = ResponseCache(os.path.join(config.get_cache_dir(), 'http'), **cache_settings)
+    else:
+        response_cache = None
+    transport = HttpTransport(settings=parsing_settings.get('transport'), cache=response_cache, checkpoint=checkpoint)
+
+    parsers = build_parsers(config, transport)
+    validator = DataValidator()
+    store = open_store(config)
+    events_settings = dict(parsing_settings.get('events', dict()))
+    if events_settings.pop('enabled', False):
+        events = EventStore(config.get_store_path(), **events_settings)
+    else:
+        events = None
+    # One index for all years and regions, so the IPOs listed by several sources are reported
+    dedup_settings = dict(parsing_settings.get('dedup', dict()))
+    if dedup_settings.pop('enabled', False):
+        entities = EntityIndex(**dedup_settings)
+    else:
+        entities = None
+
+    current_year = pendulum.now('Europe/Moscow').year
+    start_years = backfill_settings.get('start_years', dict())
+    units = [
+        (region, year)
+        for region in regions
+        for year in range(since or start_years.get(region, current_year), current_year + 1)
+    ]
+
+    logger.info('START: Backfill.')
+
+    try:
+        counts = await backfill_units(units, parsers, validator, checkpoint, jobs or backfill_settings.get('jobs', 4), events, entities)
+    finally:
+        await transport.aclose()
+    transport.log_stats()
+    if entities is not None:
+        entities.log_report()
+
+    for region in regions:
+        years = [year for unit_region, year in units if unit_region == region]
+        item = f'{region}:{years[0]}-{years[-1]}'
+        if checkpoint.is_done('aggregated', item):
+            continue
+        if not all(checkpoint.is_done('validated', f'{region}:{year}') for year in years):
+            logger.warning(f'Backfill of {region} region is incomplete, run it again to finish.')
+            continue
+        rebuild_region(region, counts[region], store)
+        checkpoint.mark_done('aggregated', item)
+    if events is not None:
+        events.close()
+    store.close()
+
+    logger.info('END: Backfill.')
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--regions', nargs='+', choices=list(REGIONS), default=list(REGIONS), help='Regions to rebuild.')
+    arg_parser.add_argument('--since', type=int, default=None, help='First year crawled, the start year of every source by default.')
+    arg_parser.add_argument('--jobs', type=int, default=None, help='Years crawled at the same time.')
+    arg_parser.add_argument('--restart', action='store_true', help='Discard the checkpoint of an earlier backfill.')
+    arg_parser.add_argument('--from-events', action='store_true', help='Rebuild the counts from the stored IPO events without crawling.')
+    args = arg_parser.parse_args()
+
+    if args.from_events:
+        rebuild_from_events(Config(), args.regions, args.since)
+    else:
+        asyncio.run(backfill(args.regions, args.since, args.jobs, args.restart))
+
+
+if __name__ == '__main__':
+    main()
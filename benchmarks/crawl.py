@@ -0,0 +1,124 @@
+"""
+Records the crawl of the four IPO sites, or replays it offline and measures it.
+
+Usage:
+    python -m benchmarks.crawl record [--recording DIR]
+    python -m benchmarks.crawl replay [--recording DIR] [--latency MS] [--jitter MS] [--error-rate P]
+                                      [--error-status CODE] [--retry-after S] [--pages N]
+
+'record' crawls the live sites once with the parsing settings and stores every request/response
+pair in DIR. 'replay' starts the stand-in server (benchmarks.replay_server) on a free port,
+crawls it with the same settings and reports rows, requests, throughput and latency per source.
+The response cache is off in both modes, so every page goes over the network.
+"""
+import argparse
+import asyncio
+import time
+
+from loguru import logger
+
+from src.parsing_data import EuronextParser, HttpTransport, InvestingsParser, PreqvecaParser, StockanalysisParser
+from src.parsing_data.recording import Recording
+from src.utils import FileHandler
+
+from .replay_server import ReplayServer, add_replay_arguments, replay_settings
+
+SETTINGS_PATH = 'settings/parsing_settings/settings.yaml'
+
+
+def build_parsers(parsing_settings: dict, transport: HttpTransport) -> dict:
+    # Closed Stockanalysis years are crawled too, the parsers get no cache directory
+    return {
+        'Europe': EuronextParser(transport, **parsing_settings.get('euronext', dict())),
+        'US': StockanalysisParser(transport, **parsing_settings.get('stockanalysis', dict())),
+        'Russia': PreqvecaParser(transport, **parsing_settings.get('preqveca', dict())),
+        'China': InvestingsParser(transport, **parsing_settings.get('investings', dict())),
+    }
+
+
+async def crawl(parsing_settings: dict,
+                replay_url: str | None = None,
+                recorder: Recording | None = None
+                ) -> tuple[dict, HttpTransport]:
+    """
+    Crawls all sources concurrently.
+
+    :return: ``{region: {'rows': ..., 'elapsed': ..., 'error': ...}}`` and the closed transport with its statistics.
+    """
+    transport_settings = {**parsing_settings.get('transport', dict()), 'replay_url': replay_url}
+    transport = HttpTransport(settings=transport_settings, recorder=recorder)
+    parsers = build_parsers(parsing_settings, transport)
+
+    async def run(parser) -> dict:
+        started = time.perf_counter()
+        try:
+            df, _ = await parser.parse_data()
+        except Exception as e:
+            return {'rows': 0, 'elapsed': time.perf_counter() - started, 'error': str(e)}
+        return {'rows': len(df), 'elapsed': time.perf_counter() - started, 'error': None}
+
+    try:
+        results = await asyncio.gather(*(run(parser) for parser in parsers.values()))
+    finally:
+        await transport.aclose()
+
+    return dict(zip(parsers, results)), transport
+
+
+def report(results: dict, transport: HttpTransport, elapsed: float) -> None:
+    stats = transport.get_stats()
+    latencies = transport.get_latency_percentiles()
+    requests = sum(host_stats['requests'] for host_stats in stats.values())
+
+    print(f'{"source":<10} {"rows":>7} {"seconds":>8} {"error"}')
+    for region, result in results.items():
+        print(f'{region:<10} {result["rows"]:>7} {result["elapsed"]:>8.2f} {result["error"] or ""}')
+
+    print(f'\n{"host":<24} {"requests":>8} {"retries":>8} {"p50, s":>7} {"p90, s":>7} {"p99, s":>7} {"max, s":>7}')
+    for host, host_stats in stats.items():
+        latency = latencies.get(host, dict())
+        print(
+            f'{host:<24} {host_stats["requests"]:>8} {host_stats["retries"]:>8} '
+            f'{latency.get("p50", 0):>7.3f} {latency.get("p90", 0):>7.3f} '
+            f'{latency.get("p99", 0):>7.3f} {latency.get("max", 0):>7.3f}'
+        )
+
+    print(f'\n{requests} requests in {elapsed:.2f} s, {requests / elapsed:.1f} req/s.')
+
+
+async def record(args: argparse.Namespace, parsing_settings: dict) -> None:
+    recorder = Recording(args.recording)
+    started = time.perf_counter()
+    results, transport = await crawl(parsing_settings, recorder=recorder)
+    report(results, transport, time.perf_counter() - started)
+
+
+async def replay(args: argparse.Namespace, parsing_settings: dict) -> None:
+    server = ReplayServer(Recording(args.recording), replay_settings(args))
+    replay_url = await server.start(port=0)
+    try:
+        started = time.perf_counter()
+        results, transport = await crawl(parsing_settings, replay_url=replay_url)
+        elapsed = time.perf_counter() - started
+    finally:
+        await server.stop()
+
+    report(results, transport, elapsed)
+    logger.info(f'Stand-in server: {server.stats}.')
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    modes = arg_parser.add_subparsers(dest='mode', required=True)
+    modes.add_parser('record', help='Record the live sites.').add_argument(
+        '--recording', default='items/recordings', help='Directory of the recording.'
+    )
+    add_replay_arguments(modes.add_parser('replay', help='Replay a recording offline.'))
+    args = arg_parser.parse_args()
+
+    parsing_settings = FileHandler.load_yaml(SETTINGS_PATH)
+    asyncio.run(record(args, parsing_settings) if args.mode == 'record' else replay(args, parsing_settings))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,466 @@
+"""
+Benchmarks every stage of the pipeline and compares the timings with a saved baseline.
+
+Usage:
+    python -m benchmarks.pipeline [--scales N ...] [--stages STAGE ...] [--repeat N] [--recording DIR]
+                                  [--output PATH] [--baseline PATH] [--save-baseline]
+                                  [--max-regression R] [--stage-regression STAGE=R ...] [--min-time MS]
+
+Stages and what a scale means for them:
+    extraction   - TableExtractor of every parser on a page of N rows, and on the recorded pages
+    validation   - the four DataValidator methods and validate_batches on N parsed rows per source,
+                   validate_all on the rows of all four sources together, EntityIndex
+                   deduplicating and matching them
+    updating     - DataUpdater.update_month_data / update_year_data merging N months into N months,
+                   DataUpdater.upsert doing it for four regions at once, AggregateStore upserting
+                   two years into and loading the current year from N stored months, EventStore
+                   appending N parsed rows and counting them by month
+    calculation  - DataCalculator.prepare_month_df / prepare_year_df over N months of history
+    plotting     - PlotCreator.generate_month_plot / generate_year_plot (one size)
+    sending      - PlotSender.send_gragh against a stub bot (one size)
+
+Recorded inputs come from a recording made by 'python -m benchmarks.crawl record'.
+Results (best and median seconds of every case) are written as JSON to --output. With
+--baseline, every case is compared with the baseline and the run fails (exit code 1) when a
+median grows by more than --max-regression (a share, 0.2 - 20 %), or the --stage-regression
+of its stage; cases faster than --min-time in both runs are not compared.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Callable
+from urllib.parse import urlsplit
+
+import pandas as pd
+import pendulum
+from loguru import logger
+
+from src import AggregateStore, DataCalculator, DataUpdater, DataValidator, EntityIndex, EventStore, PlotCreator, PlotSender
+from src.parsing_data.recording import Recording
+from src.utils import FileHandler
+
+from .table_extraction import EXTRACTORS, synthetic_page
+
+STAGES = ['extraction', 'validation', 'updating', 'calculation', 'plotting', 'sending']
+
+PLOT_SETTINGS_PATH = 'settings/plot_settings/settings.yaml'
+FONT_PATHS = {
+    'font_bold': 'items/my_font/Inter/Inter-Bold.otf',
+    'font_regular': 'items/my_font/Inter/Inter-Regular.otf',
+}
+
+# Hosts of the recorded pages of every parser
+RECORDED_HOSTS = {
+    'live.euronext.com': 'euronext',
+    'stockanalysis.com': 'stockanalysis',
+    'preqveca.ru': 'preqveca',
+    'www.investing.com': 'investings',
+}
+
+
+@dataclass
+class Case:
+    stage: str
+    name: str
+    scale: int | str
+    run: Callable[[], object]
+
+    @property
+    def key(self) -> str:
+        return f'{self.stage}/{self.name}@{self.scale}'
+
+
+# ===== Inputs =====
+
+def parsed_frame(source: str, rows: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Rows as the parser of the source yields them: decoded dates over the last ten years.
+    """
+    generator = random.Random(seed)
+    today = pendulum.now('Europe/Moscow').date()
+    first = today.subtract(years=10)
+    span = (today - first).in_days()
+    dates = pd.to_datetime([first.add(days=generator.randrange(span)).to_date_string() for _ in range(rows)])
+    companies = [f'Company {i}' for i in range(rows)]
+    names = [column.name for column in EXTRACTORS[source][0].columns]
+
+    df = pd.DataFrame({names[0]: dates, names[1]: companies})
+    if source == 'investings':
+        df[names[2]] = pd.Categorical(generator.choice(['SSE', 'SZSE', 'HKEX']) for _ in range(rows))
+        df.insert(0, 'Страна', [generator.choice(['China', 'US']) for _ in range(rows)])
+    for column in EXTRACTORS[source][0].columns:
+        if column.kind == 'number':
+            df[column.name] = [round(generator.uniform(1, 50), 2) for _ in range(rows)]
+    return df
+
+
+def month_history(months: int, quantity_seed: int = 0) -> pd.DataFrame:
+    """
+    (Year, Month, Quantity) rows of ``months`` consecutive months ending with the current one.
+    """
+    generator = random.Random(quantity_seed)
+    end = pendulum.now('Europe/Moscow').date().start_of('month')
+    dates = [end.subtract(months=shift) for shift in range(months)]
+    return pd.DataFrame({
+        'Year': [date.year for date in dates],
+        'Month': [date.format('MMMM') for date in dates],
+        'Quantity': [generator.randrange(60) for _ in dates],
+    })
+
+
+def recorded_pages(recording_dir: str | None) -> dict[str, list[str]]:
+    pages = {source: [] for source in EXTRACTORS}
+    if recording_dir is None or not os.path.isdir(recording_dir):
+        return pages
+
+    recording = Recording(recording_dir)
+    for key, entry in recording.entries().items():
+        source = RECORDED_HOSTS.get(urlsplit(entry['url']).netloc)
+        if source is None or entry['status'] != 200:
+            continue
+        text = recording.load_body(key).decode('utf-8', errors='replace')
+        if source == 'investings':
+            # The payload is a bare list of rows, the parser wraps it in a table
+            text = f'<table>{json.loads(text)["data"]}</table>'
+        pages[source].append(text)
+    return pages
+
+
+# ===== Cases =====
+
+def extraction_cases(scales: list[int], recording_dir: str | None) -> list[Case]:
+    cases = []
+    for source, (extractor, _) in EXTRACTORS.items():
+        for scale in scales:
+            html = synthetic_page(source, rows=scale)
+            cases.append(Case('extraction', source, scale, lambda extractor=extractor, html=html: extractor.extract(html)))
+
+        pages = recorded_pages(recording_dir)[source]
+        if pages:
+            def run(extractor=extractor, pages=pages) -> None:
+                for page in pages:
+                    extractor.extract(page)
+            cases.append(Case('extraction', source, f'recorded:{len(pages)}', run))
+    return cases
+
+
+def validation_cases(scales: list[int], recording_dir: str | None) -> list[Case]:
+    validator = DataValidator()
+    methods = {
+        'euronext': validator.euronext_validator,
+        'preqveca': validator.preqveca_validator,
+        'investings': validator.investings_validator,
+        'stockanalysis': validator.stockanalysis_validator,
+    }
+
+    inputs = {source: {scale: parsed_frame(source, scale) for scale in scales} for source in methods}
+    for source, pages in recorded_pages(recording_dir).items():
+        extractor = EXTRACTORS[source][0]
+        frames = [frame for frame in (extractor.extract(page) for page in pages) if frame is not None]
+        if frames:
+            df = pd.concat(frames, axis=0, ignore_index=True)
+            # The legacy validators cannot count rows without a date
+            df = df.dropna(subset=[extractor.columns[0].name]).reset_index(drop=True)
+            if source == 'investings':
+                df.insert(0, 'Страна', 'China')
+            inputs[source]['recorded'] = df
+
+    cases = []
+    for source, method in methods.items():
+        for scale, df in inputs[source].items():
+            cases.append(Case('validation', source, scale, lambda method=method, df=df: method(df.copy())))
+
+            def run(source=source, df=df) -> pd.DataFrame:
+                async def batches():
+                    # Pages of a hundred rows, as the parsers yield them
+                    for start in range(0, len(df), 100):
+                        yield df.iloc[start:start + 100]
+                return asyncio.run(validator.validate_batches(batches(), source))
+            cases.append(Case('validation', f'{source}_batches', scale, run))
+
+    regions = {'euronext': 'Europe', 'preqveca': 'Russia', 'investings': 'China', 'stockanalysis': 'US'}
+    for scale in inputs['euronext']:
+        if not all(scale in inputs[source] for source in methods):
+            continue
+        parsed = {regions[source]: (source, inputs[source][scale]) for source in methods}
+        cases.append(Case('validation', 'all_sources', scale, lambda parsed=parsed: validator.validate_all(parsed)))
+
+        def deduplicate(parsed=parsed) -> EntityIndex:
+            entities = EntityIndex()
+            for region, (source, df) in parsed.items():
+                entities.add_frame(source, region, df)
+            return entities
+        cases.append(Case('validation', 'entities', scale, deduplicate))
+    return cases
+
+
+def updating_cases(scales: list[int], work_dir: str) -> list[Case]:
+    updater = DataUpdater()
+    path = os.path.join(work_dir, 'updated.csv')
+
+    cases = []
+    for scale in scales:
+        # Half of the parsed months are stored already, the other half are new
+        history = month_history(scale + scale // 2, quantity_seed=1)
+        prev_month, parsed_month = history.iloc[scale // 2:], history.iloc[:scale]
+        prev_year = prev_month.groupby('Year', as_index=False)['Quantity'].sum()
+        parsed_year = parsed_month.groupby('Year', as_index=False)['Quantity'].sum()
+
+        cases.append(Case('updating', 'update_month_data', scale, lambda prev=prev_month, parsed=parsed_month: (
+            updater.update_month_data(prev.copy(), parsed.copy(), path, 'Benchmark')
+        )))
+        cases.append(Case('updating', 'update_year_data', scale, lambda prev=prev_year, parsed=parsed_year: (
+            updater.update_year_data(prev.copy(), parsed.copy(), path, 'Benchmark')
+        )))
+
+        # The same merge for the four regions at once, keyed on (Region, Year, Month)
+        regions = ['US', 'Europe', 'Russia', 'China']
+        prev_regions = pd.concat([prev_month.assign(Region=region) for region in regions], ignore_index=True)
+        parsed_regions = pd.concat([parsed_month.assign(Region=region) for region in regions], ignore_index=True)
+        cases.append(Case('updating', 'upsert_regions', scale, lambda prev=prev_regions, parsed=parsed_regions: (
+            updater.upsert(prev, parsed, ['Region', 'Year', 'Month'])
+        )))
+
+        # A store holding N months of a region: the upsert of the last two years with new
+        # quantities every time and the load of the current year should not depend on N
+        store = AggregateStore(os.path.join(work_dir, f'store_{scale}.sqlite3'))
+        store.upsert('Benchmark', 'month', history.iloc[:scale])
+        recent = history.iloc[:24].copy()
+        cases.append(Case('updating', 'store_upsert', scale, lambda store=store, recent=recent, shifts=itertools.count(1): (
+            store.upsert('Benchmark', 'month', recent.assign(Quantity=recent['Quantity'] + next(shifts)))
+        )))
+        cases.append(Case('updating', 'store_load', scale, lambda store=store: (
+            store.read('Benchmark', 'month', since_year=pendulum.now('Europe/Moscow').year)
+        )))
+
+        # N parsed rows over ten years appended as IPO events to an empty store, and the
+        # monthly counts of all of them read back from a filled one
+        rows = parsed_frame('stockanalysis', scale, seed=scale)
+        paths = (os.path.join(work_dir, f'events_{scale}_{run}.sqlite3') for run in itertools.count())
+
+        def append_events(rows=rows, paths=paths) -> None:
+            events = EventStore(next(paths))
+            events.append('stockanalysis', 'US', rows)
+            events.close()
+
+        events = EventStore(os.path.join(work_dir, f'events_{scale}.sqlite3'))
+        events.append('stockanalysis', 'US', rows)
+        cases.append(Case('updating', 'events_append', scale, append_events))
+        cases.append(Case('updating', 'events_month_counts', scale, lambda events=events: (
+            events.month_counts('stockanalysis', 'US')
+        )))
+    return cases
+
+
+def calculation_cases(scales: list[int]) -> list[Case]:
+    calculator = DataCalculator()
+
+    cases = []
+    for scale in scales:
+        history = month_history(scale)
+        cases.append(Case('calculation', 'prepare_month_df', scale, lambda df=history: calculator.prepare_month_df(df, 'Benchmark')))
+        cases.append(Case('calculation', 'prepare_year_df', scale, lambda df=history: calculator.prepare_year_df(df, 'Benchmark')))
+    return cases
+
+
+def plotting_cases() -> list[Case]:
+    import matplotlib.pyplot as plt
+
+    plot_creator = PlotCreator(plot_settings=FileHandler.load_yaml(PLOT_SETTINGS_PATH), paths=FONT_PATHS)
+    calculator = DataCalculator()
+    history = month_history(30 * 12)
+    month_df = calculator.prepare_month_df(history, 'Benchmark')
+    year_df = history.groupby('Year', as_index=False)['Quantity'].sum()
+
+    def month_plot() -> None:
+        plot_creator.generate_month_plot(month_df, 'Бенчмарк', caption_type='Benchmark')
+        plt.close('all')
+
+    def year_plot() -> None:
+        plot_creator.generate_year_plot(year_df, 'Бенчмарк', caption_type='Benchmark')
+        plt.close('all')
+
+    return [
+        Case('plotting', 'generate_month_plot', 'fixed', month_plot),
+        Case('plotting', 'generate_year_plot', 'fixed', year_plot),
+    ]
+
+
+class StubBot:
+    """
+    Stands in for aiogram's Bot: accepts every media group after a fixed delay.
+    """
+    def __init__(self, latency: float = 0.0) -> None:
+        self.latency = latency
+        self.sent = 0
+
+    async def __aenter__(self) -> 'StubBot':
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        pass
+
+    async def send_media_group(self, chat_id: str, media: list) -> list:
+        await asyncio.sleep(self.latency)
+        self.sent += 1
+        return media
+
+
+def sending_cases(bot_latency: float) -> list[Case]:
+    import matplotlib.pyplot as plt
+
+    plot_creator = PlotCreator(plot_settings=FileHandler.load_yaml(PLOT_SETTINGS_PATH), paths=FONT_PATHS)
+    history = month_history(30 * 12)
+    buf = plot_creator.generate_year_plot(history.groupby('Year', as_index=False)['Quantity'].sum(), 'Бенчмарк', caption_type='US')
+    plt.close('all')
+
+    # The token only has to look valid, the stub bot never reaches Telegram
+    plot_sender = PlotSender(token='123456789:AAbbCCddEEffGGhhIIjjKKllMMnnOOppQQr', group_id='0')
+    plot_sender.bot = StubBot(bot_latency)
+    loop = asyncio.new_event_loop()
+
+    def send() -> None:
+        loop.run_until_complete(plot_sender.send_gragh(buf=buf, caption_type='US', yearly_type=True))
+
+    return [Case('sending', 'send_gragh', 'fixed', send)]
+
+
+def build_cases(stages: list[str],
+                scales: list[int],
+                recording_dir: str | None,
+                work_dir: str,
+                bot_latency: float
+                ) -> list[Case]:
+
+    builders = {
+        'extraction': lambda: extraction_cases(scales, recording_dir),
+        'validation': lambda: validation_cases(scales, recording_dir),
+        'updating': lambda: updating_cases(scales, work_dir),
+        'calculation': lambda: calculation_cases(scales),
+        'plotting': plotting_cases,
+        'sending': lambda: sending_cases(bot_latency),
+    }
+    return [case for stage in stages for case in builders[stage]()]
+
+
+# ===== Measuring and comparing =====
+
+def measure(run: Callable[[], object], repeat: int) -> dict[str, float | int]:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - started)
+    return {'best': min(timings), 'median': statistics.median(timings), 'runs': repeat}
+
+
+def compare(results: dict,
+            baseline: dict,
+            max_regression: float,
+            stage_regressions: dict[str, float],
+            min_time: float
+            ) -> list[str]:
+    """
+    :return: Descriptions of the cases that regressed beyond their allowed share.
+    """
+    regressions = []
+    print(f'\n{"case":<55} {"baseline, ms":>13} {"now, ms":>10} {"change":>8}')
+    for key, result in results['cases'].items():
+        previous = baseline['cases'].get(key)
+        if previous is None:
+            continue
+        before, now = previous['median'], result['median']
+        change = now / before - 1 if before > 0 else 0.0
+        allowed = stage_regressions.get(result['stage'], max_regression)
+        regressed = change > allowed and max(before, now) >= min_time
+        print(f'{key:<55} {before * 1000:>13.2f} {now * 1000:>10.2f} {change:>+8.0%}{"  REGRESSION" if regressed else ""}')
+        if regressed:
+            regressions.append(f'{key}: {before * 1000:.2f} ms -> {now * 1000:.2f} ms ({change:+.0%}, allowed {allowed:+.0%})')
+    return regressions
+
+
+def save_json(path: str, data: dict) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(data, file, ensure_ascii=False, indent=2)
+
+
+def parse_stage_regressions(values: list[str]) -> dict[str, float]:
+    regressions = dict()
+    for value in values:
+        stage, _, share = value.partition('=')
+        if stage not in STAGES or not share:
+            raise argparse.ArgumentTypeError(f'expected STAGE=SHARE with a stage of {STAGES}, got {value!r}')
+        regressions[stage] = float(share)
+    return regressions
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--scales', type=int, nargs='+', default=[100, 1000, 10000], help='Input sizes of the scaled stages.')
+    arg_parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES, help='Stages to run.')
+    arg_parser.add_argument('--repeat', type=int, default=5, help='Runs of every case.')
+    arg_parser.add_argument('--recording', default='items/recordings', help='Recording with the recorded inputs.')
+    arg_parser.add_argument('--bot-latency', type=float, default=0.0, help='Delay of the stub bot in ms.')
+    arg_parser.add_argument('--output', default='benchmarks/results/latest.json', help='Path of the results.')
+    arg_parser.add_argument('--baseline', default=None, help='Results to compare with.')
+    arg_parser.add_argument('--save-baseline', action='store_true', help='Also write the results to --baseline.')
+    arg_parser.add_argument('--max-regression', type=float, default=0.2, help='Allowed growth of a median, as a share.')
+    arg_parser.add_argument('--stage-regression', nargs='*', default=[], help='Allowed growth of a stage, STAGE=SHARE.')
+    arg_parser.add_argument('--min-time', type=float, default=1.0, help='Cases faster than this many ms are not compared.')
+    args = arg_parser.parse_args()
+    stage_regressions = parse_stage_regressions(args.stage_regression)
+
+    # Stage logs would drown the report
+    logger.remove()
+    logger.add(sys.stderr, level='WARNING')
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        cases = build_cases(args.stages, args.scales, args.recording, work_dir, args.bot_latency / 1000)
+
+        results = {
+            'created_at': pendulum.now('UTC').to_iso8601_string(),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'scales': args.scales,
+            'cases': dict(),
+        }
+        print(f'{"case":<55} {"best, ms":>10} {"median, ms":>11}')
+        for case in cases:
+            timing = measure(case.run, args.repeat)
+            results['cases'][case.key] = {'stage': case.stage, 'name': case.name, 'scale': case.scale, **timing}
+            print(f'{case.key:<55} {timing["best"] * 1000:>10.2f} {timing["median"] * 1000:>11.2f}')
+
+    save_json(args.output, results)
+    print(f'\nResults saved to {args.output}.')
+
+    if args.baseline is None:
+        return
+    if args.save_baseline or not os.path.isfile(args.baseline):
+        save_json(args.baseline, results)
+        print(f'Baseline saved to {args.baseline}.')
+        return
+
+    with open(args.baseline, 'r', encoding='utf-8') as file:
+        baseline = json.load(file)
+    regressions = compare(results, baseline, args.max_regression, stage_regressions, args.min_time / 1000)
+    if regressions:
+        print(f'\n{len(regressions)} regressions:\n' + '\n'.join(regressions))
+        sys.exit(1)
+    print('\nNo regressions.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+"""
+Local stand-in for the four IPO sites, replaying a recording made with transport recording on.
+
+Usage:
+    python -m benchmarks.replay_server [--recording DIR] [--port PORT] [--latency MS] [--jitter MS]
+                                       [--error-rate P] [--error-status CODE] [--retry-after S] [--pages N]
+
+Point the parsers at it with 'replay_url: http://127.0.0.1:PORT' in the transport settings.
+Every response is delayed by --latency +- --jitter milliseconds, a share --error-rate of the
+requests is answered with --error-status instead. --pages serves the paginated listings
+(Euronext, Preqveca) with N pages: their page count is rewritten and the recorded pages
+are repeated.
+"""
+import argparse
+import asyncio
+import random
+import re
+from dataclasses import dataclass
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from aiohttp import web
+from loguru import logger
+
+from src.parsing_data import PreqvecaParser
+from src.parsing_data.recording import REPLAY_HOST_HEADER, Recording
+
+# Paginated listings: the query parameter of the page, its step per page and the
+# pattern of the page count on the first page (the number is its second group)
+PAGING = {
+    'live.euronext.com': ('page', 1, re.compile(r'([?&]page=)(\d+)')),
+    'preqveca.ru': ('rec_start', PreqvecaParser.PAGE_SIZE, re.compile(r'((?:Всего|Найдено)[^\d]{0,40})(\d+)')),
+}
+
+# Headers of the recorded connection, the stand-in manages its own
+_HOP_HEADERS = {'connection', 'keep-alive', 'date', 'server', 'alt-svc', 'strict-transport-security'}
+
+
+@dataclass
+class ReplaySettings:
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 503
+    retry_after: float | None = None
+    pages: int | None = None
+
+
+class ReplayServer:
+    def __init__(self,
+                 recording: Recording,
+                 settings: ReplaySettings | None = None
+                 ) -> None:
+        """
+        :param recording: Exchanges to replay.
+        :param settings: Latency, errors and page counts of the replay.
+        """
+        self.recording = recording
+        self.settings = settings or ReplaySettings()
+        self.stats = {'requests': 0, 'errors': 0, 'missing': 0}
+        self._runner: web.AppRunner | None = None
+
+    def _page_request(self, host: str, url: str) -> tuple[str, int | None]:
+        """
+        Maps a page beyond the recorded ones onto a recorded page of the same listing.
+
+        :return: URL to look up and the page count to announce on the first page (None - as recorded).
+        """
+        if self.settings.pages is None or host not in PAGING:
+            return url, None
+
+        param, step, _ = PAGING[host]
+        parts = urlsplit(url)
+        query = parse_qsl(parts.query, keep_blank_values=True)
+        page = next((int(value) // step for name, value in query if name == param and value.isdigit()), 0)
+        if page == 0:
+            return url, self.settings.pages
+
+        recorded = sorted({
+            int(value) // step
+            for entry in self.recording.entries().values()
+            if urlsplit(entry['url']).netloc == host
+            for name, value in parse_qsl(urlsplit(entry['url']).query, keep_blank_values=True)
+            if name == param and value.isdigit() and int(value) > 0
+        })
+        if not recorded:
+            return url, None
+        # Pages past the requested count get the last recorded page, an empty one in a speculative crawl
+        target = recorded[(page - 1) % len(recorded)] if page < self.settings.pages else recorded[-1]
+        query = [(name, str(target * step) if name == param else value) for name, value in query]
+
+        return urlunsplit(parts._replace(query=urlencode(query))), None
+
+    @staticmethod
+    def _rewrite_page_count(host: str, body: bytes, pages: int) -> bytes:
+        _, step, pattern = PAGING[host]
+        text = body.decode('utf-8')
+        if host == 'live.euronext.com':
+            # The parser takes the highest page linked from the pager
+            last = max((int(match.group(2)) for match in pattern.finditer(text)), default=None)
+            if last is None:
+                return body
+            text = re.sub(rf'([?&]page=){last}\b', rf'\g<1>{pages - 1}', text)
+        else:
+            text = pattern.sub(lambda match: f'{match.group(1)}{pages * step}', text, count=1)
+        return text.encode('utf-8')
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.stats['requests'] += 1
+        settings = self.settings
+        delay = max(0.0, settings.latency + random.uniform(-settings.jitter, settings.jitter)) / 1000
+        await asyncio.sleep(delay)
+
+        if random.random() < settings.error_rate:
+            self.stats['errors'] += 1
+            headers = {'Retry-After': str(settings.retry_after)} if settings.retry_after is not None else None
+            return web.Response(status=settings.error_status, headers=headers)
+
+        host = request.headers.get(REPLAY_HOST_HEADER, request.host)
+        url, pages = self._page_request(host, f'https://{host}{request.raw_path}')
+        key = self.recording.lookup(request.method, url, await request.read())
+        if key is None:
+            self.stats['missing'] += 1
+            logger.warning(f'Nothing recorded for {request.method} {url}.')
+            return web.Response(status=404)
+
+        entry = self.recording.entries()[key]
+        body = self.recording.load_body(key)
+        if pages is not None:
+            body = self._rewrite_page_count(host, body, pages)
+
+        headers = {name: value for name, value in entry['headers'].items() if name.lower() not in _HOP_HEADERS}
+        return web.Response(status=entry['status'], body=body, headers=headers)
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8765) -> str:
+        app = web.Application()
+        app.router.add_route('*', '/{tail:.*}', self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        # Port 0 picks a free one
+        port = self._runner.addresses[0][1]
+        logger.info(f'Replaying {len(self.recording)} exchanges at http://{host}:{port}.')
+        return f'http://{host}:{port}'
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+def add_replay_arguments(arg_parser: argparse.ArgumentParser) -> None:
+    arg_parser.add_argument('--recording', default='items/recordings', help='Directory of the recording.')
+    arg_parser.add_argument('--latency', type=float, default=0.0, help='Mean delay of a response in ms.')
+    arg_parser.add_argument('--jitter', type=float, default=0.0, help='Spread of the delay in ms.')
+    arg_parser.add_argument('--error-rate', type=float, default=0.0, help='Share of requests answered with an error.')
+    arg_parser.add_argument('--error-status', type=int, default=503, help='Status of the errors.')
+    arg_parser.add_argument('--retry-after', type=float, default=None, help='Retry-After of the errors in seconds.')
+    arg_parser.add_argument('--pages', type=int, default=None, help='Pages of every paginated listing.')
+
+
+def replay_settings(args: argparse.Namespace) -> ReplaySettings:
+    return ReplaySettings(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        retry_after=args.retry_after,
+        pages=args.pages,
+    )
+
+
+async def serve(args: argparse.Namespace) -> None:
+    server = ReplayServer(Recording(args.recording), replay_settings(args))
+    await server.start(port=args.port)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--port', type=int, default=8765, help='Port to listen on.')
+    add_replay_arguments(arg_parser)
+    args = arg_parser.parse_args()
+
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
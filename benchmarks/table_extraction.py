@@ -0,0 +1,107 @@
+"""
+Compares the BeautifulSoup 'html.parser' extraction the parsers used to do with TableExtractor.
+
+Usage:
+    python -m benchmarks.table_extraction [--pages DIR] [--repeat N]
+
+DIR holds captured pages named after their source (euronext*.html, stockanalysis*.html,
+preqveca*.html, investings*.html). Sources without captured pages are measured on
+synthetic pages of the same shape.
+"""
+import argparse
+import glob
+import os
+import time
+from datetime import date
+
+from bs4 import BeautifulSoup
+
+from src.parsing_data import EuronextParser, InvestingsParser, PreqvecaParser, StockanalysisParser
+
+# Extractors are taken from the parsers so the benchmark measures exactly what they run;
+# the second item is the table BeautifulSoup used to search (None - the whole page)
+EXTRACTORS = {
+    'euronext': (EuronextParser(transport=None)._extractor, None),
+    'stockanalysis': (StockanalysisParser(transport=None)._extractor, {'id': 'main-table'}),
+    'preqveca': (PreqvecaParser(transport=None)._extractor, {'class_': 'datagrid'}),
+    'investings': (InvestingsParser(transport=None)._extractor, None),
+}
+
+
+SYNTHETIC_DATES = {
+    'euronext': '%d/%m/%Y',
+    'stockanalysis': '%b %d, %Y',
+    'preqveca': '%d.%m.%Y',
+    'investings': '%Y-%m-%d',
+}
+
+
+def synthetic_page(source: str, rows: int = 500) -> str:
+    # The date and company columns the parsers keep come first, under their real headers
+    names = [column.name for column in EXTRACTORS[source][0].columns or []]
+    names += [f'Column {j}' for j in range(len(names), 6)]
+    header = '' if source == 'investings' else '<tr>' + ''.join(f'<th>{name}</th>' for name in names) + '</tr>'
+
+    def cell(i: int, j: int) -> str:
+        if j == 1:
+            return f'<td><a href="/x/{i}"><span class="elp">Company {i}</span></a> <span>TCK</span></td>'
+        if j == 0:
+            return f'<td>{date(2024, i % 12 + 1, i % 28 + 1).strftime(SYNTHETIC_DATES[source])}</td>'
+        return f'<td> value {i}-{j} </td>'
+
+    body = ''.join('<tr>' + ''.join(cell(i, j) for j in range(6)) + '</tr>' for i in range(rows))
+    attributes = {'stockanalysis': ' id="main-table"', 'preqveca': ' class="datagrid"'}.get(source, '')
+    filler = '<div class="nav"><ul>' + ''.join(f'<li><a href="/p/{i}">Link {i}</a></li>' for i in range(300)) + '</ul></div>'
+    return f'<html><head><title>{source}</title></head><body>{filler}<table{attributes}>{header}{body}</table>{filler}</body></html>'
+
+
+def bs4_extract(html: str, table_attrs: dict | None) -> list[list[str]]:
+    soup = BeautifulSoup(html, 'html.parser')
+    scope = soup if table_attrs is None else soup.find('table', **table_attrs)
+    rows = []
+    for row in scope.find_all('tr'):
+        rows.append([cell.text.strip() for cell in row.find_all(['th', 'td'])])
+    return rows
+
+
+def measure(function, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def load_pages(pages_dir: str | None) -> dict[str, list[tuple[str, str]]]:
+    pages = {source: [] for source in EXTRACTORS}
+    if pages_dir is not None:
+        for path in sorted(glob.glob(os.path.join(pages_dir, '*.html'))):
+            name = os.path.basename(path)
+            for source in EXTRACTORS:
+                if name.startswith(source):
+                    with open(path, 'r', encoding='utf-8') as file:
+                        pages[source].append((name, file.read()))
+    for source, captured in pages.items():
+        if not captured:
+            captured.append((f'{source} (synthetic)', synthetic_page(source)))
+    return pages
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--pages', default=None, help='Directory with captured pages.')
+    arg_parser.add_argument('--repeat', type=int, default=20, help='Runs per page, the best one is reported.')
+    args = arg_parser.parse_args()
+
+    print(f'{"page":<40} {"bs4, ms":>10} {"lxml, ms":>10} {"speedup":>8}')
+    for source, captured in load_pages(args.pages).items():
+        extractor, table_attrs = EXTRACTORS[source]
+        for name, html in captured:
+            old = measure(lambda: bs4_extract(html, table_attrs), args.repeat)
+            new = measure(lambda: extractor.extract(html), args.repeat)
+            print(f'{name:<40} {old * 1000:>10.2f} {new * 1000:>10.2f} {old / new:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -3,6 +3,15 @@ from src import EuronextParser
 from src import StockanalysisParser
 from src import PreqvecaParser
 from src import InvestingsParser
+from src import HttpTransport
+from src import ResponseCache
+from src import SourceCollector
+from src import WatermarkStore
+from src import RunCheckpoint
+from src import AggregateStore
+from src import EventStore
+from src import CircuitBreaker
+from src import EntityIndex
 from src import DataCalculator
 from src import DataUpdater
 from src import PlotCreator
@@ -10,28 +19,126 @@ from src import PlotSender
 from src import Config
 import pandas as pd
 import asyncio
+import os
 import pendulum
 from loguru import logger
 
+# caption_type -> region title on plots and data files
+REGIONS = {
+    'US': {
+        'title': 'США',
+        'month_path': 'data_US_month',
+        'year_path': 'data_US_year',
+    },
+    'Russia': {
+        'title': 'Россия',
+        'month_path': 'data_RU_month',
+        'year_path': 'data_RU_year',
+    },
+    'Europe': {
+        'title': 'Европа',
+        'month_path': 'data_EU_month',
+        'year_path': 'data_EU_year',
+    },
+    'China': {
+        'title': 'Китай',
+        'month_path': 'data_CN_month',
+        'year_path': 'data_CN_year',
+    },
+}
+
+def build_parsers(config: Config, transport: HttpTransport) -> dict:
+    """
+    Creates the parser of every region with its parsing settings.
+    """
+    parsing_settings = config.get_parsing_settings()
+
+    return {
+        'Europe': EuronextParser(transport, **parsing_settings.get('euronext', dict())),
+        'US': StockanalysisParser(
+            transport,
+            cache_dir=os.path.join(config.get_cache_dir(), 'stockanalysis'),
+            **parsing_settings.get('stockanalysis', dict())
+        ),
+        'Russia': PreqvecaParser(transport, **parsing_settings.get('preqveca', dict())),
+        'China': InvestingsParser(transport, **parsing_settings.get('investings', dict())),
+    }
+
+def open_store(config: Config) -> AggregateStore:
+    """
+    Opens the store of the aggregates; the data files of every region are imported on the first run.
+    """
+    paths = config.get_paths()
+    store = AggregateStore(config.get_store_path())
+    store.migrate_csv({
+        (region, period): paths[info[f'{period}_path']]
+        for region, info in REGIONS.items()
+        for period in ('month', 'year')
+    })
+
+    return store
+
 async def main():
 
-    start_time = pendulum.now('Europe/Moscow').time()
+    start_time = pendulum.now('Europe/Moscow')
 
     # ============ Init config ============
     config = Config()
     plot_settings = config.get_plot_settings()
+    parsing_settings = config.get_parsing_settings()
     paths = config.get_paths()
     group_id = config.get_telegram_chat_id()
     token = config.get_telegram_api_token()
 
     # ============ Init submodules ============
     validator = DataValidator()
-    euro_parser = EuronextParser()
-    stock_parser = StockanalysisParser()
-    preq_parser = PreqvecaParser()
-    invest_parser = InvestingsParser()
+    cache_settings = dict(parsing_settings.get('cache', dict()))
+    if cache_settings.pop('enabled', False):
+        response_cache = ResponseCache(os.path.join(config.get_cache_dir(), 'http'), **cache_settings)
+    else:
+        response_cache = None
+    checkpoint_settings = dict(parsing_settings.get('checkpoint', dict()))
+    if checkpoint_settings.pop('enabled', False):
+        checkpoint = RunCheckpoint(config.get_checkpoint_dir(), **checkpoint_settings)
+    else:
+        checkpoint = None
+    transport = HttpTransport(settings=parsing_settings.get('transport'), cache=response_cache, checkpoint=checkpoint)
+    watermark_settings = dict(parsing_settings.get('watermarks', dict()))
+    if watermark_settings.pop('enabled', False):
+        watermarks = WatermarkStore(config.get_watermarks_path(), **watermark_settings)
+    else:
+        watermarks = None
+    breaker_settings = dict(parsing_settings.get('circuit_breaker', dict()))
+    if breaker_settings.pop('enabled', False):
+        breaker = CircuitBreaker(config.get_circuit_breaker_path(), **breaker_settings)
+    else:
+        breaker = None
+    events_settings = dict(parsing_settings.get('events', dict()))
+    if events_settings.pop('enabled', False):
+        events = EventStore(config.get_store_path(), **events_settings)
+    else:
+        events = None
+    dedup_settings = dict(parsing_settings.get('dedup', dict()))
+    if dedup_settings.pop('enabled', False):
+        entities = EntityIndex(**dedup_settings)
+    else:
+        entities = None
+    # In a single pass the rows of all sources are counted together once they are collected
+    single_pass = parsing_settings.get('validation', dict()).get('single_pass', False)
+    collector = SourceCollector(
+        parsers=build_parsers(config, transport),
+        deadlines=parsing_settings.get('deadlines'),
+        default_deadline=parsing_settings.get('default_deadline'),
+        validator=None if single_pass else validator,
+        watermarks=watermarks,
+        checkpoint=checkpoint,
+        breaker=breaker,
+        events=events,
+        entities=entities,
+    )
     calculator = DataCalculator()
-    updater = DataUpdater()
+    store = open_store(config)
+    updater = DataUpdater(store=store)
     plot_creator = PlotCreator(plot_settings=plot_settings, paths=paths)
     plot_sender = PlotSender(token=token, group_id=group_id)
 
@@ -39,71 +146,102 @@ async def main():
 
     logger.info('START: Load data.')
 
-    df_us_prev_month = pd.read_csv(paths['data_US_month'], sep=';')
-    df_us_prev_year = pd.read_csv(paths['data_US_year'], sep=';')
-
-    df_rus_prev_month = pd.read_csv(paths['data_RU_month'], sep=';')
-    df_rus_prev_year = pd.read_csv(paths['data_RU_year'], sep=';')
-
-    df_euro_prev_month = pd.read_csv(paths['data_EU_month'], sep=';')
-    df_euro_prev_year = pd.read_csv(paths['data_EU_year'], sep=';')
-
-    df_china_prev_month = pd.read_csv(paths['data_CN_month'], sep=';')
-    df_china_prev_year = pd.read_csv(paths['data_CN_year'], sep=';')
+    # Plots need the months of the current year only, older months are updated in the store without being read
+    current_year = start_time.year
+    prev_month = {region: store.read(region, 'month', since_year=current_year) for region in REGIONS}
+    prev_year = {region: store.read(region, 'year') for region in REGIONS}
 
     logger.info('END: Load data.')
 
-    # ============ Parsing data ============
+    # ============ Parsing and validating data ============
+
+    # Parsers stream row batches straight into the validator
 
     logger.info('START: Parsing data.')
 
-    df_euro, euro_type = await euro_parser.parse_data()
-    df_stock, us_type = await stock_parser.parse_data()
-    df_preq, rus_type = await preq_parser.parse_data()
-    df_invest, china_type = await invest_parser.parse_data()
+    try:
+        results = await collector.collect()
+    finally:
+        await transport.aclose()
+    transport.log_stats()
+    if events is not None:
+        events.close()
 
     logger.info('END: Parsing data.')
-    
-    # ============ Validate data ============
-
-    logger.info('START: Validate data.')
 
-    df_euro = validator.euronext_validator(df_euro)
-    df_stock = validator.stockanalysis_validator(df_stock)
-    df_preq = validator.preqveca_validator(df_preq)
-    df_invest = validator.investings_validator(df_invest)
-
-    logger.info('END: Validate data.')
+    # Regions whose source did not finish keep the stored data of their last good crawl
+    parsed = dict()
+    stale = dict()
+    for region in REGIONS:
+        result = results[region]
+        if not result.ok:
+            logger.warning(f'Source of {region} region is {result.status}, previous data is kept and its plots are marked as stale.')
+            stale[region] = result.stale_since
+
+    if single_pass:
+        collected = {
+            region: (collector.parsers[region].SOURCE, result.data) for region, result in results.items() if result.ok
+        }
+        validated = validator.split_by_region(validator.validate_all(collected))
+        empty = pd.DataFrame(columns=['Year', 'Month', 'Quantity'])
+        parsed = {region: validated.get(region, empty) for region in collected}
+    else:
+        for region, result in results.items():
+            if not result.ok:
+                continue
+            validated = result.data
+            if 'Country' in validated.columns:
+                countries = validator.split_by_country(validated)
+                logger.info(f'Countries collected for {region} region: {list(countries)}.')
+                if region in countries:
+                    parsed[region] = countries[region]
+            else:
+                parsed[region] = validated
 
     # ============ Create dataframes ============
-    
-    logger.info('START: Processing  data.')
 
-    # ===== Monthly =====
-    df_us_updated_month = updater.update_month_data(df_us_prev_month, df_stock, paths['data_US_month'], us_type)
-    df_us_month = calculator.prepare_month_df(df_us_updated_month, us_type)     
-
-    df_rus_updated_month = updater.update_month_data(df_rus_prev_month, df_preq, paths['data_RU_month'], rus_type)
-    df_rus_month = calculator.prepare_month_df(df_rus_updated_month, rus_type)     
-
-    df_euro_updated_month = updater.update_month_data(df_euro_prev_month, df_euro, paths['data_EU_month'], euro_type)
-    df_euro_month = calculator.prepare_month_df(df_euro_updated_month, euro_type) 
-
-    df_china_updated_month = updater.update_month_data(df_china_prev_month, df_invest, paths['data_CN_month'], china_type)
-    df_china_month = calculator.prepare_month_df(df_china_updated_month, china_type) 
-
-    # ===== Yearly =====
-    df_us_year = calculator.prepare_year_df(df_stock, us_type)
-    updater.update_year_data(df_us_prev_year, df_us_year, paths['data_US_year'], us_type)
-
-    df_rus_year = calculator.prepare_year_df(df_preq, rus_type)
-    updater.update_year_data(df_rus_prev_year, df_rus_year, paths['data_RU_year'], rus_type)
-
-    df_euro_year = calculator.prepare_year_df(df_euro, euro_type)
-    updater.update_year_data(df_euro_prev_year, df_euro_year, paths['data_EU_year'], euro_type)
+    logger.info('START: Processing  data.')
 
-    df_china_year = calculator.prepare_year_df(df_invest, china_type)
-    updater.update_year_data(df_china_prev_year, df_china_year, paths['data_CN_year'], china_type)
+    # Regions aggregated by an earlier attempt of the run are already in the loaded files
+    if checkpoint is not None:
+        parsed = {region: df for region, df in parsed.items() if not checkpoint.is_done('aggregated', region)}
+
+    month_data = dict()
+    year_data = dict()
+    # The counts of all regions are committed together or not at all
+    with store.transaction():
+        for region in REGIONS:
+
+            # ===== Monthly =====
+            if region in parsed:
+                updated_month = updater.update_month_data(prev_month[region], parsed[region], None, region)
+            else:
+                updated_month = prev_month[region]
+            month_data[region] = calculator.prepare_month_df(updated_month, region)
+
+            # ===== Yearly =====
+            # Crawls from a watermark cover only recent months, the year is summed from the monthly history
+            if region in parsed:
+                df_year = calculator.prepare_year_df(updated_month, region)
+                year_data[region] = updater.update_year_data(prev_year[region], df_year, None, region)
+            else:
+                year_data[region] = prev_year[region]
+    store.close()
+
+    # Watermarks move only after the data they cover is saved
+    if watermarks is not None:
+        for region, result in results.items():
+            if region in parsed:
+                watermarks.update(**result.watermark)
+        watermarks.save()
+
+    if checkpoint is not None:
+        for region in parsed:
+            checkpoint.mark_done('aggregated', region)
+            # Plots of an earlier attempt show the data before this aggregation
+            for period in ('month', 'year'):
+                checkpoint.reset('rendered', f'{period}:{region}')
+                checkpoint.reset('sent', f'{period}:{region}')
 
     logger.info('END: Processing  data.')
 
@@ -111,41 +249,55 @@ async def main():
 
     logger.info('START: Create plots.')
 
-    # ===== Monthly =====
-    plot_us_month = plot_creator.generate_month_plot(df_us_month, 'США', caption_type=us_type)
-    plot_rus_month = plot_creator.generate_month_plot(df_rus_month, 'Россия', caption_type=rus_type)
-    plot_euro_month = plot_creator.generate_month_plot(df_euro_month, 'Европа', caption_type=euro_type)
-    plot_china_month = plot_creator.generate_month_plot(df_china_month, 'Китай', caption_type=china_type)
-
-    # ===== Yearly =====
-    plot_us_year = plot_creator.generate_year_plot(df_us_prev_year, 'США', caption_type=us_type)
-    plot_rus_year = plot_creator.generate_year_plot(df_rus_prev_year, 'Россия', caption_type=rus_type)
-    plot_euro_year = plot_creator.generate_year_plot(df_euro_prev_year, 'Европа', caption_type=euro_type)
-    plot_china_year = plot_creator.generate_year_plot(df_china_prev_year, 'Китай', caption_type=china_type)
+    plots = dict()
+    for region, info in REGIONS.items():
+        for period, data, generate in (
+            ('month', month_data, plot_creator.generate_month_plot),
+            ('year', year_data, plot_creator.generate_year_plot),
+        ):
+            item = f'{period}:{region}'
+            if checkpoint is not None and checkpoint.is_done('rendered', item):
+                plots[item] = checkpoint.load_buffer(f'{period}_{region}.img')
+                continue
+            plots[item] = generate(data[region], info['title'], caption_type=region)
+            # Stale plots are rendered again once their source recovers
+            if checkpoint is not None and region not in stale:
+                checkpoint.save_buffer(f'{period}_{region}.img', plots[item])
+                checkpoint.mark_done('rendered', item)
 
     logger.info('END: Create plots.')
-  
+
     # ============ Send plots ============
 
     logger.info('START: Sending plots.')
 
-    # ===== Monthly =====
-    await plot_sender.send_gragh(buf=plot_us_month, caption_type=us_type, yearly_type=False)
-    await plot_sender.send_gragh(buf=plot_rus_month, caption_type=rus_type, yearly_type=False)
-    await plot_sender.send_gragh(buf=plot_euro_month, caption_type=euro_type, yearly_type=False)
-    await plot_sender.send_gragh(buf=plot_china_month, caption_type=china_type, yearly_type=False)
-
-    # ===== Yearly =====
-    await plot_sender.send_gragh(buf=plot_us_year, caption_type=us_type, yearly_type=True)
-    await plot_sender.send_gragh(buf=plot_rus_year, caption_type=rus_type, yearly_type=True)
-    await plot_sender.send_gragh(buf=plot_euro_year, caption_type=euro_type, yearly_type=True)
-    await plot_sender.send_gragh(buf=plot_china_year, caption_type=china_type, yearly_type=True)
+    # Monthly plots go first, then yearly ones; posts sent by an earlier attempt are skipped
+    for period in ('month', 'year'):
+        for region in REGIONS:
+            item = f'{period}:{region}'
+            if checkpoint is not None and checkpoint.is_done('sent', item):
+                logger.info(f'Plot {item} was already sent in this run.')
+                continue
+            await plot_sender.send_gragh(
+                buf=plots[item],
+                caption_type=region,
+                yearly_type=period == 'year',
+                stale=region in stale,
+                stale_since=stale.get(region),
+            )
+            if checkpoint is not None and region not in stale:
+                checkpoint.mark_done('sent', item)
+
+    # A run without stale regions is complete, a re-run of the day starts anew
+    if checkpoint is not None and not stale:
+        checkpoint.discard()
 
     logger.info('END: Sending plots.')
 
-    end_time = pendulum.now('Europe/Moscow').time()
+    end_time = pendulum.now('Europe/Moscow')
 
-    logger.info(f'Complited successfully. Time of program execution is {end_time - start_time}.')
+    # Whole datetimes are subtracted, times of day went negative across midnight
+    logger.info(f'Complited successfully. Time of program execution is {(end_time - start_time).total_seconds():.1f} s.')
 
 if __name__ == '__main__':
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -1,7 +1,9 @@
 from .plots_creator import PlotCreator
-from .parsing_data import EuronextParser, InvestingsParser, StockanalysisParser, PreqvecaParser
+from .parsing_data import EuronextParser, InvestingsParser, StockanalysisParser, PreqvecaParser, HttpTransport, ResponseCache, SourceCollector, WatermarkStore, CircuitBreaker, EntityIndex
 from .processing_data import DataCalculator, DataUpdater
 from .data_validator import DataValidator
+from .run_checkpoint import RunCheckpoint
+from .storage import AggregateStore, EventStore
 from .plot_sender import PlotSender
 from .utils import FileHandler, FileValidator
 from .config import Config
@@ -11,7 +13,16 @@ __all__ = [
     'InvestingsParser',
     'StockanalysisParser',
     'PreqvecaParser',
+    'HttpTransport',
+    'ResponseCache',
+    'SourceCollector',
+    'WatermarkStore',
+    'CircuitBreaker',
+    'EntityIndex',
     'DataValidator',
+    'RunCheckpoint',
+    'AggregateStore',
+    'EventStore',
     'DataCalculator',
     'DataUpdater',
     'PlotCreator',
@@ -12,6 +12,9 @@ class Config:
             "plot_settings": os.path.join(
                 self.BASE_DIR, "./settings/plot_settings", "settings.yaml"
             ),
+            "parsing_settings": os.path.join(
+                self.BASE_DIR, "./settings/parsing_settings", "settings.yaml"
+            ),
             "telegram_tokens": os.path.join(
                 self.BASE_DIR, "./settings/telegram_api", "tokens.env"
             ),
@@ -59,6 +62,19 @@ class Config:
             ),
         }
 
+        # === Cache Configurations ===
+        self.CACHE_DIR = os.path.join(self.BASE_DIR, "./items/cache")
+        self.CHECKPOINT_DIR = os.path.join(self.CACHE_DIR, "checkpoint")
+
+        # === Crawl Watermarks ===
+        self.WATERMARKS_PATH = os.path.join(self.BASE_DIR, "./items/data/", "watermarks.json")
+
+        # === Aggregate Store ===
+        self.STORE_PATH = os.path.join(self.BASE_DIR, "./items/data/", "ipo_data.sqlite3")
+
+        # === Circuit Breakers ===
+        self.CIRCUIT_BREAKER_PATH = os.path.join(self.BASE_DIR, "./items/data/", "circuit_breaker.json")
+
         # === Path Validation ===
         logger.info("Start checking for validity of paths to configuration files.")
         for _, path in self.PATH_TO_VALIDATE.items():
@@ -76,6 +92,9 @@ class Config:
         self.SETTINGS_PLOTS = FileHandler.load_yaml(
             self.PATH_TO_VALIDATE['plot_settings']
         )
+        self.SETTINGS_PARSING = FileHandler.load_yaml(
+            self.PATH_TO_VALIDATE['parsing_settings']
+        )
 
     def get_telegram_api_token(self) -> str:
         return self.TELEGRAM_API_TOKEN
@@ -86,5 +105,23 @@ class Config:
     def get_plot_settings(self) -> str:
         return self.SETTINGS_PLOTS
 
+    def get_parsing_settings(self) -> dict:
+        return self.SETTINGS_PARSING
+
+    def get_cache_dir(self) -> str:
+        return self.CACHE_DIR
+
+    def get_checkpoint_dir(self) -> str:
+        return self.CHECKPOINT_DIR
+
+    def get_watermarks_path(self) -> str:
+        return self.WATERMARKS_PATH
+
+    def get_circuit_breaker_path(self) -> str:
+        return self.CIRCUIT_BREAKER_PATH
+
+    def get_store_path(self) -> str:
+        return self.STORE_PATH
+
     def get_paths(self) -> str:
         return self.PATH_TO_VALIDATE
\ No newline at end of file
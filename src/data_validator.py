@@ -1,31 +1,115 @@
+import calendar
+import numpy as np
 import pandas as pd
 import warnings
+from typing import AsyncIterator
 from loguru import logger
 
 class DataValidator:
+    # Parsed columns of every source renamed to the validator's names, and the date format
+    SOURCES = {
+        'euronext': ({'Date': 'date', 'Company name': 'company'}, '%d/%m/%Y'),
+        'preqveca': ({'Дата окончания размещения': 'date', 'Название IPO / SPO': 'company'}, '%d.%m.%Y'),
+        'investings': ({'Страна': 'Country', 'Дата IPO': 'date', 'Компания': 'company'}, None),
+        'stockanalysis': ({'IPO Date': 'date', 'Company Name': 'company'}, '%b %d, %Y'),
+    }
+
+    # Month names indexed by month number, names appear only when counts are presented
+    MONTH_NAMES = np.array(calendar.month_name, dtype=object)
+
+    # Month ordinal of rows without a date (NaT)
+    _NO_MONTH = np.iinfo(np.int64).min
+
+    # Shift making month ordinals (negative before 1970) fit the low 32 bits of a count key
+    _PERIOD_SHIFT = 2 ** 31
 
     def __init__(self) -> None:
         pass
 
+    @staticmethod
+    def _decode_dates(dates: pd.Series, _format: str | None) -> pd.Series:
+        # Parsers decode dates while extracting the rows, text is parsed only for old inputs
+        if pd.api.types.is_datetime64_any_dtype(dates):
+            return dates
+        try:
+            return pd.to_datetime(dates, format=_format)
+        except ValueError:
+            # Decoded rows stored in a run checkpoint come back as ISO text
+            return pd.to_datetime(dates, format='ISO8601')
+
+    @staticmethod
+    def _month_ordinals(dates: pd.Series) -> np.ndarray:
+        """
+        Months since January 1970 as int64 (the ordinals of Period[M]), NaT as the int64 minimum.
+        """
+        return dates.to_numpy(dtype='datetime64[ns]').astype('datetime64[M]').astype(np.int64)
+
+    def _month_keys(self,
+                    df: pd.DataFrame,
+                    _format: str | None
+                    ) -> pd.DataFrame:
+        """
+        Normalizes renamed rows into their count keys: 'Country' (if any) and 'Period' ordinals.
+        Rows without a date or a company are not counted.
+        """
+        periods = self._month_ordinals(self._decode_dates(df['date'], _format))
+        counted = (periods != self._NO_MONTH) & df['company'].notna().to_numpy()
+
+        keys = pd.DataFrame({'Period': periods}, index=df.index)
+        if 'Country' in df.columns:
+            keys.insert(0, 'Country', df['Country'])
+
+        return keys[counted]
+
+    @staticmethod
+    def _count_keys(keys: pd.DataFrame) -> pd.Series:
+        return keys.groupby(list(keys.columns), sort=False, observed=True).size()
+
+    def _counts_to_typed(self,
+                         counts: pd.Series
+                         ) -> pd.DataFrame:
+        """
+        Turns counts keyed by (key..., 'Period' ordinal) into a typed frame sorted by key and newest month first.
+        """
+        _df = counts.rename('Quantity').reset_index()
+        keys = [column for column in _df.columns if column not in ('Period', 'Quantity')]
+        _df.sort_values(by=keys + ['Period'], ascending=False, inplace=True, kind='stable')
+        _df['Period'] = pd.PeriodIndex.from_ordinals(_df['Period'].to_numpy(dtype=np.int64), freq='M')
+        _df['Quantity'] = _df['Quantity'].astype(np.int64)
+        _df.reset_index(inplace=True, drop=True)
+
+        return _df
+
+    def present(self,
+                counts: pd.DataFrame
+                ) -> pd.DataFrame:
+        """
+        Presents typed counts as rows of the data files: (key..., Year, Month name, Quantity).
+
+        :param counts: Frame with a Period[M] 'Period' column, e.g. a region of ``validate_all``.
+        """
+        keys = [column for column in counts.columns if column not in ('Period', 'Quantity')]
+        periods = counts['Period'].dt
+
+        _df = counts[keys].copy()
+        _df['Year'] = periods.year.astype('int32')
+        _df['Month'] = self.MONTH_NAMES[periods.month.to_numpy()]
+        _df['Quantity'] = counts['Quantity'].astype(int)
+
+        return _df.reset_index(drop=True)
+
     def _base_validator(self, 
                         _df: pd.DataFrame, 
                         _format: str | None
                         ) -> pd.DataFrame:
         
-        _df['date'] = pd.to_datetime(_df['date'], format=_format)
-        _df.loc[:, 'Year'] = _df.loc[:, 'date'].dt.year
-        _df.loc[:, 'Month'] = _df.loc[:, 'date'].dt.month_name()
-        _df = _df[['Month', 'Year', 'company']].groupby(['Month', 'Year']).count()
-        _df.reset_index(inplace=True)
-        _df.rename(columns={'company': 'Quantity'}, inplace=True)
-        _df['sorting'] = pd.to_datetime(_df['Month'] + ' ' + _df['Year'].astype(str))
-        _df.sort_values(by=['sorting'], inplace=True, ascending=False)
-        _df.reset_index(inplace=True, drop=True)
-        _df.drop('sorting', axis=1, inplace=True)
-        cols = ['Year', 'Month', 'Quantity']
-        _df = _df[cols]
+        # Long-format frames (several countries) are counted per country
+        if _df.empty:
+            return pd.DataFrame(columns=(['Country'] if 'Country' in _df.columns else []) + ['Year', 'Month', 'Quantity'])
 
-        return _df
+        counts = self._count_keys(self._month_keys(_df, _format))
+
+        return self.present(self._counts_to_typed(counts))
 
     def euronext_validator(self, 
                            df: pd.DataFrame
@@ -64,9 +148,9 @@ class DataValidator:
         logger.info(f'START: Validate Investings data.')
 
         warnings.simplefilter('ignore')
-        cols = ['Дата IPO', 'Компания']
+        cols = ['Страна', 'Дата IPO', 'Компания']
         df = df[cols]
-        df.rename(columns={'Дата IPO': 'date', 'Компания': 'company'}, inplace=True)
+        df.rename(columns={'Страна': 'Country', 'Дата IPO': 'date', 'Компания': 'company'}, inplace=True)
 
         logger.info(f'END: Validate Investings data.')
 
@@ -85,4 +169,121 @@ class DataValidator:
 
         logger.info(f'END: Validate Stockanalysis data.')
 
-        return self._base_validator(_df=df, _format='%b %d, %Y')
\ No newline at end of file
+        return self._base_validator(_df=df, _format='%b %d, %Y')
+
+    def split_by_country(self,
+                         df: pd.DataFrame
+                         ) -> dict[str, pd.DataFrame]:
+        """
+        Splits a long-format validated frame into one (Year, Month, Quantity) frame per country.
+
+        :param df: Output of a validator with a 'Country' column.
+        :return: Frames keyed by country.
+        """
+        return {
+            country: group.drop('Country', axis=1).reset_index(drop=True)
+            for country, group in df.groupby('Country', sort=False)
+        }
+
+    def validate_all(self,
+                     parsed: dict[str, tuple[str, pd.DataFrame]]
+                     ) -> pd.DataFrame:
+        """
+        Counts the rows of all sources in one pass.
+
+        The rows of every source are renamed, their dates normalized to month ordinals and
+        concatenated with a region column; a single groupby then counts every (region, month).
+        A source crawling several countries contributes only the rows of its own region.
+
+        :param parsed: ``{region: (source, rows)}``, the rows as a parser yields them.
+        :return: Typed counts by region (in the order given), newest month first: 'Region' (category),
+                 'Period' (Period[M]) and 'Quantity' (int64); month names come with ``present``.
+        """
+        logger.info(f'START: Validate {len(parsed)} sources in one pass.')
+
+        regions = list(parsed)
+        parts = []
+        for code, region in enumerate(regions):
+            source, df = parsed[region]
+            if df is None or df.empty:
+                continue
+            columns, _format = self.SOURCES[source]
+            keys = self._month_keys(df[list(columns)].rename(columns=columns), _format)
+            if 'Country' in keys.columns:
+                keys = keys[keys['Country'] == region]
+            # Region code in the high half, month ordinal (shifted to be non-negative) in the low one
+            parts.append((np.int64(code) << 32) + (keys['Period'].to_numpy() + self._PERIOD_SHIFT))
+
+        keys = pd.Series(np.concatenate(parts) if parts else np.empty(0, dtype=np.int64))
+        counts = keys.value_counts(sort=False).sort_index()
+        codes = (counts.index.to_numpy() >> 32).astype(np.int64)
+        periods = (counts.index.to_numpy() & 0xFFFFFFFF) - self._PERIOD_SHIFT
+
+        # Sorted by region code and month, the months are reversed within each region
+        order = np.lexsort((-periods, codes))
+        counts = pd.DataFrame({
+            'Region': pd.Categorical.from_codes(codes[order], categories=regions),
+            'Period': pd.PeriodIndex.from_ordinals(periods[order], freq='M'),
+            'Quantity': counts.to_numpy(dtype=np.int64)[order],
+        })
+
+        logger.info(f'END: Validate {len(parsed)} sources in one pass, months: {len(counts)}.')
+
+        return counts
+
+    def split_by_region(self,
+                        counts: pd.DataFrame
+                        ) -> dict[str, pd.DataFrame]:
+        """
+        Presents the counts of ``validate_all`` as one (Year, Month, Quantity) frame per region.
+        """
+        return {
+            region: self.present(group.drop('Region', axis=1))
+            for region, group in counts.groupby('Region', sort=False, observed=True)
+        }
+
+    def _count_batch(self,
+                     batch: pd.DataFrame,
+                     source: str
+                     ) -> pd.Series:
+
+        columns, _format = self.SOURCES[source]
+        df = batch[list(columns)].rename(columns=columns)
+
+        return self._count_keys(self._month_keys(df, _format))
+
+    def _counts_to_frame(self,
+                         counts: pd.Series | None
+                         ) -> pd.DataFrame:
+
+        if counts is None or counts.empty:
+            return pd.DataFrame(columns=['Year', 'Month', 'Quantity'])
+
+        return self.present(self._counts_to_typed(counts))
+
+    async def validate_batches(self,
+                               batches: AsyncIterator[pd.DataFrame],
+                               source: str
+                               ) -> pd.DataFrame:
+        """
+        Validates a stream of parsed row batches, keeping only running counts per month.
+
+        :param batches: Row batches of a parser's ``iter_batches``.
+        :param source: Key of the source in ``SOURCES``.
+        :return: The same (Year, Month, Quantity) frame as the source's validator.
+        """
+        logger.info(f'START: Validate {source} batches.')
+
+        counts: pd.Series | None = None
+        rows = 0
+
+        async for batch in batches:
+            if batch.empty:
+                continue
+            batch_counts = self._count_batch(batch, source)
+            counts = batch_counts if counts is None else counts.add(batch_counts, fill_value=0)
+            rows += len(batch)
+
+        logger.info(f'END: Validate {source} batches, rows: {rows}.')
+
+        return self._counts_to_frame(counts)
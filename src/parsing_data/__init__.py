@@ -2,10 +2,30 @@ from .euronext_parser import EuronextParser
 from .preqveca_parser import PreqvecaParser
 from .investings_parser import InvestingsParser
 from .stockanalysis_parser import StockanalysisParser
+from .http_transport import HttpTransport
+from .response_cache import ResponseCache
+from .table_extractor import TableExtractor
+from .column_builder import Column, ColumnBuilder
+from .source_collector import SourceCollector, SourceResult
+from .watermarks import WatermarkStore
+from .circuit_breaker import CircuitBreaker
+from .recording import Recording
+from .entity_index import EntityIndex
 
 __all__ = [
     'EuronextParser',
     'PreqvecaParser',
     'InvestingsParser',
-    'StockanalysisParser'
+    'StockanalysisParser',
+    'HttpTransport',
+    'ResponseCache',
+    'TableExtractor',
+    'Column',
+    'ColumnBuilder',
+    'SourceCollector',
+    'SourceResult',
+    'WatermarkStore',
+    'CircuitBreaker',
+    'Recording',
+    'EntityIndex'
 ]
\ No newline at end of file
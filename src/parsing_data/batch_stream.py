@@ -0,0 +1,60 @@
+import asyncio
+from typing import AsyncIterator, TypeVar
+
+T = TypeVar('T')
+
+_DONE = object()
+
+
+async def merge_streams(*streams: AsyncIterator[T], ordered: bool = False) -> AsyncIterator[T]:
+    """
+    Runs several async iterators concurrently and yields their items as they arrive.
+
+    An exception of any stream is re-raised to the consumer; leaving the loop early
+    cancels the streams that are still running.
+
+    :param ordered: Yield the items in the order of the streams: items of the first unfinished
+                    stream pass at once, items of later streams wait until the streams before them end.
+    """
+    # One slot per stream keeps at most one undelivered batch per producer
+    queue: asyncio.Queue = asyncio.Queue(maxsize=len(streams))
+
+    async def pump(index: int, stream: AsyncIterator[T]) -> None:
+        # A cancelled pump puts nothing: its consumer is gone and a put on the full queue would never return
+        try:
+            async for item in stream:
+                await queue.put((index, item))
+        except Exception as e:
+            await queue.put((index, e))
+        else:
+            await queue.put((index, _DONE))
+
+    tasks = [asyncio.ensure_future(pump(index, stream)) for index, stream in enumerate(streams)]
+    running = len(tasks)
+    # Items of the streams after the head one, held back in ordered mode
+    head = 0
+    finished = [False] * len(streams)
+    buffered: list[list[T]] = [[] for _ in streams]
+
+    try:
+        while running:
+            index, item = await queue.get()
+            if item is _DONE:
+                running -= 1
+                finished[index] = True
+                while ordered and head < len(streams) and finished[head]:
+                    head += 1
+                    if head < len(streams):
+                        for buffered_item in buffered[head]:
+                            yield buffered_item
+                        buffered[head].clear()
+            elif isinstance(item, Exception):
+                raise item
+            elif not ordered or index == head:
+                yield item
+            else:
+                buffered[index].append(item)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,99 @@
+import json
+import os
+
+import pendulum
+from loguru import logger
+
+
+class CircuitBreaker:
+    def __init__(self,
+                 path: str,
+                 failure_threshold: int = 3,
+                 cool_down: float = 21600
+                 ) -> None:
+        """
+        Circuit breakers of the sources, kept in a JSON file so they span runs.
+
+        A source whose crawls failed ``failure_threshold`` times in a row is open: it is not
+        called until the cool-down has passed, its region keeps the data of the last good
+        crawl. After the cool-down one trial crawl is allowed (half-open); a success closes
+        the breaker, a failure opens it again for another cool-down.
+
+        :param path: Path of the JSON file.
+        :param failure_threshold: Consecutive failed crawls that open the breaker.
+        :param cool_down: Seconds an open breaker keeps the source from being called.
+        """
+        self.path = path
+        self.failure_threshold = failure_threshold
+        self.cool_down = cool_down
+        self._states: dict[str, dict] = dict()
+
+        if os.path.isfile(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as file:
+                    self._states = json.load(file)
+            except Exception as e:
+                logger.warning(f'Circuit breaker state is unreadable and will be reset: {e}')
+
+    def _state(self, source: str) -> dict:
+        return self._states.setdefault(source, {
+            'failures': 0,
+            'opened_at': None,
+            'last_error': None,
+            'last_success': None,
+        })
+
+    def _reopens_at(self, source: str) -> pendulum.DateTime | None:
+        opened_at = self._state(source)['opened_at']
+        if opened_at is None:
+            return None
+        return pendulum.parse(opened_at).add(seconds=self.cool_down)
+
+    def status(self, source: str) -> str:
+        """
+        Returns 'closed', 'open' (cooling down) or 'half-open' (a trial crawl is allowed).
+        """
+        reopens_at = self._reopens_at(source)
+        if reopens_at is None:
+            return 'closed'
+        return 'open' if pendulum.now('UTC') < reopens_at else 'half-open'
+
+    def allow(self, source: str) -> bool:
+        status = self.status(source)
+        if status == 'open':
+            logger.warning(f'Circuit of {source} is open until {self._reopens_at(source).to_datetime_string()} UTC, the source is skipped.')
+            return False
+        if status == 'half-open':
+            logger.info(f'Circuit of {source} is half-open, trying the source again.')
+        return True
+
+    def record_success(self, source: str) -> None:
+        state = self._state(source)
+        if state['opened_at'] is not None:
+            logger.info(f'Circuit of {source} is closed again.')
+        state.update(failures=0, opened_at=None, last_error=None, last_success=pendulum.now('UTC').to_iso8601_string())
+
+    def record_failure(self, source: str, error: str | None = None) -> None:
+        state = self._state(source)
+        half_open = self.status(source) == 'half-open'
+        state['failures'] += 1
+        state['last_error'] = error
+
+        # A failed trial opens the breaker at once, a closed one opens at the threshold
+        if half_open or state['failures'] >= self.failure_threshold:
+            state['opened_at'] = pendulum.now('UTC').to_iso8601_string()
+            logger.error(f'Circuit of {source} is open for {self.cool_down:.0f} s after {state["failures"]} failed crawls.')
+
+    def last_success(self, source: str) -> pendulum.DateTime | None:
+        last_success = self._state(source)['last_success']
+        return pendulum.parse(last_success) if last_success is not None else None
+
+    def save(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Written aside and swapped in, a crash never leaves a half-written file
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(self._states, file, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
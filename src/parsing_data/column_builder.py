@@ -0,0 +1,132 @@
+import re
+from array import array
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+_EPOCH = datetime(1970, 1, 1)
+_NANOSECONDS_IN_MICROSECOND = 1000
+_NAT = np.iinfo(np.int64).min
+# First number of a cell, e.g. '$17.00', '1 250,5 ₽' or '15.00 - 17.00'
+_NUMBER = re.compile(r'-?\d[\d\s,.]*')
+_DECIMAL_COMMA = re.compile(r'-?\d+,\d{1,2}')
+
+
+@dataclass(frozen=True)
+class Column:
+    """
+    Column of a source table kept by the parser.
+
+    :param name: Header of the column in the table and in the resulting DataFrame.
+    :param kind: 'text', 'category' (few distinct values, e.g. exchanges), 'date' or 'number' (float, e.g. prices).
+    :param date_format: strptime format of a 'date' column, None lets pandas guess it.
+    :param position: Index of the column in tables without a header row.
+    :param optional: The column may be missing from the table, its values are then empty.
+    """
+    name: str
+    kind: str = 'text'
+    date_format: str | None = None
+    position: int | None = None
+    optional: bool = False
+
+
+def _date_decoder(date_format: str | None) -> Callable[[str], int]:
+    # Dates repeat a lot within a page, every distinct string is decoded once
+    decoded: dict[str, int] = dict()
+
+    def decode(value: str) -> int:
+        nanoseconds = decoded.get(value)
+        if nanoseconds is not None:
+            return nanoseconds
+        try:
+            if date_format is None:
+                nanoseconds = pd.Timestamp(value).value if value else _NAT
+            else:
+                microseconds = (datetime.strptime(value, date_format) - _EPOCH) // timedelta(microseconds=1)
+                nanoseconds = microseconds * _NANOSECONDS_IN_MICROSECOND
+        except (ValueError, OverflowError):
+            nanoseconds = _NAT
+        decoded[value] = nanoseconds
+        return nanoseconds
+
+    return decode
+
+
+def _number_decoder() -> Callable[[str], float]:
+    decoded: dict[str, float] = dict()
+
+    def decode(value: str) -> float:
+        number = decoded.get(value)
+        if number is not None:
+            return number
+        match = _NUMBER.search(value)
+        if match is None:
+            number = np.nan
+        else:
+            text = re.sub(r'\s', '', match.group()).rstrip(',.')
+            # A single comma followed by one or two digits is the decimal mark ('1 250,5'),
+            # otherwise commas separate thousands ('1,250', '1,250.00')
+            if '.' not in text and _DECIMAL_COMMA.fullmatch(text):
+                text = text.replace(',', '.')
+            else:
+                text = text.replace(',', '')
+            try:
+                number = float(text)
+            except ValueError:
+                number = np.nan
+        decoded[value] = number
+        return number
+
+    return decode
+
+
+_DECODERS = {
+    'date': lambda column: _date_decoder(column.date_format),
+    'number': lambda column: _number_decoder(),
+}
+_ARRAY_TYPES = {'date': 'q', 'number': 'd'}
+
+
+class ColumnBuilder:
+    def __init__(self, columns: list[Column]) -> None:
+        """
+        Accumulates the kept columns of a table row by row.
+
+        Dates are decoded once while the rows arrive and stored as int64 nanoseconds,
+        so the DataFrame gets datetime64 columns without another parsing pass;
+        undecodable dates become NaT. Numbers are decoded the same way into float64, NaN if absent.
+
+        :param columns: Columns to keep, in the order of the values passed to ``append``.
+        """
+        self.columns = columns
+        self._values = [array(_ARRAY_TYPES[column.kind]) if column.kind in _ARRAY_TYPES else [] for column in columns]
+        self._decoders = [
+            _DECODERS[column.kind](column) if column.kind in _DECODERS else None for column in columns
+        ]
+
+    def __len__(self) -> int:
+        return len(self._values[0]) if self._values else 0
+
+    def append(self, row: list[str]) -> None:
+        for values, decode, value in zip(self._values, self._decoders, row):
+            values.append(decode(value) if decode is not None else value)
+
+    def to_frame(self) -> pd.DataFrame:
+        data = dict()
+        for column, values in zip(self.columns, self._values):
+            if column.kind == 'date':
+                data[column.name] = np.array(values, dtype=np.int64).view('datetime64[ns]')
+            elif column.kind == 'number':
+                data[column.name] = np.array(values, dtype=np.float64)
+            elif column.kind == 'category':
+                data[column.name] = pd.Categorical(values)
+            else:
+                data[column.name] = pd.Series(values, dtype=object)
+        return pd.DataFrame(data)
+
+    @classmethod
+    def empty_frame(cls, columns: list[Column]) -> pd.DataFrame:
+        return cls(columns).to_frame()
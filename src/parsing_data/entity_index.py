@@ -0,0 +1,141 @@
+import hashlib
+from collections import Counter
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from ..storage.event_store import SOURCES
+from ..utils.company_names import normalize_name
+
+_NAT = np.iinfo(np.int64).min
+
+
+class EntityIndex:
+    def __init__(self) -> None:
+        """
+        In-memory index of the IPOs of a run across all sources.
+
+        An IPO is identified by the signed 64-bit hash of its normalized company name and date.
+        The index maps every key to the (source, region) pairs that listed it: a row whose pair
+        already has its key is a duplicate (overlapping pages or date windows, a dual listing on
+        the same day), a row whose key was listed by another pair is a cross-source match.
+        Every check is a dict lookup, so deduplication is linear in the rows.
+        """
+        self._owners: dict[int, list[tuple[str, str]]] = dict()
+        # (first source, first region, source, region) -> matched IPOs
+        self.matches: Counter = Counter()
+        self.duplicates: Counter = Counter()
+        self._examples: dict[tuple, tuple[str, str]] = dict()
+        # Names repeat across pages and sources, each distinct one is normalized once
+        self._names: dict[str, str] = dict()
+
+    def __len__(self) -> int:
+        return len(self._owners)
+
+    @staticmethod
+    def _days(dates: pd.Series) -> np.ndarray:
+        # Parsers decode the dates, text comes only from frames restored from a checkpoint (ISO)
+        if not pd.api.types.is_datetime64_any_dtype(dates):
+            dates = pd.to_datetime(dates, errors='coerce')
+        return dates.to_numpy(dtype='datetime64[ns]').astype('datetime64[D]').astype(np.int64)
+
+    @staticmethod
+    def key(name: str, day: int) -> int:
+        """
+        :param name: Name passed through ``normalize_name``.
+        :param day: Days since 1970-01-01.
+        """
+        identity = f'{name}\x1f{day}'.encode('utf-8')
+        return int.from_bytes(hashlib.blake2b(identity, digest_size=8).digest(), 'big', signed=True)
+
+    def add(self,
+            source: str,
+            regions: str | Iterable[str],
+            companies: Iterable,
+            dates: pd.Series
+            ) -> np.ndarray:
+        """
+        Adds rows of a source to the index.
+
+        :param source: Source of the rows.
+        :param regions: Region of every row, or one for all of them.
+        :param companies: Company names of the rows.
+        :param dates: IPO dates of the rows.
+        :return: Mask of the rows to keep; duplicates within the source and region are False.
+                 Rows without a company or a date are kept and not indexed.
+        """
+        days = self._days(dates)
+        if isinstance(regions, str):
+            regions = [regions] * len(days)
+
+        fresh = np.ones(len(days), dtype=bool)
+        for i, (region, company, day) in enumerate(zip(regions, companies, days.tolist())):
+            if day == _NAT or not isinstance(company, str):
+                continue
+            name = self._names.get(company)
+            if name is None:
+                name = self._names[company] = normalize_name(company)
+            if not name:
+                continue
+
+            owner = (source, region)
+            key = self.key(name, day)
+            owners = self._owners.get(key)
+            if owners is None:
+                self._owners[key] = [owner]
+            elif owner in owners:
+                fresh[i] = False
+                self.duplicates[source] += 1
+            else:
+                pair = owners[0] + owner
+                self.matches[pair] += 1
+                self._examples.setdefault(pair, (company, str(np.datetime64(day, 'D'))))
+                owners.append(owner)
+
+        return fresh
+
+    def add_frame(self,
+                  source: str,
+                  region: str,
+                  batch: pd.DataFrame
+                  ) -> np.ndarray:
+        """
+        Adds parsed rows as a parser yields them, see ``add``.
+
+        :param region: Region of the rows, unless the source gives a country per row.
+        """
+        columns = {field: name for name, field in SOURCES[source].items() if name in batch.columns}
+        regions = batch[columns['region']].tolist() if 'region' in columns else region
+
+        return self.add(source, regions, batch[columns['company']].tolist(), batch[columns['date']])
+
+    def report(self) -> dict:
+        """
+        :return: ``{'ipos': ..., 'duplicates': {source: ...}, 'matches': [{'first': ..., 'second': ..., 'ipos': ..., 'example': ...}]}``
+                 with the matches of every pair of (source, region).
+        """
+        return {
+            'ipos': len(self._owners),
+            'duplicates': dict(self.duplicates),
+            'matches': [
+                {
+                    'first': f'{pair[0]}:{pair[1]}',
+                    'second': f'{pair[2]}:{pair[3]}',
+                    'ipos': count,
+                    'example': self._examples[pair],
+                }
+                for pair, count in self.matches.most_common()
+            ],
+        }
+
+    def log_report(self) -> None:
+        report = self.report()
+        logger.info(f'IPOs indexed: {report["ipos"]}, duplicates dropped: {report["duplicates"]}.')
+        for match in report['matches']:
+            company, date = match['example']
+            logger.info(
+                f'Cross-source matches {match["first"]} ~ {match["second"]}: {match["ipos"]} IPOs '
+                f'(e.g. {company}, {date}).'
+            )
@@ -1,87 +1,203 @@
-from bs4 import BeautifulSoup
 import pandas as pd
 import asyncio
 import pendulum
-from httpx import AsyncClient, QueryParams, Response
+import re
+from typing import AsyncIterator
+from httpx import QueryParams, Response
+from lxml.html import HtmlElement
 from loguru import logger
 
+from .batch_stream import merge_streams
+from .http_transport import HttpTransport
+from .column_builder import Column
+from .table_extractor import TableExtractor
+
 class EuronextParser:
-    def __init__(self) -> None:
-        self._http_client = AsyncClient()
+    SOURCE = 'euronext'
+    URL = 'https://live.euronext.com/en/ipo-showcase'
+    COLUMNS = [
+        Column('Date', kind='date', date_format='%d/%m/%Y'),
+        Column('Company name'),
+        Column('Location', kind='category', optional=True),
+    ]
+
+    def __init__(self,
+                 transport: HttpTransport,
+                 concurrency: int = 4,
+                 prefetch_window: int = 4,
+                 streaming: bool = False
+                 ) -> None:
+        """
+        :param transport: Shared HTTP transport.
+        :param concurrency: Maximum number of pages fetched at the same time.
+        :param prefetch_window: Number of pages fetched speculatively when the pager is missing.
+        :param streaming: Parse pages incrementally while they are downloaded.
+        """
+        self._transport = transport
+        self._concurrency = concurrency
+        self._prefetch_window = prefetch_window
+        self._streaming = streaming
+        self._extractor = TableExtractor(columns=self.COLUMNS)
 
     async def _request(self, url: str, params: QueryParams | None = None) -> Response:
-        response = await self._http_client.get(url, params=params)
+        response = await self._transport.get(url, params=params)
         response.raise_for_status()
         return response
-    
-    async def parse_data(self) -> pd.DataFrame:
-
-        logger.info('START: Parsing data from Euronext')
 
-        page = 0
-        aux_dict: dict[str, list] = dict()
+    async def _request_batches(self,
+                               url: str,
+                               params: QueryParams | None = None,
+                               trees: list[HtmlElement] | None = None
+                               ) -> AsyncIterator[pd.DataFrame]:
+        """
+        Yields the rows of a page: every chunk parsed while a streamed page downloads, the whole table otherwise.
+
+        :param trees: Receives the page tree once the rows are read.
+        """
+        if self._streaming:
+            async with self._transport.stream('GET', url, params=params) as response:
+                response.raise_for_status()
+                stream = self._extractor.streaming(encoding=response.encoding)
+                async for table in self._extractor.extract_stream(response, stream):
+                    yield table
+            tree = stream.root
+        else:
+            tree = TableExtractor.parse((await self._request(url, params=params)).text)
+            table = self._extractor.extract(tree)
+            if table is not None:
+                yield table
+
+        if trees is not None:
+            trees.append(tree)
+
+    def _last_page(self, tree: HtmlElement) -> int | None:
+        """
+        Reads the number of the last page from the pager, None if there is no pager.
+        """
+        hrefs = tree.xpath('//*[contains(concat(" ", normalize-space(@class), " "), " pager ")]//a/@href')
+
+        pages = [
+            int(match.group(1))
+            for href in hrefs
+            if (match := re.search(r'[?&]page=(\d+)', href))
+        ]
+
+        return max(pages) if pages else None
+
+    async def _page_batches(self,
+                            params: QueryParams,
+                            page: int,
+                            semaphore: asyncio.Semaphore
+                            ) -> AsyncIterator[pd.DataFrame]:
+
+        # A missing page fails the crawl, a truncated history must not replace the stored one
+        async with semaphore:
+            try:
+                async for table in self._request_batches(self.URL, params=params.set('page', str(page))):
+                    yield table
+            except Exception as e:
+                logger.error(f'Error while parsing Euronext page {page}: {e}')
+                raise
+
+    async def _fetch_page(self,
+                          params: QueryParams,
+                          page: int,
+                          semaphore: asyncio.Semaphore
+                          ) -> pd.DataFrame:
+        """
+        Returns all rows of a page, an empty frame if the page has no rows.
+        """
+        frames = [table async for table in self._page_batches(params, page, semaphore)]
+        return pd.concat(frames, axis=0, ignore_index=True) if frames else self._extractor.empty_frame()
+
+    async def _window_pages(self,
+                            params: QueryParams,
+                            semaphore: asyncio.Semaphore
+                            ) -> AsyncIterator[pd.DataFrame]:
+
+        page = 1
 
+        while True:
+            window = await asyncio.gather(*(
+                self._fetch_page(params, page + shift, semaphore) for shift in range(self._prefetch_window)
+            ))
+            for result in window:
+                if result.empty:
+                    return
+                yield result
+            page += self._prefetch_window
+
+    async def iter_batches(self,
+                           since: pendulum.Date | None = None,
+                           until: pendulum.Date | None = None
+                           ) -> AsyncIterator[pd.DataFrame]:
+        """
+        Yields the rows of every page as DataFrames in page order, while later pages are still downloading.
+
+        :param since: First IPO date to collect, the start of the previous year by default.
+        :param until: Last IPO date to collect, today by default.
+        """
         today = pendulum.now('Europe/Moscow').date()
         prev_year = today.subtract(years=1).year
-        start = pendulum.date(year=prev_year, month=1, day=1).format('MM/DD/Y')
-        end = today.format('MM/DD/Y')
+        start = (since or pendulum.date(year=prev_year, month=1, day=1)).format('MM/DD/Y')
+        end = (until or today).format('MM/DD/Y')
 
         params_types = {
             'combine': str(),
             'field_iponi_ipo_date_value[min]': str(start),
             'field_iponi_ipo_date_value[max]': str(end),
-            'page': str(page)
+            'page': str(0)
         }
 
         params = QueryParams(params_types)
 
-        while True:
+        trees = []
+        rows = 0
+        try:
+            async for table in self._request_batches(self.URL, params=params, trees=trees):
+                if not table.empty:
+                    rows += len(table)
+                    yield table
+        except Exception as e:
+            logger.error(f'Error while parsing Euronext: {e}')
+            raise
+
+        if not rows:
+            return
+
+        semaphore = asyncio.Semaphore(self._concurrency)
+        last_page = self._last_page(trees[0])
+
+        if last_page is not None:
+            pages = merge_streams(
+                *(self._page_batches(params, page, semaphore) for page in range(1, last_page + 1)), ordered=True
+            )
+        else:
+            pages = self._window_pages(params, semaphore)
+
+        async for page in pages:
+            if not page.empty:
+                yield page
+
+    async def parse_data(self,
+                         since: pendulum.Date | None = None,
+                         until: pendulum.Date | None = None
+                         ) -> pd.DataFrame:
 
-            url = 'https://live.euronext.com/en/ipo-showcase'
+        logger.info('START: Parsing data from Euronext')
 
-            params = params.set('page', str(page))
-            
-            try:
-                response = await self._request(url, params=params)
-            except Exception as e:
-                logger.error(f'Error while parsing Euronext')
-                break
-
-            soup = BeautifulSoup(response.text, 'html.parser')
-
-            links = soup.find_all('tr')
-
-            if not links:
-                break
-
-            for num, link in enumerate(links):
-                if num == 0:
-                    columns_list = []
-                    items = link.find_all('th')
-                    for item in items:
-                        item = item.text
-                        columns_list.append(item)
-                        if aux_dict.get(item) is None:
-                            aux_dict[item] = []
-                        else:
-                            pass
-                else:
-                    items = link.find_all('td')
-        
-                    for j, item in enumerate(items):
-                        value = item.text.strip()
-                        aux_dict[columns_list[j]].append(value)
-
-            page += 1
+        frames = [batch async for batch in self.iter_batches(since, until)]
+        df = pd.concat(frames, axis=0, ignore_index=True) if frames else self._extractor.empty_frame()
 
         logger.info('END: Parsing data from Euronext')
 
-        return pd.DataFrame.from_dict(aux_dict), 'Europe'
-    
+        return df, 'Europe'
+
 async def main():
-    parser = EuronextParser()
-    df, _ = await parser.parse_data()
+    async with HttpTransport() as transport:
+        parser = EuronextParser(transport)
+        df, _ = await parser.parse_data()
     df.to_csv('output.csv')
 
 if __name__ == '__main__':
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
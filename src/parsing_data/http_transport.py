@@ -0,0 +1,360 @@
+import asyncio
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable
+
+from httpx import AsyncClient, Limits, Request, Response, Timeout, TransportError
+from loguru import logger
+
+from ..run_checkpoint import RunCheckpoint
+from .rate_limiter import AdaptiveLimiter
+from .recording import Recording, ReplayRouter
+from .request_policy import RequestPolicy
+from .response_cache import ResponseCache
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+try:
+    import brotli  # noqa: F401
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+
+class HttpTransport:
+    def __init__(self,
+                 settings: dict | None = None,
+                 cache: ResponseCache | None = None,
+                 checkpoint: RunCheckpoint | None = None,
+                 recorder: Recording | None = None
+                 ) -> None:
+        """
+        Shared HTTP layer of all parsers.
+
+        One pooled ``AsyncClient`` keeps connections alive between the pages of a crawl,
+        negotiates HTTP/2 and compression, and counts traffic per host. Requests to every
+        host pass through its ``AdaptiveLimiter``, so all parsers share the same limits, and
+        are retried (or hedged) by the ``RequestPolicy`` of the 'retry' settings.
+
+        :param settings: The 'transport' section of the parsing settings.
+        :param cache: On-disk response cache consulted before every request.
+        :param checkpoint: Checkpoint of the run; pages it lists are served from the cache
+                           without a request, and every page fetched is added to it.
+        :param recorder: Recording receiving every response handed to the parsers (record mode);
+                         streamed responses are then read whole.
+        """
+        settings = settings or dict()
+        self._cache = cache
+        self._checkpoint = checkpoint
+        self._recorder = recorder
+        if checkpoint is not None and cache is None:
+            logger.warning('Response cache is disabled, fetched pages are not checkpointed.')
+
+        http2 = settings.get('http2', True)
+        if http2 and not HTTP2_AVAILABLE:
+            logger.warning('Package h2 is not installed, HTTP/2 is disabled.')
+            http2 = False
+
+        encodings = ['gzip', 'deflate']
+        if BROTLI_AVAILABLE:
+            encodings.append('br')
+
+        self._rate_limit = {
+            'max_concurrency': settings.get('max_connections_per_host', 10),
+            **settings.get('rate_limit', dict()),
+        }
+        limits = Limits(
+            max_connections=settings.get('max_connections', 40),
+            max_keepalive_connections=settings.get('max_keepalive_connections', 20),
+            keepalive_expiry=settings.get('keepalive_expiry', 30),
+        )
+        # With replay_url set every request goes to the local stand-in server instead of its site
+        replay_url = settings.get('replay_url')
+        if replay_url is not None:
+            logger.info(f'Requests are replayed by the stand-in server at {replay_url}.')
+        self._client = AsyncClient(
+            http2=http2,
+            limits=limits,
+            transport=ReplayRouter(replay_url, http2=http2, limits=limits) if replay_url is not None else None,
+            timeout=Timeout(
+                settings.get('timeout', 30),
+                connect=settings.get('connect_timeout', 10),
+            ),
+            headers={
+                'Accept-Encoding': ', '.join(encodings),
+                'User-Agent': settings.get('user_agent', 'Mozilla/5.0 (X11; Linux x86_64) ipo-bot'),
+            },
+            follow_redirects=True,
+        )
+        self._limiters: dict[str, AdaptiveLimiter] = dict()
+        self._policy = RequestPolicy(**settings.get('retry', dict()))
+        self._stats: dict[str, dict[str, int]] = defaultdict(
+            lambda: {
+                'requests': 0, 'cache_hits': 0, 'bytes_downloaded': 0, 'bytes_decoded': 0,
+                'retries': 0, 'hedges': 0, 'hedge_wins': 0,
+            }
+        )
+        # Seconds per logical request (page), retries and hedges included
+        self._latencies: dict[str, list[float]] = defaultdict(list)
+
+    def _limiter(self, host: str) -> AdaptiveLimiter:
+        if host not in self._limiters:
+            self._limiters[host] = AdaptiveLimiter(**self._rate_limit)
+        return self._limiters[host]
+
+    def _account(self, host: str, response: Response) -> None:
+        stats = self._stats[host]
+        stats['requests'] += 1
+        stats['bytes_downloaded'] += response.num_bytes_downloaded
+        stats['bytes_decoded'] += len(response.content)
+
+    async def _send_once(self,
+                         request: Request,
+                         stream: bool = False,
+                         on_sent: Callable[[], None] | None = None
+                         ) -> tuple[Response, float]:
+        """
+        Makes one attempt under the limiter of the host.
+
+        :param on_sent: Called when the request leaves the limiter queue.
+        :return: The response and its latency; a streamed response keeps its slot in the
+                 limiter until ``_finish_stream``.
+        """
+        limiter = self._limiter(request.url.host)
+
+        await limiter.acquire()
+        if on_sent is not None:
+            on_sent()
+        started = time.perf_counter()
+        try:
+            response = await self._policy.timed(self._client.send(request, stream=stream), request)
+        except asyncio.CancelledError:
+            limiter.cancel()
+            raise
+        except Exception:
+            limiter.release(None, time.perf_counter() - started)
+            raise
+        latency = time.perf_counter() - started
+
+        if not stream:
+            limiter.release(response.status_code, latency, response.headers.get('retry-after'))
+            self._account(request.url.host, response)
+
+        return response, latency
+
+    async def _send(self, request: Request) -> Response:
+        host = request.url.host
+
+        async def send(on_sent: Callable[[], None] | None) -> Response:
+            # Hedged attempts run at the same time, each one sends its own request
+            attempt = Request(
+                request.method, request.url, headers=request.headers, content=request.content, extensions=request.extensions
+            )
+            response, _ = await self._send_once(attempt, on_sent=on_sent)
+            return response
+
+        started = time.perf_counter()
+        response = await self._policy.execute(send, request, self._stats[host])
+        self._latencies[host].append(time.perf_counter() - started)
+
+        return response
+
+    def _reusable(self, key: str, entry: dict | None) -> bool:
+        # Pages fetched earlier in the same run are reused even when their TTL has expired
+        return entry is not None and (
+            self._cache.is_fresh(entry) or (self._checkpoint is not None and self._checkpoint.has_page(key))
+        )
+
+    def _checkpoint_page(self, key: str) -> None:
+        if self._checkpoint is not None and self._checkpoint.add_page(key):
+            # The bodies are indexed before the checkpoint refers to them
+            self._cache.save()
+            self._checkpoint.save()
+
+    async def _send_cached(self, request: Request) -> Response:
+        key = self._cache.make_key(request)
+        entry = self._cache.lookup(key)
+
+        if self._reusable(key, entry):
+            self._cache.stats['hits'] += 1
+            self._stats[request.url.host]['cache_hits'] += 1
+            self._checkpoint_page(key)
+            return self._cache.build_response(key, entry, request)
+
+        if entry is not None:
+            request.headers.update(self._cache.conditional_headers(entry))
+
+        response = await self._send(request)
+
+        if entry is not None and response.status_code == 304:
+            self._cache.stats['revalidated'] += 1
+            self._cache.refresh(key, entry, response)
+            self._checkpoint_page(key)
+            return self._cache.build_response(key, entry, request)
+
+        self._cache.stats['misses'] += 1
+        if response.status_code == 200:
+            self._cache.store(key, response)
+            self._checkpoint_page(key)
+
+        return response
+
+    async def request(self, method: str, url: str, **kwargs: Any) -> Response:
+        request = self._client.build_request(method, url, **kwargs)
+        if self._cache is not None:
+            response = await self._send_cached(request)
+        else:
+            response = await self._send(request)
+        if self._recorder is not None:
+            self._recorder.add(request, response)
+        return response
+
+    @asynccontextmanager
+    async def stream(self, method: str, url: str, **kwargs: Any) -> AsyncIterator[Response]:
+        """
+        Opens a response whose body is read chunk by chunk with ``aiter_bytes``.
+
+        A fresh (or checkpointed) cached response is replayed from the cache; streamed bodies
+        themselves are not cached, and only their downloaded bytes are counted.
+        """
+        # A recorded body has to be read whole, it is fetched as a plain request
+        if self._recorder is not None:
+            yield await self.request(method, url, **kwargs)
+            return
+
+        request = self._client.build_request(method, url, **kwargs)
+        host = request.url.host
+
+        if self._cache is not None:
+            key = self._cache.make_key(request)
+            entry = self._cache.lookup(key)
+            if self._reusable(key, entry):
+                self._cache.stats['hits'] += 1
+                self._stats[host]['cache_hits'] += 1
+                yield self._cache.build_response(key, entry, request)
+                return
+
+        # Only opening the stream is retried, a body that broke off is not replayed
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            try:
+                response, latency = await self._send_once(request, stream=True)
+            except TransportError as e:
+                if attempt == self._policy.retries:
+                    raise
+                delay = self._policy.delay(attempt)
+                logger.warning(f'{method} {request.url} failed ({e!r}), retry in {delay:.1f} s.')
+            else:
+                if not self._policy.is_retryable(response) or attempt == self._policy.retries:
+                    break
+                delay = self._policy.delay(attempt, response)
+                logger.warning(f'{method} {request.url} returned {response.status_code}, retry in {delay:.1f} s.')
+                await self._finish_stream(request, response, latency)
+            attempt += 1
+            self._stats[host]['retries'] += 1
+            await asyncio.sleep(delay)
+        self._latencies[host].append(time.perf_counter() - started)
+
+        try:
+            yield response
+        finally:
+            await self._finish_stream(request, response, latency)
+
+    async def _finish_stream(self, request: Request, response: Response, latency: float) -> None:
+        # The request stays in flight until its body is read
+        host = request.url.host
+        await response.aclose()
+        self._limiter(host).release(response.status_code, latency, response.headers.get('retry-after'))
+        self._stats[host]['requests'] += 1
+        self._stats[host]['bytes_downloaded'] += response.num_bytes_downloaded
+
+    async def get(self, url: str, **kwargs: Any) -> Response:
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url: str, **kwargs: Any) -> Response:
+        return await self.request('POST', url, **kwargs)
+
+    def get_stats(self) -> dict[str, dict[str, int]]:
+        """
+        Returns request, byte and retry counters per host.
+
+        :return: ``{host: {'requests': ..., 'bytes_downloaded': ..., 'bytes_decoded': ..., 'retries': ...,
+                 'hedges': ..., 'hedge_wins': ...}}``, where downloaded bytes are the compressed bytes
+                 on the wire and requests count every attempt.
+        """
+        return {host: dict(stats) for host, stats in self._stats.items()}
+
+    def get_limits(self) -> dict[str, dict[str, float | int | None]]:
+        """
+        Returns the current limits of every host.
+
+        :return: ``{host: {'concurrency_limit': ..., 'rate': ..., 'in_flight': ..., 'latency': ...,
+                 'paused_for': ..., 'requests': ..., 'throttled': ..., 'errors': ..., 'paused': ...}}``.
+        """
+        return {host: limiter.get_metrics() for host, limiter in self._limiters.items()}
+
+    def get_latency_percentiles(self) -> dict[str, dict[str, float]]:
+        """
+        Returns latency percentiles of the requests of every host, in seconds.
+
+        :return: ``{host: {'count': ..., 'p50': ..., 'p90': ..., 'p99': ..., 'max': ...}}``.
+        """
+        percentiles = dict()
+        for host, latencies in self._latencies.items():
+            if not latencies:
+                continue
+            ordered = sorted(latencies)
+
+            def rank(quantile: float) -> float:
+                return round(ordered[min(len(ordered) - 1, int(quantile * len(ordered)))], 3)
+
+            percentiles[host] = {
+                'count': len(ordered),
+                'p50': rank(0.5),
+                'p90': rank(0.9),
+                'p99': rank(0.99),
+                'max': round(ordered[-1], 3),
+            }
+        return percentiles
+
+    def log_stats(self) -> None:
+        for host, stats in self.get_stats().items():
+            logger.info(
+                f'Traffic of {host}: {stats["requests"]} requests, {stats["cache_hits"]} cache hits, '
+                f'{round(stats["bytes_downloaded"] / 1024, 1)} KB downloaded, '
+                f'{round(stats["bytes_decoded"] / 1024, 1)} KB decoded, {stats["retries"]} retries, '
+                f'{stats["hedge_wins"]} of {stats["hedges"]} hedges won.'
+            )
+        for host, latency in self.get_latency_percentiles().items():
+            logger.info(
+                f'Latency of {host} over {latency["count"]} requests: p50 {latency["p50"]} s, '
+                f'p90 {latency["p90"]} s, p99 {latency["p99"]} s, max {latency["max"]} s.'
+            )
+        for host, limits in self.get_limits().items():
+            logger.info(
+                f'Limits of {host}: {limits["concurrency_limit"]} in flight, {limits["rate"]} req/s, '
+                f'{limits["throttled"]} throttled, {limits["errors"]} failed, {limits["paused"]} Retry-After pauses.'
+            )
+        if self._cache is not None:
+            self._cache.log_stats()
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+        if self._recorder is not None:
+            self._recorder.save()
+        if self._cache is not None:
+            self._cache.save()
+            if self._checkpoint is not None:
+                self._checkpoint.save()
+
+    async def __aenter__(self) -> 'HttpTransport':
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
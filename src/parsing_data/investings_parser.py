@@ -1,30 +1,54 @@
-from httpx import AsyncClient, Response, QueryParams, Headers
+from httpx import Response, QueryParams, Headers
 import pandas as pd
 import asyncio
 import pendulum
-from bs4 import BeautifulSoup
+from typing import AsyncIterator
 from loguru import logger
 
+from .batch_stream import merge_streams
+from .http_transport import HttpTransport
+from .column_builder import Column
+from .entity_index import EntityIndex
+from .table_extractor import TableExtractor
+
 class InvestingsParser:
-    def __init__(self) -> None:
-        self._http_client = AsyncClient()
+    SOURCE = 'investings'
+    # The calendar never returns more than this number of rows for one query
+    ROW_CAP = 200
+    # The rows come without a header, columns are taken by position
+    COLUMNS = [
+        Column('Дата IPO', kind='date', position=0),
+        Column('Компания', position=1),
+        Column('Биржа', kind='category', position=2),
+        Column('Цена IPO', kind='number', position=4),
+    ]
+
+    def __init__(self,
+                 transport: HttpTransport,
+                 concurrency: int = 4,
+                 countries: dict[str, int] | None = None
+                 ) -> None:
+        """
+        :param transport: Shared HTTP transport.
+        :param concurrency: Maximum number of date windows fetched at the same time, shared by all countries.
+        :param countries: Investing.com country IDs keyed by region, China (37) by default.
+        """
+        self._transport = transport
+        self._concurrency = concurrency
+        self._countries = countries or {'China': 37}
+        # The company cell also holds the ticker, the name is in span.elp
+        self._extractor = TableExtractor(
+            cell_xpaths={1: './/span[contains(concat(" ", normalize-space(@class), " "), " elp ")]'},
+            columns=self.COLUMNS
+        )
 
     async def _request(self, url: str, body: QueryParams, headers: Headers) -> Response:
-        response = await self._http_client.post(url=url, data=body, headers=headers)
+        response = await self._transport.post(url=url, data=body, headers=headers)
         response.raise_for_status()
         return response
-    
-    def validate_data(self, df: pd.DataFrame) -> pd.DataFrame:
-        df['Дата IPO'] = pd.to_datetime(df['Дата IPO'])
-        return df
 
     async def _parse_part_of_data(self, start: str, end: str, country: int = 37) -> pd.DataFrame:
 
-        # today = pendulum.now('Europe/Moscow').date()
-        # prev_year = today.subtract(years=1).year
-        # start = pendulum.date(year=prev_year, month=1, day=1).format('Y-MM-DD')
-        # end = today.format('Y-MM-DD')
-
         url = 'https://www.investing.com/ipo-calendar/Service/getCalendarFilteredData'
 
         body_types = {
@@ -45,65 +69,113 @@ class InvestingsParser:
         try:
             response = await self._request(url=url, body=body, headers=headers)
         except Exception as e:
-            logger.error(f'Error while parsing Investings')
+            logger.error(f'Error while parsing Investings window {start} - {end}: {e}')
+            raise
 
-        res_list = []
         data = response.json()
-        soup = BeautifulSoup(data['data'], 'html.parser')
-        rows = soup.findAll('tr')
-        for row in rows:
-            row_columns = row.find_all('td')
-
-            date_ipo = row_columns[0].text
-            company_name = row_columns[1].find('span', class_='elp').text
-            exchange_name = row_columns[2].text
-            estimation_ipo = row_columns[3].text
-            price_ipo = row_columns[4].text
-            price = row_columns[5].text
-            
-            _row = {
-                'Дата IPO': date_ipo,
-                'Компания': company_name,
-                'Биржа': exchange_name,
-                'Оценка IPO': estimation_ipo,
-                'Цена IPO': price_ipo,
-                'Цена': price
-            }
-
-            res_list.append(_row)
-        
-        return self.validate_data(pd.json_normalize(res_list))
-
-    async def parse_data(self) -> pd.DataFrame:
-        
-        logger.info('START: Parsing data from Investings')
+        # The payload is a bare list of rows, a table keeps lxml from dropping them
+        table = self._extractor.extract(f'<table>{data["data"]}</table>')
+
+        return table if table is not None else self._extractor.empty_frame()
+
+    async def _crawl_range(self,
+                           start: pendulum.Date,
+                           end: pendulum.Date,
+                           country: int,
+                           semaphore: asyncio.Semaphore
+                           ) -> AsyncIterator[pd.DataFrame]:
+        """
+        Fetches a date window and splits it in halves while the window hits the row cap.
+        """
+        async with semaphore:
+            df = await self._parse_part_of_data(start=start.format('Y-MM-DD'), end=end.format('Y-MM-DD'), country=country)
+
+        if len(df) < self.ROW_CAP:
+            yield df
+            return
+
+        if start >= end:
+            logger.warning(f'Investings returned {len(df)} rows for the single day {start} in country {country}, rows may be missing.')
+            yield df
+            return
+
+        middle = start.add(days=(end - start).in_days() // 2)
+        async for batch in merge_streams(
+            self._crawl_range(start, middle, country, semaphore),
+            self._crawl_range(middle.add(days=1), end, country, semaphore),
+        ):
+            yield batch
+
+    async def _crawl_country(self,
+                             region: str,
+                             country: int,
+                             start: pendulum.Date,
+                             end: pendulum.Date,
+                             semaphore: asyncio.Semaphore
+                             ) -> AsyncIterator[pd.DataFrame]:
+
+        windows = 0
+        rows = 0
+        async for df in self._crawl_range(start, end, country, semaphore):
+            windows += 1
+            rows += len(df)
+            df.insert(0, 'Страна', region)
+            yield df
+
+        logger.info(f'Investings {region}: {rows} rows from {windows} date windows.')
+
+    def _empty_frame(self) -> pd.DataFrame:
+        df = self._extractor.empty_frame()
+        df.insert(0, 'Страна', pd.Series(dtype=object))
+        return df
+
+    async def iter_batches(self,
+                           since: pendulum.Date | None = None,
+                           until: pendulum.Date | None = None
+                           ) -> AsyncIterator[pd.DataFrame]:
+        """
+        Yields the rows of every final date window as a DataFrame; all countries are crawled concurrently.
 
+        :param since: First IPO date to collect, the start of the previous year by default.
+        :param until: Last IPO date to collect, today by default.
+        """
         today = pendulum.now('Europe/Moscow').date()
         prev_year = today.subtract(years=1).year
-        start = pendulum.date(year=prev_year, month=1, day=1).format('Y-MM-DD')
-        end = today.format('Y-MM-DD')
-
-        df_old = await self._parse_part_of_data(start=start, end=end)
-        start = df_old['Дата IPO'].max()
-
-        if len(df_old) == 200:
-            df_append = df_old
-            while len(df_append) == 200:
-                df_append = await self._parse_part_of_data(start=start, end=end)
-                start = df_append['Дата IPO'].max()
-                df_appended = pd.concat([df_old, df_append], axis=0)
-                df_appended.drop_duplicates(inplace=True)
-
-            logger.info('END: Parsing data from Investings')
-            return df_appended, 'China'
-        else: 
-            logger.info('END: Parsing data from Investings')
-            return df_old, 'China'
-            
+        start = since or pendulum.date(year=prev_year, month=1, day=1)
+        end = until or today
+
+        semaphore = asyncio.Semaphore(self._concurrency)
+        batches = merge_streams(*(
+            self._crawl_country(region, country, start, end, semaphore)
+            for region, country in self._countries.items()
+        ))
+
+        # Overlapping windows repeat rows, a company listed on two exchanges the same day is kept once
+        entities = EntityIndex()
+        async for batch in batches:
+            batch = batch[entities.add_frame(self.SOURCE, None, batch)]
+            if not batch.empty:
+                yield batch.reset_index(drop=True)
+
+    async def parse_data(self,
+                         since: pendulum.Date | None = None,
+                         until: pendulum.Date | None = None
+                         ) -> pd.DataFrame:
+
+        logger.info('START: Parsing data from Investings')
+
+        frames = [batch async for batch in self.iter_batches(since, until)]
+        df = pd.concat(frames, axis=0, ignore_index=True) if frames else self._empty_frame()
+
+        logger.info('END: Parsing data from Investings')
+
+        return df, 'China'
+
 async def main():
-    parser = InvestingsParser()
-    df, _ = await parser.parse_data()
+    async with HttpTransport() as transport:
+        parser = InvestingsParser(transport)
+        df, _ = await parser.parse_data()
     df.to_csv('output.csv')
 
 if __name__ == '__main__':
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -1,33 +1,160 @@
-from httpx import AsyncClient, QueryParams, Response 
+from httpx import QueryParams, Response
 import asyncio
+import re
+from typing import AsyncIterator
 import pandas as pd
 import pendulum
-from bs4 import BeautifulSoup
+from lxml.html import HtmlElement
 from loguru import logger
 
+from .batch_stream import merge_streams
+from .http_transport import HttpTransport
+from .column_builder import Column
+from .entity_index import EntityIndex
+from .table_extractor import TableExtractor
+
 class PreqvecaParser:
-    def __init__(self) -> None:
-        self._http_client = AsyncClient()
+    SOURCE = 'preqveca'
+    URL = 'https://preqveca.ru/placements/'
+    PAGE_SIZE = 30
+    COLUMNS = [
+        Column('Дата окончания размещения', kind='date', date_format='%d.%m.%Y'),
+        Column('Название IPO / SPO'),
+        Column('Цена размещения', kind='number', optional=True),
+    ]
+
+    def __init__(self,
+                 transport: HttpTransport,
+                 concurrency: int = 4,
+                 prefetch_window: int = 4,
+                 ipo_modes: list[int] | None = None,
+                 streaming: bool = False
+                 ) -> None:
+        """
+        :param transport: Shared HTTP transport.
+        :param concurrency: Maximum number of offsets fetched at the same time.
+        :param prefetch_window: Number of offsets fetched speculatively when the record counter is missing.
+        :param ipo_modes: Values of 'sf[pt]' collected in one run, IPO only by default.
+        :param streaming: Parse pages incrementally while they are downloaded.
+        """
+        self._transport = transport
+        self._concurrency = concurrency
+        self._prefetch_window = prefetch_window
+        self._ipo_modes = ipo_modes or [1]
+        self._streaming = streaming
+        self._extractor = TableExtractor(
+            table_tag='table',
+            table_predicate='contains(concat(" ", normalize-space(@class), " "), " datagrid ")',
+            columns=self.COLUMNS
+        )
 
     async def _request(self, url: str, params: QueryParams | None = None) -> Response:
-        response = await self._http_client.get(url, params=params)
+        response = await self._transport.get(url, params=params)
         response.raise_for_status()
         return response
-        
-    async def parse_data(self, ipo_mode: int = 1) -> pd.DataFrame:
 
-        logger.info('START: Parsing data from Preqveca')
+    async def _request_batches(self,
+                               url: str,
+                               params: QueryParams | None = None,
+                               trees: list[HtmlElement] | None = None
+                               ) -> AsyncIterator[pd.DataFrame]:
+        """
+        Yields the rows of the datagrid: every chunk parsed while a streamed page downloads, the whole table otherwise.
+        Nothing is yielded if the page has no datagrid.
 
-        today = pendulum.now('Europe/Moscow').date()
-        prev_year = today.subtract(years=5).year
-        start = pendulum.date(year=prev_year, month=1, day=1).format('DD.MM.Y')
-        end = today.format('DD.MM.Y')
+        :param trees: Receives the page tree once the rows are read.
+        """
+        if self._streaming:
+            async with self._transport.stream('GET', url, params=params) as response:
+                response.raise_for_status()
+                stream = self._extractor.streaming(encoding=response.encoding)
+                async for table in self._extractor.extract_stream(response, stream):
+                    yield table
+            tree = stream.root
+        else:
+            tree = TableExtractor.parse((await self._request(url=url, params=params)).text)
+            table = self._extractor.extract(tree)
+            if table is not None:
+                yield table
+
+        if trees is not None:
+            trees.append(tree)
+
+    def _total_records(self, tree: HtmlElement) -> int | None:
+        """
+        Reads the number of records from the record counter of the first page, None without a counter.
+        """
+        match = re.search(r'(?:Всего|Найдено)[^\d]{0,40}(\d+)', tree.text_content())
+        if match:
+            return int(match.group(1))
+
+        return None
 
-        url = 'https://preqveca.ru/placements/'
+    def _pager_end(self, tree: HtmlElement) -> int | None:
+        """
+        Reads the offset after the last page linked by the pager, None without a pager.
+        The pager may show only a window of its pages, so records may follow this offset.
+        """
+        offsets = [
+            int(match.group(1))
+            for href in tree.xpath('//a/@href')
+            if (match := re.search(r'rec_start=(\d+)', href))
+        ]
 
-        aux_list: list[dict] = list()
+        return max(offsets) + self.PAGE_SIZE if offsets else None
+
+    async def _offset_batches(self,
+                              params: QueryParams,
+                              offset: int,
+                              semaphore: asyncio.Semaphore
+                              ) -> AsyncIterator[pd.DataFrame]:
+
+        # A missing page fails the crawl, a truncated history must not replace the stored one
+        async with semaphore:
+            try:
+                async for rows in self._request_batches(url=self.URL, params=params.set('rec_start', str(offset))):
+                    yield rows
+            except Exception as e:
+                logger.error(f'Error while parsing Preqveca offset {offset}: {e}')
+                raise
+
+    async def _fetch_offset(self,
+                            params: QueryParams,
+                            offset: int,
+                            semaphore: asyncio.Semaphore
+                            ) -> pd.DataFrame:
+        """
+        Returns all rows of an offset, an empty frame if the page has no rows.
+        """
+        frames = [rows async for rows in self._offset_batches(params, offset, semaphore)]
+        return pd.concat(frames, axis=0, ignore_index=True) if frames else self._extractor.empty_frame()
+
+    async def _window_offsets(self,
+                              params: QueryParams,
+                              semaphore: asyncio.Semaphore,
+                              offset: int
+                              ) -> AsyncIterator[pd.DataFrame]:
+        """
+        Fetches windows of offsets from ``offset`` on until a page comes back empty.
+        """
+
+        while True:
+            window = await asyncio.gather(*(
+                self._fetch_offset(params, offset + shift * self.PAGE_SIZE, semaphore)
+                for shift in range(self._prefetch_window)
+            ))
+            for rows in window:
+                if rows.empty:
+                    return
+                yield rows
+            offset += self._prefetch_window * self.PAGE_SIZE
 
-        count: int = 0
+    async def _mode_batches(self,
+                            ipo_mode: int,
+                            start: str,
+                            end: str,
+                            semaphore: asyncio.Semaphore
+                            ) -> AsyncIterator[pd.DataFrame]:
 
         params_types = {
             'sf[ipo_t]': str(),
@@ -42,49 +169,98 @@ class PreqvecaParser:
             'sf[ind]': str(0),
             'sf[pef]': str(),
             'sf[pet]': str(),
-            'rec_start': str(count)
+            'rec_start': str(0)
         }
 
         params = QueryParams(params_types)
 
-        while True:
-            
-            # params['rec_start'] = count
+        trees = []
+        rows_count = 0
+        try:
+            async with semaphore:
+                async for rows in self._request_batches(url=self.URL, params=params, trees=trees):
+                    if not rows.empty:
+                        rows_count += len(rows)
+                        rows['ipo_mode'] = ipo_mode
+                        yield rows
+        except Exception as e:
+            logger.error(f'Error while parsing Preqveca: {e}')
+            raise
 
-            params = params.set('rec_start', str(count))
+        if not rows_count:
+            return
 
-            try:
-                response = await self._request(url=url, params=params)
-                soup = BeautifulSoup(response.text, 'html.parser')
-                table = soup.find('table', class_='datagrid')
-                if table is not None:
-                    rows = table.find_all('tr')
-                else:
-                    break
-            except Exception as e:
-                logger.error(f'Error while parsing Preqveca')
-                break
-                      
-            for num, row in enumerate(rows):
-                if num == 0:
-                    headers = row.find_all('th')
-                    headers_list = [header.text for header in headers]
-                else:
-                    _dict = dict()
-                    for j, data in enumerate(row.find_all('td')):
-                        _dict[headers_list[j]] = data.text
-                    aux_list.append(_dict)
-
-            count += 30
+        total = self._total_records(trees[0])
+        if total is not None:
+            pages = merge_streams(*(
+                self._offset_batches(params, offset, semaphore) for offset in range(self.PAGE_SIZE, total, self.PAGE_SIZE)
+            ), ordered=True)
+        else:
+            # Offsets past the pager are probed until an empty page, the pager may hide the last ones
+            end = self._pager_end(trees[0]) or self.PAGE_SIZE
+            pages = merge_streams(
+                *(self._offset_batches(params, offset, semaphore) for offset in range(self.PAGE_SIZE, end, self.PAGE_SIZE)),
+                self._window_offsets(params, semaphore, end),
+                ordered=True,
+            )
+
+        async for rows in pages:
+            if not rows.empty:
+                rows_count += len(rows)
+                rows['ipo_mode'] = ipo_mode
+                yield rows
+
+        logger.info(f'Preqveca mode {ipo_mode}: {rows_count} rows.')
+
+    async def iter_batches(self,
+                           ipo_modes: list[int] | None = None,
+                           since: pendulum.Date | None = None,
+                           until: pendulum.Date | None = None
+                           ) -> AsyncIterator[pd.DataFrame]:
+        """
+        Yields the rows of every fetched page as DataFrames, in page order within a mode; all modes are crawled concurrently.
+
+        :param ipo_modes: Values of 'sf[pt]' to crawl, the ones of the parser by default.
+        :param since: First placement date to collect, the start of the year five years ago by default.
+        :param until: Last placement date to collect, today by default.
+        """
+        today = pendulum.now('Europe/Moscow').date()
+        prev_year = today.subtract(years=5).year
+        start = (since or pendulum.date(year=prev_year, month=1, day=1)).format('DD.MM.Y')
+        end = (until or today).format('DD.MM.Y')
+
+        semaphore = asyncio.Semaphore(self._concurrency)
+        batches = merge_streams(*(
+            self._mode_batches(ipo_mode, start, end, semaphore) for ipo_mode in ipo_modes or self._ipo_modes
+        ))
+
+        # A placement listed under several modes is kept once, with the mode that arrived first
+        entities = EntityIndex()
+        async for batch in batches:
+            batch = batch[entities.add_frame(self.SOURCE, 'Russia', batch)]
+            if not batch.empty:
+                yield batch.reset_index(drop=True)
+
+    async def parse_data(self,
+                         ipo_modes: list[int] | None = None,
+                         since: pendulum.Date | None = None,
+                         until: pendulum.Date | None = None
+                         ) -> pd.DataFrame:
+
+        logger.info('START: Parsing data from Preqveca')
+
+        frames = [batch async for batch in self.iter_batches(ipo_modes, since, until)]
+        df = pd.concat(frames, axis=0, ignore_index=True) if frames else self._extractor.empty_frame()
 
         logger.info('END: Parsing data from Preqveca')
-        
-        return pd.json_normalize(aux_list), 'Russia'
+
+        return df, 'Russia'
 
 async def main():
-    parser = PreqvecaParser()
-    df, _ = await parser.parse_data()
+    async with HttpTransport() as transport:
+        parser = PreqvecaParser(transport)
+        df, _ = await parser.parse_data()
     df.to_csv('output.csv')
 
 if __name__ == '__main__':
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,178 @@
+import asyncio
+import time
+from email.utils import parsedate_to_datetime
+
+# Statuses that mean the host asks us to slow down
+_THROTTLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """
+    Reads a Retry-After header given either in seconds or as an HTTP date.
+
+    :return: Seconds to wait, None if the header is missing or malformed.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveLimiter:
+    def __init__(self,
+                 initial_concurrency: int = 4,
+                 min_concurrency: int = 1,
+                 max_concurrency: int = 10,
+                 rate: float = 5.0,
+                 min_rate: float = 0.5,
+                 max_rate: float = 50.0,
+                 burst: int = 5,
+                 backoff: float = 0.5,
+                 latency_tolerance: float = 2.0,
+                 max_pause: float = 300.0
+                 ) -> None:
+        """
+        Request limiter of one host: a token bucket for the request rate and an AIMD
+        limit on the requests in flight.
+
+        Successful requests with a healthy latency (within ``latency_tolerance`` times the
+        best latency seen) raise both limits additively; throttling statuses (429, 5xx) and
+        network errors cut them by ``backoff``, at most once per latency window (1 s at least). Retry-After
+        pauses the host for the requested time.
+
+        :param initial_concurrency: Requests in flight allowed at the start.
+        :param min_concurrency: Lower bound of the in-flight limit.
+        :param max_concurrency: Upper bound of the in-flight limit.
+        :param rate: Requests per second allowed at the start.
+        :param min_rate: Lower bound of the rate.
+        :param max_rate: Upper bound of the rate.
+        :param burst: Capacity of the token bucket.
+        :param backoff: Multiplier applied to both limits on throttling.
+        :param latency_tolerance: Latency growth over the best latency still considered healthy.
+        :param max_pause: Upper bound of a Retry-After pause in seconds.
+        """
+        self._min_concurrency = min_concurrency
+        self._max_concurrency = max_concurrency
+        self._min_rate = min_rate
+        self._max_rate = max_rate
+        self._burst = burst
+        self._backoff = backoff
+        self._latency_tolerance = latency_tolerance
+        self._max_pause = max_pause
+
+        self._limit = float(min(max(initial_concurrency, min_concurrency), max_concurrency))
+        self._rate = min(max(rate, min_rate), max_rate)
+        self._tokens = float(burst)
+        self._refilled = time.monotonic()
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._best_latency: float | None = None
+        self._latency: float | None = None
+        # Set on every release to wake the requests waiting for a free slot
+        self._released = asyncio.Event()
+        self._counters = {'requests': 0, 'throttled': 0, 'errors': 0, 'paused': 0}
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self._burst, self._tokens + (now - self._refilled) * self._rate)
+        self._refilled = now
+
+    def _wait_time(self, now: float) -> float | None:
+        """
+        Seconds until a request may start, 0 if it may start now, None if it waits for a release.
+        """
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self._in_flight >= int(self._limit):
+            return None
+        if self._tokens < 1:
+            return (1 - self._tokens) / self._rate
+        return 0
+
+    async def acquire(self) -> None:
+        # The check and the take happen without awaiting in between, so no lock is needed
+        while True:
+            now = time.monotonic()
+            self._refill(now)
+            wait = self._wait_time(now)
+            if wait == 0:
+                self._tokens -= 1
+                self._in_flight += 1
+                return
+            if wait is None:
+                self._released.clear()
+                await self._released.wait()
+            else:
+                await asyncio.sleep(wait)
+
+    def _increase(self) -> None:
+        # Additive: about one more request in flight per window of successful requests
+        self._limit = min(self._max_concurrency, self._limit + 1 / self._limit)
+        self._rate = min(self._max_rate, self._rate + 1 / self._limit)
+
+    def _decrease(self, now: float) -> None:
+        # Concurrent requests fail together, one cut per window (a second at least) is enough
+        if now - self._last_decrease < max(self._latency or 0.0, 1.0):
+            return
+        self._last_decrease = now
+        self._limit = max(self._min_concurrency, self._limit * self._backoff)
+        self._rate = max(self._min_rate, self._rate * self._backoff)
+
+    def _observe(self, status: int | None, latency: float, retry_after: str | None) -> None:
+        now = time.monotonic()
+        self._counters['requests'] += 1
+
+        if status is None or status in _THROTTLE_STATUSES:
+            self._counters['errors' if status is None else 'throttled'] += 1
+            self._decrease(now)
+            pause = parse_retry_after(retry_after) if status is not None else None
+            if pause:
+                self._counters['paused'] += 1
+                self._paused_until = max(self._paused_until, now + min(pause, self._max_pause))
+            return
+
+        self._latency = latency if self._latency is None else 0.8 * self._latency + 0.2 * latency
+        if self._best_latency is None or latency < self._best_latency:
+            self._best_latency = latency
+
+        if latency <= self._best_latency * self._latency_tolerance:
+            self._increase()
+
+    def release(self,
+                status: int | None,
+                latency: float,
+                retry_after: str | None = None
+                ) -> None:
+        """
+        Finishes a request started with ``acquire`` and adapts the limits to its outcome.
+
+        :param status: Response status, None if the request failed without a response.
+        :param latency: Seconds until the response headers arrived.
+        :param retry_after: Retry-After header of the response.
+        """
+        self._in_flight -= 1
+        self._observe(status, latency, retry_after)
+        self._released.set()
+
+    def cancel(self) -> None:
+        """
+        Finishes a request abandoned without an outcome, e.g. the slower of two hedged attempts.
+        """
+        self._in_flight -= 1
+        self._released.set()
+
+    def get_metrics(self) -> dict[str, float | int | None]:
+        return {
+            'concurrency_limit': int(self._limit),
+            'rate': round(self._rate, 2),
+            'in_flight': self._in_flight,
+            'latency': round(self._latency, 3) if self._latency is not None else None,
+            'paused_for': round(max(0.0, self._paused_until - time.monotonic()), 1),
+            **self._counters,
+        }
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+from urllib.parse import parse_qsl, urlsplit
+
+from httpx import AsyncBaseTransport, AsyncHTTPTransport, Request, Response, URL
+from loguru import logger
+
+# Headers that describe the wire encoding; bodies are stored decoded
+_WIRE_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding'}
+
+# Header carrying the original host of a request routed to the stand-in server
+REPLAY_HOST_HEADER = 'X-Replay-Host'
+
+
+def exchange_key(method: str, url: str, content: bytes) -> str:
+    digest = hashlib.sha256()
+    digest.update(method.encode())
+    digest.update(url.encode())
+    digest.update(content)
+    return digest.hexdigest()
+
+
+class Recording:
+    def __init__(self, recording_dir: str) -> None:
+        """
+        Request/response pairs captured from the live sites, replayed by the stand-in server.
+
+        Every exchange is stored as an index entry (method, URL, form body, status, headers)
+        and its decoded body in a file of its own, keyed like the response cache.
+
+        :param recording_dir: Directory with the bodies and the index of the recording.
+        """
+        self.recording_dir = recording_dir
+        self._index_path = os.path.join(recording_dir, 'index.json')
+        self._index: dict[str, dict] = dict()
+
+        if os.path.isfile(self._index_path):
+            with open(self._index_path, 'r', encoding='utf-8') as file:
+                self._index = json.load(file)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def _body_path(self, key: str) -> str:
+        return os.path.join(self.recording_dir, f'{key}.body')
+
+    def add(self, request: Request, response: Response) -> None:
+        key = exchange_key(request.method, str(request.url), request.content)
+        os.makedirs(self.recording_dir, exist_ok=True)
+        with open(self._body_path(key), 'wb') as file:
+            file.write(response.content)
+
+        self._index[key] = {
+            'method': request.method,
+            'url': str(request.url),
+            'content': request.content.decode('utf-8', errors='replace'),
+            'status': response.status_code,
+            'headers': {name: value for name, value in response.headers.items() if name.lower() not in _WIRE_HEADERS},
+        }
+
+    def entries(self) -> dict[str, dict]:
+        return self._index
+
+    def load_body(self, key: str) -> bytes:
+        with open(self._body_path(key), 'rb') as file:
+            return file.read()
+
+    def lookup(self, method: str, url: str, content: bytes) -> str | None:
+        """
+        Finds the exchange recorded for a request.
+
+        Requests differing from every recorded one (e.g. a date range ending today) get the
+        exchange of the same method and path that shares the most query and form parameters.
+
+        :return: Key of the exchange, None if nothing was recorded for the path.
+        """
+        key = exchange_key(method, url, content)
+        if key in self._index:
+            return key
+
+        parts = urlsplit(url)
+        params = set(parse_qsl(parts.query, keep_blank_values=True))
+        params |= set(parse_qsl(content.decode('utf-8', errors='replace'), keep_blank_values=True))
+
+        best, best_shared = None, -1
+        for candidate, entry in self._index.items():
+            candidate_parts = urlsplit(entry['url'])
+            if entry['method'] != method or candidate_parts[1:3] != parts[1:3]:
+                continue
+            candidate_params = set(parse_qsl(candidate_parts.query, keep_blank_values=True))
+            candidate_params |= set(parse_qsl(entry['content'], keep_blank_values=True))
+            shared = len(params & candidate_params)
+            if shared > best_shared:
+                best, best_shared = candidate, shared
+
+        return best
+
+    def save(self) -> None:
+        os.makedirs(self.recording_dir, exist_ok=True)
+        # Written aside and swapped in, a crash never leaves a half-written index
+        tmp_path = f'{self._index_path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(self._index, file, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self._index_path)
+
+        logger.info(f'Recording saved: {len(self._index)} exchanges in {self.recording_dir}.')
+
+
+class ReplayRouter(AsyncBaseTransport):
+    def __init__(self, replay_url: str, **kwargs) -> None:
+        """
+        Client transport sending every request to the stand-in server instead of its host.
+
+        The original host travels in the X-Replay-Host header, so limits, statistics and
+        cache keys above the transport still see the real URLs.
+
+        :param replay_url: Base URL of the stand-in server, e.g. 'http://127.0.0.1:8765'.
+        :param kwargs: Arguments of the underlying ``AsyncHTTPTransport``.
+        """
+        self._replay_url = URL(replay_url)
+        self._transport = AsyncHTTPTransport(**kwargs)
+
+    async def handle_async_request(self, request: Request) -> Response:
+        # A copy is routed, retries and accounting keep the original request
+        routed = Request(
+            request.method,
+            request.url.copy_with(scheme=self._replay_url.scheme, host=self._replay_url.host, port=self._replay_url.port),
+            headers={**request.headers, REPLAY_HOST_HEADER: request.url.netloc.decode('ascii')},
+            stream=request.stream,
+            extensions=request.extensions,
+        )
+        return await self._transport.handle_async_request(routed)
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
@@ -0,0 +1,156 @@
+import asyncio
+import random
+from typing import Awaitable, Callable
+
+from httpx import Request, Response, TimeoutException, TransportError
+from loguru import logger
+
+from .rate_limiter import parse_retry_after
+
+# Makes one attempt, calling the callback once the request is sent
+Send = Callable[[Callable[[], None] | None], Awaitable[Response]]
+
+
+class RequestPolicy:
+    def __init__(self,
+                 retries: int = 3,
+                 backoff_base: float = 0.5,
+                 backoff_max: float = 30.0,
+                 timeout: float | None = None,
+                 hedge_after: float | None = None,
+                 hedge_methods: list[str] | None = None,
+                 retry_statuses: list[int] | None = None
+                 ) -> None:
+        """
+        Retries, timeout and hedging of a single logical request.
+
+        Failed attempts (network errors, timeouts and retryable statuses) are repeated after
+        a fully jittered exponential delay, or after Retry-After if the host asks for longer.
+        A hedged request sends a duplicate when the first attempt is slower than
+        ``hedge_after`` and takes whichever answers first.
+
+        :param retries: Attempts made after the first one.
+        :param backoff_base: Delay before the first retry is drawn from [0, backoff_base] seconds,
+                             the bound doubles with every retry.
+        :param backoff_max: Upper bound of the delay in seconds.
+        :param timeout: Seconds an attempt may take once sent, None leaves it to the client timeout.
+        :param hedge_after: Seconds after sending when a duplicate is sent, None disables hedging.
+        :param hedge_methods: Methods safe to duplicate, GET only by default.
+        :param retry_statuses: Statuses worth another attempt, 429 and 5xx by default.
+        """
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.hedge_after = hedge_after
+        self.hedge_methods = set(hedge_methods or ['GET'])
+        self.retry_statuses = set(retry_statuses or [429, 500, 502, 503, 504])
+
+    def is_retryable(self, response: Response) -> bool:
+        return response.status_code in self.retry_statuses
+
+    def delay(self, attempt: int, response: Response | None = None) -> float:
+        """
+        Seconds to wait before retrying after the given (zero-based) attempt.
+        """
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if response is not None:
+            retry_after = parse_retry_after(response.headers.get('retry-after'))
+            if retry_after is not None:
+                delay = max(delay, min(retry_after, self.backoff_max))
+        return delay
+
+    def hedges(self, request: Request) -> bool:
+        return self.hedge_after is not None and request.method in self.hedge_methods
+
+    async def timed(self, sending: Awaitable[Response], request: Request) -> Response:
+        """
+        Bounds the time of an attempt that is already sent (not waiting in a rate limiter).
+        """
+        try:
+            return await asyncio.wait_for(sending, timeout=self.timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutException(f'no response in {self.timeout} s', request=request)
+
+    async def _hedged(self,
+                      send: Send,
+                      request: Request,
+                      stats: dict[str, int]
+                      ) -> Response:
+
+        # The hedge delay runs from the moment the first attempt is sent, not from queueing
+        sent = asyncio.Event()
+        first = asyncio.ensure_future(send(sent.set))
+        waiting = asyncio.ensure_future(sent.wait())
+        await asyncio.wait({first, waiting}, return_when=asyncio.FIRST_COMPLETED)
+        waiting.cancel()
+
+        done, _ = await asyncio.wait({first}, timeout=self.hedge_after)
+        if done:
+            return first.result()
+
+        stats['hedges'] += 1
+        second = asyncio.ensure_future(send(None))
+        pending = {first, second}
+        # Retryable responses hold their connections until closed, all but the returned one are closed
+        retryable: list[Response] = []
+        returned = None
+
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if not self.is_retryable(task.result()):
+                            if task is second:
+                                stats['hedge_wins'] += 1
+                            returned = task.result()
+                            return returned
+                        retryable.append(task.result())
+            # Both attempts failed, the retry loop handles the last outcome
+            returned = task.result()
+            return returned
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            for response in retryable:
+                if response is not returned:
+                    await response.aclose()
+
+    async def execute(self,
+                      send: Send,
+                      request: Request,
+                      stats: dict[str, int]
+                      ) -> Response:
+        """
+        Sends a request under the policy.
+
+        :param send: Coroutine factory making one attempt with its own copy of the request; it calls
+                     the given callback (if any) when the request is sent and applies ``timed`` to it.
+        :param request: The request, for the methods allowed to hedge and for errors.
+        :param stats: Counters of the host, 'retries', 'hedges' and 'hedge_wins' are increased.
+        :return: The first successful response, or the last retryable one when attempts run out.
+        """
+        hedge = self.hedges(request)
+
+        for attempt in range(self.retries + 1):
+            try:
+                if hedge:
+                    response = await self._hedged(send, request, stats)
+                else:
+                    response = await send(None)
+            except (TransportError, TimeoutException) as e:
+                if attempt == self.retries:
+                    raise
+                delay = self.delay(attempt)
+                logger.warning(f'{request.method} {request.url} failed ({e!r}), retry in {delay:.1f} s.')
+            else:
+                if not self.is_retryable(response) or attempt == self.retries:
+                    return response
+                delay = self.delay(attempt, response)
+                logger.warning(f'{request.method} {request.url} returned {response.status_code}, retry in {delay:.1f} s.')
+                await response.aclose()
+
+            stats['retries'] += 1
+            await asyncio.sleep(delay)
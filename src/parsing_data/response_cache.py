@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+import re
+import time
+
+from httpx import Request, Response
+from loguru import logger
+
+# Headers that describe the wire encoding; bodies are stored decoded
+_WIRE_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding'}
+
+
+class ResponseCache:
+    def __init__(self,
+                 cache_dir: str,
+                 ttls: list[dict] | None = None,
+                 default_ttl: float = 0,
+                 max_size_mb: float = 200
+                 ) -> None:
+        """
+        On-disk cache of HTTP responses with conditional revalidation.
+
+        A response younger than its TTL is served without a request; an older one is
+        revalidated with If-None-Match / If-Modified-Since and reused on 304.
+
+        :param cache_dir: Directory with the bodies and the index of the cache.
+        :param ttls: Rules ``{'pattern': <regex over the URL>, 'ttl': <seconds>}``, the first match wins.
+        :param default_ttl: TTL of URLs without a matching rule.
+        :param max_size_mb: Size cap of the stored bodies, least recently used entries are evicted.
+        """
+        self.cache_dir = cache_dir
+        self._ttls = [(re.compile(rule['pattern']), rule['ttl']) for rule in ttls or []]
+        self._default_ttl = default_ttl
+        self._max_size = max_size_mb * 1024 * 1024
+        self._index_path = os.path.join(cache_dir, 'index.json')
+        self._index: dict[str, dict] = dict()
+        self.stats = {'hits': 0, 'revalidated': 0, 'misses': 0, 'evicted': 0}
+
+        os.makedirs(cache_dir, exist_ok=True)
+        if os.path.isfile(self._index_path):
+            try:
+                with open(self._index_path, 'r', encoding='utf-8') as file:
+                    self._index = json.load(file)
+            except Exception as e:
+                logger.warning(f'Response cache index is unreadable and will be rebuilt: {e}')
+        self._sweep()
+
+    def _sweep(self) -> None:
+        """
+        Removes the bodies the index does not know about and the entries without a body.
+
+        Bodies are written on every store and the index only on ``save``, so a crash in between
+        leaves bodies that eviction would never reclaim.
+        """
+        orphans = 0
+        for name in os.listdir(self.cache_dir):
+            key, extension = os.path.splitext(name)
+            if extension == '.body' and key not in self._index:
+                os.remove(os.path.join(self.cache_dir, name))
+                orphans += 1
+        missing = [key for key in self._index if not os.path.isfile(self._body_path(key))]
+        for key in missing:
+            del self._index[key]
+
+        if orphans or missing:
+            logger.info(f'Response cache cleaned up: {orphans} unindexed bodies removed, {len(missing)} entries without a body dropped.')
+
+    @staticmethod
+    def make_key(request: Request) -> str:
+        digest = hashlib.sha256()
+        digest.update(request.method.encode())
+        digest.update(str(request.url).encode())
+        digest.update(request.content)
+        return digest.hexdigest()
+
+    def _ttl(self, url: str) -> float:
+        for pattern, ttl in self._ttls:
+            if pattern.search(url):
+                return ttl
+        return self._default_ttl
+
+    def _body_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f'{key}.body')
+
+    def lookup(self, key: str) -> dict | None:
+        entry = self._index.get(key)
+        if entry is None or not os.path.isfile(self._body_path(key)):
+            return None
+        return entry
+
+    def is_fresh(self, entry: dict) -> bool:
+        return time.time() - entry['stored_at'] < self._ttl(entry['url'])
+
+    def conditional_headers(self, entry: dict) -> dict[str, str]:
+        headers = dict()
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def build_response(self, key: str, entry: dict, request: Request) -> Response:
+        entry['last_access'] = time.time()
+        with open(self._body_path(key), 'rb') as file:
+            content = file.read()
+        return Response(
+            status_code=entry['status'],
+            headers=entry['headers'],
+            content=content,
+            request=request,
+        )
+
+    def refresh(self, key: str, entry: dict, response: Response) -> None:
+        """
+        Marks an entry as revalidated after a 304 answer.
+        """
+        entry['stored_at'] = time.time()
+        entry['etag'] = response.headers.get('etag', entry.get('etag'))
+        entry['last_modified'] = response.headers.get('last-modified', entry.get('last_modified'))
+
+    def store(self, key: str, response: Response) -> None:
+        content = response.content
+        with open(self._body_path(key), 'wb') as file:
+            file.write(content)
+
+        now = time.time()
+        self._index[key] = {
+            'url': str(response.request.url),
+            'status': response.status_code,
+            'headers': [
+                (name, value) for name, value in response.headers.items() if name.lower() not in _WIRE_HEADERS
+            ],
+            'etag': response.headers.get('etag'),
+            'last_modified': response.headers.get('last-modified'),
+            'stored_at': now,
+            'last_access': now,
+            'size': len(content),
+        }
+        self._evict()
+
+    def _evict(self) -> None:
+        total = sum(entry['size'] for entry in self._index.values())
+        if total <= self._max_size:
+            return
+
+        for key, entry in sorted(self._index.items(), key=lambda item: item[1]['last_access']):
+            if total <= self._max_size:
+                break
+            total -= entry['size']
+            del self._index[key]
+            if os.path.isfile(self._body_path(key)):
+                os.remove(self._body_path(key))
+            self.stats['evicted'] += 1
+
+    def save(self) -> None:
+        tmp_path = f'{self._index_path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(self._index, file)
+        os.replace(tmp_path, self._index_path)
+
+    def log_stats(self) -> None:
+        size = sum(entry['size'] for entry in self._index.values())
+        logger.info(
+            f'Response cache: {self.stats["hits"]} hits, {self.stats["revalidated"]} revalidated, '
+            f'{self.stats["misses"]} misses, {self.stats["evicted"]} evicted, '
+            f'{len(self._index)} entries ({round(size / 1024 / 1024, 1)} MB).'
+        )
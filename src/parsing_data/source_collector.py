@@ -0,0 +1,224 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator
+
+import pandas as pd
+import pendulum
+from loguru import logger
+
+from ..run_checkpoint import RunCheckpoint
+from ..storage import EventStore
+from .circuit_breaker import CircuitBreaker
+from .entity_index import EntityIndex
+from .watermarks import WatermarkStore
+
+
+@dataclass
+class SourceResult:
+    """
+    Outcome of collecting a single source.
+
+    :param caption_type: Region key of the source ('US', 'Europe', ...).
+    :param data: Parsed (or validated) DataFrame, or None if the source did not finish.
+    :param status: 'ok', 'timeout', 'error' or 'open' (skipped by its circuit breaker).
+    :param elapsed: Wall-clock seconds spent on the source.
+    :param error: Text of the error for failed sources.
+    :param watermark: ``{'source': ..., 'last_date': ..., 'pages': ...}`` of a finished crawl,
+                      to be stored once its data is saved.
+    :param stale_since: Time of the last good crawl of a source that did not finish,
+                        its region is shown with the data of that crawl.
+    """
+    caption_type: str
+    data: pd.DataFrame | None
+    status: str
+    elapsed: float
+    error: str | None = None
+    watermark: dict | None = None
+    stale_since: pendulum.DateTime | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.status == 'ok'
+
+
+class SourceCollector:
+    def __init__(self,
+                 parsers: dict[str, Any],
+                 deadlines: dict[str, float] | None = None,
+                 default_deadline: float | None = None,
+                 validator: Any | None = None,
+                 watermarks: WatermarkStore | None = None,
+                 checkpoint: RunCheckpoint | None = None,
+                 breaker: CircuitBreaker | None = None,
+                 events: EventStore | None = None,
+                 entities: EntityIndex | None = None
+                 ) -> None:
+        """
+        Runs the parsers of all sources concurrently.
+
+        :param parsers: Parsers keyed by region, each exposing ``parse_data()`` and ``iter_batches()``.
+        :param deadlines: Per-region deadline in seconds.
+        :param default_deadline: Deadline for regions missing in ``deadlines``, None means no limit.
+        :param validator: ``DataValidator`` consuming the row batches while they are parsed;
+                          results then hold validated counts instead of parsed rows.
+        :param watermarks: Crawl watermarks; sources with one are crawled from it only.
+        :param checkpoint: Checkpoint of the run; a finished source is stored in it at once
+                           and taken from it instead of being crawled again.
+        :param breaker: Circuit breakers of the sources; a source with an open breaker is not called.
+        :param events: Store the parsed rows are appended to as events while they stream in.
+        :param entities: Index of the IPOs of all sources; rows a source already yielded are dropped
+                         and IPOs listed by several sources are reported.
+        """
+        self.parsers = parsers
+        self.deadlines = deadlines or dict()
+        self.default_deadline = default_deadline
+        self.validator = validator
+        self.watermarks = watermarks
+        self.checkpoint = checkpoint
+        self.breaker = breaker
+        self.events = events
+        self.entities = entities
+
+    @staticmethod
+    async def _tracked(batches: AsyncIterator[pd.DataFrame],
+                       date_column: str,
+                       watermark: dict
+                       ) -> AsyncIterator[pd.DataFrame]:
+
+        async for batch in batches:
+            watermark['pages'] += 1
+            last_date = batch[date_column].max()
+            if not pd.isna(last_date):
+                last_date = pendulum.instance(last_date.to_pydatetime()).date()
+                if watermark['last_date'] is None or last_date > watermark['last_date']:
+                    watermark['last_date'] = last_date
+            yield batch
+
+    async def _recorded(self,
+                        batches: AsyncIterator[pd.DataFrame],
+                        source: str,
+                        caption_type: str
+                        ) -> AsyncIterator[pd.DataFrame]:
+
+        appended = 0
+        async for batch in batches:
+            appended += self.events.append(source, caption_type, batch)
+            yield batch
+        logger.info(f'New IPO events of {source}: {appended}.')
+
+    async def _deduplicated(self,
+                            batches: AsyncIterator[pd.DataFrame],
+                            source: str,
+                            caption_type: str
+                            ) -> AsyncIterator[pd.DataFrame]:
+
+        async for batch in batches:
+            fresh = self.entities.add_frame(source, caption_type, batch)
+            if not fresh.all():
+                batch = batch[fresh].reset_index(drop=True)
+            if not batch.empty:
+                yield batch
+
+    async def _run_source(self, caption_type: str, parser: Any, watermark: dict) -> pd.DataFrame:
+        since = self.watermarks.since(parser.SOURCE) if self.watermarks is not None else None
+        if since is not None:
+            logger.info(f'Crawling {parser.SOURCE} from its watermark, since {since}.')
+
+        date_column = next(column.name for column in parser.COLUMNS if column.kind == 'date')
+        batches = self._tracked(parser.iter_batches(since=since), date_column, watermark)
+        if self.entities is not None:
+            batches = self._deduplicated(batches, parser.SOURCE, caption_type)
+        if self.events is not None:
+            batches = self._recorded(batches, parser.SOURCE, caption_type)
+
+        if self.validator is not None:
+            return await self.validator.validate_batches(batches, parser.SOURCE)
+
+        frames = [batch async for batch in batches]
+        return pd.concat(frames, axis=0, ignore_index=True) if frames else pd.DataFrame()
+
+    async def _collect_source(self,
+                              caption_type: str,
+                              parser: Any
+                              ) -> SourceResult:
+
+        deadline = self.deadlines.get(caption_type, self.default_deadline)
+        started = time.perf_counter()
+        watermark = {'source': parser.SOURCE, 'last_date': None, 'pages': 0}
+
+        try:
+            df = await asyncio.wait_for(self._run_source(caption_type, parser, watermark), timeout=deadline)
+        except asyncio.TimeoutError:
+            elapsed = time.perf_counter() - started
+            logger.error(f'Parsing of {caption_type} region exceeded its deadline of {deadline} s.')
+            return SourceResult(caption_type, None, 'timeout', elapsed, f'deadline of {deadline} s exceeded')
+        except Exception as e:
+            elapsed = time.perf_counter() - started
+            logger.error(f'Error while parsing {caption_type} region: {e}')
+            return SourceResult(caption_type, None, 'error', elapsed, str(e))
+
+        elapsed = time.perf_counter() - started
+        logger.info(f'Parsing of {caption_type} region finished in {elapsed:.2f} s, rows: {len(df)}.')
+
+        return SourceResult(caption_type, df, 'ok', elapsed, watermark=watermark)
+
+    def _save_result(self, result: SourceResult) -> None:
+        watermark = dict(result.watermark)
+        if watermark['last_date'] is not None:
+            watermark['last_date'] = watermark['last_date'].to_date_string()
+        self.checkpoint.save_frame(f'validated_{result.caption_type}', result.data)
+        self.checkpoint.mark_done('parsed', result.caption_type)
+        self.checkpoint.mark_done('validated', result.caption_type, data=watermark)
+
+    def _restore_result(self, caption_type: str) -> SourceResult:
+        watermark = dict(self.checkpoint.get_data('validated', caption_type))
+        if watermark['last_date'] is not None:
+            watermark['last_date'] = pendulum.parse(watermark['last_date']).date()
+        logger.info(f'Source of {caption_type} region is taken from the run checkpoint.')
+        data = self.checkpoint.load_frame(f'validated_{caption_type}')
+        return SourceResult(caption_type, data, 'ok', 0.0, watermark=watermark)
+
+    async def _collect_or_restore(self,
+                                  caption_type: str,
+                                  parser: Any
+                                  ) -> SourceResult:
+
+        if self.checkpoint is not None and self.checkpoint.is_done('validated', caption_type):
+            return self._restore_result(caption_type)
+
+        if self.breaker is not None and not self.breaker.allow(parser.SOURCE):
+            return SourceResult(caption_type, None, 'open', 0.0, 'circuit breaker is open',
+                                stale_since=self.breaker.last_success(parser.SOURCE))
+
+        result = await self._collect_source(caption_type, parser)
+        if self.checkpoint is not None and result.ok:
+            self._save_result(result)
+
+        if self.breaker is not None:
+            if result.ok:
+                self.breaker.record_success(parser.SOURCE)
+            else:
+                self.breaker.record_failure(parser.SOURCE, result.error)
+                result.stale_since = self.breaker.last_success(parser.SOURCE)
+
+        return result
+
+    async def collect(self) -> dict[str, SourceResult]:
+
+        logger.info(f'START: Collecting {len(self.parsers)} sources concurrently.')
+
+        results = await asyncio.gather(*(
+            self._collect_or_restore(caption_type, parser)
+            for caption_type, parser in self.parsers.items()
+        ))
+
+        if self.breaker is not None:
+            self.breaker.save()
+        if self.entities is not None:
+            self.entities.log_report()
+
+        statuses = ', '.join(f'{result.caption_type}={result.status}' for result in results)
+        logger.info(f'END: Collecting sources ({statuses}).')
+
+        return {result.caption_type: result for result in results}
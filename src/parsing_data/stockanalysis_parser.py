@@ -1,66 +1,187 @@
-from httpx import AsyncClient, QueryParams, Response
+from httpx import QueryParams, Response
+import os
+from typing import AsyncIterator
 import pandas as pd
-from bs4 import BeautifulSoup
 import pendulum
 import asyncio
 from loguru import logger
 
+from .batch_stream import merge_streams
+from .http_transport import HttpTransport
+from .column_builder import Column
+from .table_extractor import TableExtractor
+
 class StockanalysisParser:
-    def __init__(self) -> None:
-        self._http_client = AsyncClient()
+    SOURCE = 'stockanalysis'
+    DATE_FORMAT = '%b %d, %Y'
+    COLUMNS = [
+        Column('IPO Date', kind='date', date_format=DATE_FORMAT),
+        Column('Company Name'),
+        Column('IPO Price', kind='number', optional=True),
+    ]
+
+    def __init__(self,
+                 transport: HttpTransport,
+                 years: int = 2,
+                 incremental: bool = False,
+                 cache_dir: str | None = None,
+                 streaming: bool = False
+                 ) -> None:
+        """
+        :param transport: Shared HTTP transport.
+        :param years: Number of year pages collected, the current year included.
+        :param incremental: Refetch only the current year and take closed years from the cache.
+        :param cache_dir: Directory with parsed pages of closed years.
+        :param streaming: Parse pages incrementally while they are downloaded.
+        """
+        self._transport = transport
+        self._years = years
+        self._incremental = incremental
+        self._cache_dir = cache_dir
+        self._streaming = streaming
+        self._extractor = TableExtractor(table_tag='table', table_predicate='@id="main-table"', columns=self.COLUMNS)
 
     async def _request(self, url: str, params: QueryParams | None = None) -> Response:
-        response = await self._http_client.get(url, params=params)
+        response = await self._transport.get(url, params=params)
         response.raise_for_status()
         return response
-        
-    async def parse_data(self) -> pd.DataFrame:
 
-        logger.info('START: Parsing data from Stockanalysis')
+    async def _request_batches(self,
+                               url: str,
+                               params: QueryParams | None = None
+                               ) -> AsyncIterator[pd.DataFrame]:
+        """
+        Yields the rows of the table: every chunk parsed while a streamed page downloads, the whole table otherwise.
+        """
+        if self._streaming:
+            async with self._transport.stream('GET', url, params=params) as response:
+                response.raise_for_status()
+                stream = self._extractor.streaming(encoding=response.encoding)
+                async for table in self._extractor.extract_stream(response, stream):
+                    yield table
+            found = stream.found
+        else:
+            response = await self._request(url=url, params=params)
+            table = self._extractor.extract(response.text)
+            found = table is not None
+            if found:
+                yield table
+
+        if not found:
+            raise ValueError('table "main-table" is not found')
+
+    def _cache_path(self, year: int) -> str | None:
+        if self._cache_dir is None:
+            return None
+        return os.path.join(self._cache_dir, f'{year}.csv')
+
+    def _load_cached_year(self, year: int) -> pd.DataFrame | None:
+        path = self._cache_path(year)
+        if path is None or not os.path.isfile(path):
+            return None
+        df = pd.read_csv(path, sep=';', dtype=str, keep_default_na=False)
+        # Caches written before a column was kept miss it
+        df = df.reindex(columns=[column.name for column in self.COLUMNS], fill_value='')
+        for column in self.COLUMNS:
+            if column.kind == 'number':
+                df[column.name] = pd.to_numeric(df[column.name], errors='coerce')
+        # Caches written before the dates were decoded at parse time hold the page text
+        try:
+            df['IPO Date'] = pd.to_datetime(df['IPO Date'], format='ISO8601')
+        except ValueError:
+            df['IPO Date'] = pd.to_datetime(df['IPO Date'], format=self.DATE_FORMAT, errors='coerce')
+        return df
+
+    def _save_cached_year(self, year: int, df: pd.DataFrame) -> None:
+        path = self._cache_path(year)
+        if path is None:
+            return
+        os.makedirs(self._cache_dir, exist_ok=True)
+        df.to_csv(path, index=False, sep=';')
+
+    async def _collect_year(self, year: int, current_year: int) -> AsyncIterator[pd.DataFrame]:
+
+        closed = year < current_year
+
+        if closed and self._incremental:
+            cached = self._load_cached_year(year)
+            if cached is not None:
+                logger.info(f'Stockanalysis year {year} is taken from the cache.')
+                if not cached.empty:
+                    yield cached
+                return
 
-        aux_dict: dict[str, list] = dict()
-        year = pendulum.now('Europe/Moscow').year
-        while year != pendulum.now('Europe/Moscow').subtract(years=2).year:
+        # Closed years are kept whole for the cache, the current one is only passed on
+        frames = [] if closed and self._cache_dir is not None else None
+        async for df in self._request_batches(url=f'https://stockanalysis.com/ipos/{year}/'):
+            if frames is not None:
+                frames.append(df)
+            if not df.empty:
+                yield df
 
+        if frames:
+            df = pd.concat(frames, axis=0, ignore_index=True)
+            if not df.empty:
+                self._save_cached_year(year, df)
+
+    async def iter_batches(self,
+                           since: pendulum.Date | None = None,
+                           until: pendulum.Date | None = None
+                           ) -> AsyncIterator[pd.DataFrame]:
+        """
+        Yields the rows of every year as DataFrames as soon as they are parsed.
+
+        :param since: Date whose year is the first one collected, the last ``years`` years by default.
+        :param until: Date whose year is the last one collected, the current year by default.
+        """
+        current_year = pendulum.now('Europe/Moscow').year
+        last_year = until.year if until is not None else current_year
+        first_year = since.year if since is not None else last_year - self._years + 1
+        years = list(range(last_year, first_year - 1, -1))
+        failed: list[int] = []
+
+        async def year_batches(year: int) -> AsyncIterator[pd.DataFrame]:
+            passed = False
             try:
-                url = f'https://stockanalysis.com/ipos/{year}/'
-                response = await self._request(url=url)
-                soup = BeautifulSoup(response.text, 'html.parser')
-                table = soup.find('table', id='main-table')
-                links = table.find_all('tr')
+                async for df in self._collect_year(year, current_year):
+                    passed = True
+                    yield df
             except Exception as e:
-                logger.error(f'Error while parsing Stockanalysis')
-                break
-
-            for num, link in enumerate(links):
-
-                if num == 0:
-                    columns_list = []
-                    items = link.findAll('th')
-                    for item in items:
-                        clear_text = item.text.strip()
-                        columns_list.append(clear_text)
-                        if aux_dict.get(clear_text) is None:
-                            aux_dict[clear_text] = []
-                        else:
-                            pass
-                else:
-                    items = link.findAll('td')
-                    
-                    for j, item in enumerate(items):
-                        value = item.text.strip()
-                        aux_dict[columns_list[j]].append(value)
-
-            year -= 1
+                logger.error(f'Error while parsing Stockanalysis year {year}: {e}')
+                # Rows already passed on cannot be taken back, a year broken off midway fails the crawl
+                if passed:
+                    raise
+                failed.append(year)
+
+        async for batch in merge_streams(*(year_batches(year) for year in years)):
+            yield batch
+
+        # A year is one page and only the months of the collected years are upserted, so a missing
+        # closed year keeps its stored counts; the watermark follows the current year, which must be there
+        if failed:
+            logger.warning(f'Stockanalysis years without data: {sorted(failed, reverse=True)}.')
+        if current_year in failed:
+            raise RuntimeError(f'Stockanalysis current year {current_year} has no data')
+
+    async def parse_data(self,
+                         since: pendulum.Date | None = None,
+                         until: pendulum.Date | None = None
+                         ) -> pd.DataFrame:
+
+        logger.info('START: Parsing data from Stockanalysis')
+
+        frames = [batch async for batch in self.iter_batches(since, until)]
+        df = pd.concat(frames, axis=0, ignore_index=True) if frames else self._extractor.empty_frame()
 
         logger.info('END: Parsing data from Stockanalysis')
 
-        return pd.DataFrame.from_dict(aux_dict), 'US'
-    
+        return df, 'US'
+
 async def main():
-    parser = StockanalysisParser()
-    df, _ = await parser.parse_data()
+    async with HttpTransport() as transport:
+        parser = StockanalysisParser(transport)
+        df, _ = await parser.parse_data()
     df.to_csv('output.csv')
 
 if __name__ == '__main__':
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,268 @@
+from typing import AsyncIterator
+
+import pandas as pd
+from httpx import Response
+from lxml import etree
+from lxml import html as lxml_html
+from lxml.html import HtmlElement
+
+from .column_builder import Column, ColumnBuilder
+
+# Headers and one list of cell texts per header, or the typed frame of an extractor with columns
+Table = tuple[list[str], list[list[str]]] | pd.DataFrame
+
+
+class TableExtractor:
+    def __init__(self,
+                 table_tag: str | None = None,
+                 table_predicate: str | None = None,
+                 cell_xpaths: dict[int, str] | None = None,
+                 columns: list[Column] | None = None
+                 ) -> None:
+        """
+        Pulls header and cell text of an HTML table into column lists with lxml.
+
+        The first row is the header when it consists of <th> cells; otherwise every
+        row is data and the columns are numbered.
+
+        :param table_tag: Tag of the element holding the table ('table'), None takes every row of the page.
+        :param table_predicate: XPath predicate of that element without brackets ('@id="main-table"'), any one by default.
+        :param cell_xpaths: Per-column XPath, relative to the cell, whose text is taken
+                            instead of the whole cell (e.g. the name span of a company cell).
+        :param columns: Columns to keep; the table is then returned as a typed DataFrame
+                        and the text of other cells is never read.
+        """
+        self.table_tag = table_tag
+        self.table_predicate = table_predicate
+        if table_tag is None:
+            self.table_step = None
+        elif table_predicate is None:
+            self.table_step = table_tag
+        else:
+            self.table_step = f'{table_tag}[{table_predicate}]'
+        self.rows_xpath = f'//{self.table_step}//tr' if self.table_step is not None else '//tr'
+        self.cell_xpaths = cell_xpaths or dict()
+        self.columns = columns
+
+    @staticmethod
+    def parse(html: str | bytes) -> HtmlElement:
+        # lxml refuses empty documents, an empty page is a page without rows
+        if not html.strip():
+            html = '<html></html>'
+        return lxml_html.fromstring(html)
+
+    def cell_text(self, cell: HtmlElement, column: int) -> str:
+        xpath = self.cell_xpaths.get(column)
+        if xpath is not None:
+            found = cell.xpath(xpath)
+            if found:
+                cell = found[0]
+        return cell.text_content().strip()
+
+    def empty_frame(self) -> pd.DataFrame:
+        return ColumnBuilder.empty_frame(self.columns or [])
+
+    def extract(self, document: str | bytes | HtmlElement) -> Table | None:
+        """
+        Extracts the table from a page.
+
+        :param document: Page source or a tree returned by ``parse``.
+        :return: ``(headers, columns)`` with one list of cell texts per header, or
+                 the DataFrame of ``columns`` if they are set; None if the page has no rows.
+        """
+        if not isinstance(document, HtmlElement):
+            document = self.parse(document)
+
+        rows = document.xpath(self.rows_xpath)
+        if not rows:
+            return None
+
+        builder = _ColumnsBuilder(self)
+        for row in rows:
+            builder.add_row(row)
+
+        return builder.result()
+
+    def streaming(self, encoding: str | None = None) -> 'StreamingTableExtractor':
+        return StreamingTableExtractor(self, encoding=encoding)
+
+    async def extract_stream(self,
+                             response: Response,
+                             stream: 'StreamingTableExtractor | None' = None
+                             ) -> AsyncIterator[Table]:
+        """
+        Extracts the table from a streaming response while its body arrives.
+
+        :param response: Response opened with ``HttpTransport.stream``.
+        :param stream: Streaming extractor fed with the body, a new one by default; once the rows
+                       are read, its ``root`` holds the rest of the page.
+        :return: The rows completed by every chunk of the body, as small tables of the shape of ``extract``.
+        """
+        stream = stream or self.streaming(encoding=response.encoding)
+        async for chunk in response.aiter_bytes():
+            table = stream.feed(chunk)
+            if table is not None:
+                yield table
+
+        table = stream.close()
+        if table is not None:
+            yield table
+
+
+class StreamingTableExtractor:
+    def __init__(self,
+                 extractor: TableExtractor,
+                 encoding: str | None = None
+                 ) -> None:
+        """
+        Event-driven counterpart of ``TableExtractor``.
+
+        Chunks are fed into an lxml pull parser; every finished <tr> of the table is turned
+        into cell texts and dropped from the tree, and the rows completed by a chunk are handed
+        out at once, so a page is processed in the memory of one chunk of rows plus the
+        non-table part of the page.
+
+        :param extractor: Extractor whose table and cell XPaths are used.
+        :param encoding: Encoding of the fed bytes, detected by lxml if None.
+        """
+        self._extractor = extractor
+        self._parser = etree.HTMLPullParser(events=('end',), tag='tr', encoding=encoding)
+        self._parser.set_element_class_lookup(lxml_html.HtmlElementClassLookup())
+        self._builder = _ColumnsBuilder(extractor)
+        self._ancestor_xpath = f'boolean(ancestor::{extractor.table_step})' if extractor.table_step is not None else None
+        # The page without its table rows, set by close()
+        self.root: HtmlElement | None = None
+
+    def _in_table(self, row: HtmlElement) -> bool:
+        return self._ancestor_xpath is None or row.xpath(self._ancestor_xpath)
+
+    def _drain(self) -> Table | None:
+        for _, row in self._parser.read_events():
+            if self._in_table(row):
+                self._builder.add_row(row)
+                row.clear()
+                # Finished rows are not needed any more
+                parent = row.getparent()
+                if parent is not None:
+                    while row.getprevious() is not None:
+                        del parent[0]
+        return self._builder.take()
+
+    def feed(self, chunk: bytes) -> Table | None:
+        """
+        Feeds the next chunk of the page.
+
+        :return: Data rows completed by the chunk, None if there are none.
+        """
+        self._parser.feed(chunk)
+        return self._drain()
+
+    def close(self) -> Table | None:
+        """
+        Finishes the page and keeps its root, table rows already removed, in ``root``.
+
+        :return: Data rows completed by the end of the page, None if there are none.
+        """
+        root = self._parser.close()
+        table = self._drain()
+        self.root = root if root is not None else TableExtractor.parse('')
+        return table
+
+    @property
+    def headers(self) -> list[str]:
+        return self._builder.headers
+
+    @property
+    def found(self) -> bool:
+        """
+        Whether the page had rows of the table, as ``extract`` returning a table.
+        """
+        return self._builder.seen_rows > 0
+
+
+class _ColumnsBuilder:
+    def __init__(self, extractor: TableExtractor) -> None:
+        self._extractor = extractor
+        self.headers: list[str] = []
+        self.columns: list[list[str]] = []
+        self.seen_rows = 0
+        self._typed = ColumnBuilder(extractor.columns) if extractor.columns is not None else None
+        self._positions: list[int | None] | None = None
+
+    def _resolve_positions(self) -> list[int | None]:
+        positions = []
+        for column in self._extractor.columns:
+            if column.name in self.headers:
+                positions.append(self.headers.index(column.name))
+            elif column.position is not None:
+                positions.append(column.position)
+            elif column.optional:
+                positions.append(None)
+            else:
+                raise ValueError(f'column "{column.name}" is not found in the table')
+        return positions
+
+    def __len__(self) -> int:
+        if self._typed is not None:
+            return len(self._typed)
+        return len(self.columns[0]) if self.columns else 0
+
+    def result(self) -> Table:
+        if self._typed is not None:
+            return self._typed.to_frame()
+        return self.headers, self.columns
+
+    def take(self) -> Table | None:
+        """
+        Hands out the data rows added since the last call and forgets them; headers and positions are kept.
+
+        :return: The rows in the shape of ``result``, None if there are none.
+        """
+        if not len(self):
+            return None
+
+        if self._typed is not None:
+            table = self._typed.to_frame()
+            self._typed = ColumnBuilder(self._extractor.columns)
+        else:
+            table = list(self.headers), self.columns
+            self.columns = [[] for _ in self.headers]
+
+        return table
+
+    def add_row(self, row: HtmlElement) -> list[str] | None:
+        """
+        Adds a row to the columns.
+
+        :return: Cell texts of a data row, None for the header row and rows without cells.
+        """
+        self.seen_rows += 1
+
+        if self.seen_rows == 1 and row.xpath('./th'):
+            self.headers = [cell.text_content().strip() for cell in row.xpath('./th')]
+            self.columns = [[] for _ in self.headers]
+            return None
+
+        cells = row.xpath('./td')
+        if not cells:
+            return None
+
+        if self._typed is not None:
+            if self._positions is None:
+                self._positions = self._resolve_positions()
+            values = [
+                self._extractor.cell_text(cells[j], j) if j is not None and j < len(cells) else '' for j in self._positions
+            ]
+            self._typed.append(values)
+            return values
+
+        # Header-less tables get their width from the widest row
+        while len(self.columns) < len(cells):
+            self.headers.append(str(len(self.headers)))
+            self.columns.append([''] * (len(self.columns[0]) if self.columns else 0))
+
+        values = [self._extractor.cell_text(cells[j], j) if j < len(cells) else '' for j in range(len(self.columns))]
+        for column, value in zip(self.columns, values):
+            column.append(value)
+
+        return values
@@ -0,0 +1,69 @@
+import json
+import os
+
+import pendulum
+from loguru import logger
+
+
+class WatermarkStore:
+    def __init__(self,
+                 path: str,
+                 safety_margin_days: int = 14
+                 ) -> None:
+        """
+        Crawl watermarks of the sources, kept in a JSON file next to the data CSVs.
+
+        A watermark is the last IPO date seen by the latest successful crawl of a source
+        together with the number of pages it took. The next crawl starts from the watermark
+        minus the safety margin, moved back to the first day of its month, so every month
+        that is re-counted is crawled in full and replaces the stored count.
+
+        :param path: Path of the JSON file.
+        :param safety_margin_days: Days re-crawled before the watermark to pick up late listings.
+        """
+        self.path = path
+        self.safety_margin_days = safety_margin_days
+        self._watermarks: dict[str, dict] = dict()
+
+        if os.path.isfile(path):
+            with open(path, 'r', encoding='utf-8') as file:
+                self._watermarks = json.load(file)
+
+    def get(self, source: str) -> dict | None:
+        return self._watermarks.get(source)
+
+    def since(self, source: str) -> pendulum.Date | None:
+        """
+        Returns the first date the next crawl of the source has to cover, None without a watermark.
+        """
+        watermark = self.get(source)
+        if watermark is None or watermark.get('last_date') is None:
+            return None
+
+        # Upcoming listings must not push the start past today
+        last_date = min(pendulum.parse(watermark['last_date']).date(), pendulum.now('Europe/Moscow').date())
+
+        return last_date.subtract(days=self.safety_margin_days).start_of('month')
+
+    def update(self, source: str, last_date: pendulum.Date | None, pages: int) -> None:
+        previous = self.get(source) or dict()
+        if last_date is None and previous.get('last_date') is not None:
+            last_date = pendulum.parse(previous['last_date']).date()
+
+        self._watermarks[source] = {
+            'last_date': last_date.to_date_string() if last_date is not None else None,
+            'pages': pages,
+            'updated_at': pendulum.now('Europe/Moscow').to_iso8601_string(),
+        }
+
+    def save(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Written aside and swapped in, a crash never leaves a half-written file
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(self._watermarks, file, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+        logger.info(f'Crawl watermarks saved: {self._watermarks}.')
@@ -2,6 +2,7 @@ from aiogram import Bot, types
 from tenacity import retry, stop_after_delay, wait_fixed
 from io import BytesIO
 from loguru import logger
+import pendulum
 from aiogram.types import InputMediaPhoto, BufferedInputFile
 
 class PlotSender:
@@ -84,11 +85,23 @@ class PlotSender:
 
         return caption_dict[caption_type]
 
+    def _generate_stale_note(self,
+                             stale_since: pendulum.DateTime | None
+                             ) -> str:
+
+        if stale_since is None:
+            return '\n\n<i>⚠️ Источник сейчас недоступен, график построен по последним сохраненным данным.</i>'
+
+        date = stale_since.in_timezone('Europe/Moscow').format('DD.MM.YYYY')
+        return f'\n\n<i>⚠️ Источник сейчас недоступен, график построен по данным на {date}.</i>'
+
     @retry(stop=stop_after_delay(60 * 15), wait=wait_fixed(1))
     async def send_gragh(self,
                          buf: BytesIO,
                          caption_type: str,
-                         yearly_type: bool
+                         yearly_type: bool,
+                         stale: bool = False,
+                         stale_since: pendulum.DateTime | None = None
                          ) -> None:
         
         async with self.bot as bot:
@@ -106,6 +119,8 @@ class PlotSender:
                     caption = self._generate_yearly_caption(caption_type=caption_type)
                 else:
                     caption = self._generate_monthly_caption(caption_type=caption_type)
+                if stale:
+                    caption += self._generate_stale_note(stale_since)
                 await bot.send_media_group(chat_id=self.group_id,
                                            media=[InputMediaPhoto(type='photo', media=media, caption=caption, parse_mode='HTML')])
                 
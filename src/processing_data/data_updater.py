@@ -1,56 +1,95 @@
+import os
+from typing import TYPE_CHECKING
+
 import pandas as pd
 from loguru import logger
 
+from .upsert import UpsertReport, upsert
+
+if TYPE_CHECKING:
+    # The store imports the upsert engine of this package
+    from ..storage import AggregateStore
+
 class DataUpdater:
-    def __init__(self) -> None:
-        pass
+    def __init__(self, store: 'AggregateStore | None' = None) -> None:
+        """
+        :param store: AggregateStore the merged counts are written to; without it they
+            are written to the semicolon data files.
+        """
+        self.store = store
+        # Report of the latest upsert of every data file, keyed like '{period}:{caption_type}'
+        self.reports: dict[str, UpsertReport] = dict()
+
+    def upsert(self,
+               prev_data: pd.DataFrame,
+               parsed_data: pd.DataFrame,
+               keys: list[str]
+               ) -> tuple[pd.DataFrame, UpsertReport]:
+        """
+        Merges aggregates keyed on ``keys`` (e.g. Region, Year, Month) into the stored ones.
+
+        :return: The merged rows and the keys inserted, updated and left unchanged.
+        """
+        return upsert(prev_data, parsed_data, keys)
+
+    def _update(self,
+                prev_data: pd.DataFrame,
+                parsed_data: pd.DataFrame,
+                keys: list[str],
+                path: str | None,
+                period: str,
+                caption_type: str
+                ) -> pd.DataFrame:
+
+        item = f'{period}:{caption_type}'
+        data, report = self.upsert(prev_data, parsed_data, keys)
+
+        if self.store is not None:
+            # Only the batch is written, prev_data may hold just the part of the history in use
+            report = self.store.upsert(caption_type, period, parsed_data)
+        else:
+            # Written aside and swapped in, a crash never leaves a half-written file
+            tmp_path = f'{path}.tmp'
+            data.to_csv(tmp_path, index=False, sep=';')
+            os.replace(tmp_path, path)
+
+        self.reports[item] = report
+        logger.info(f'Upsert of {item}: {report.summary()}.')
+
+        return data
 
     def update_month_data(self,
             prev_data: pd.DataFrame,
             parsed_data: pd.DataFrame,
-            path: str,
+            path: str | None,
             caption_type: str
             ) -> pd.DataFrame:
-        
+        """
+        :param path: Data file of the region, None with a store.
+        """
+
         logger.info(f'START: Update monthly data for IPO in {caption_type} region.')
-        
-        for i in range(len(parsed_data)):
-            row = parsed_data.iloc[i]
-            year = row['Year']
-            month = row['Month']
-            if ((prev_data['Year'] == row['Year']) & (prev_data['Month'] == row['Month'])).any():
-                prev_data.loc[(prev_data['Year'] == year) & (prev_data['Month'] == month), ['Quantity']] = row['Quantity']
-            else:
-                prev_data = pd.concat([prev_data, pd.DataFrame([row])], axis=0, ignore_index=True)
-        
-        prev_data.to_csv(path, index=False, sep=';')
+
+        prev_data = self._update(prev_data, parsed_data, ['Year', 'Month'], path, 'month', caption_type)
 
         logger.info(f'END: Update monthly data for IPO in {caption_type} region.')
 
         return prev_data
-    
+
     def update_year_data(self,
             prev_data: pd.DataFrame,
             parsed_data: pd.DataFrame,
-            path: str, 
+            path: str | None,
             caption_type: str
             ) -> pd.DataFrame:
-        
-        logger.info(f'START: Update yearly data for IPO in {caption_type} region.')
+        """
+        :param path: Data file of the region, None with a store.
+        """
 
-        for i in range(len(parsed_data)):
-            row = parsed_data.iloc[i]
-            year = row['Year']
-            if (prev_data['Year'] == row['Year']).any():
-                prev_data.loc[(prev_data['Year'] == year), ['Quantity']] = row['Quantity']
-            else:
-                prev_data = pd.concat([prev_data, pd.DataFrame([row])], axis=0, ignore_index=True)
+        logger.info(f'START: Update yearly data for IPO in {caption_type} region.')
 
-        prev_data.to_csv(path, index=False, sep=';')
+        prev_data = self._update(prev_data, parsed_data, ['Year'], path, 'year', caption_type)
 
         logger.info(f'END: Update yearly data for IPO in {caption_type} region.')
 
         return prev_data
-
-
-    
\ No newline at end of file
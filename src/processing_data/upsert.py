@@ -0,0 +1,78 @@
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+
+@dataclass
+class UpsertReport:
+    """
+    Keys touched by an upsert.
+
+    :param inserted: Keys that were not stored and were appended.
+    :param updated: Stored keys whose value changed.
+    :param unchanged: Stored keys that got the same value again.
+    """
+    inserted: list[tuple] = field(default_factory=list)
+    updated: list[tuple] = field(default_factory=list)
+    unchanged: list[tuple] = field(default_factory=list)
+
+    def summary(self) -> str:
+        return f'{len(self.inserted)} inserted, {len(self.updated)} updated, {len(self.unchanged)} unchanged'
+
+
+def _key_index(df: pd.DataFrame, keys: list[str]) -> pd.Index:
+    if len(keys) == 1:
+        return pd.Index(df[keys[0]], name=keys[0])
+    return pd.MultiIndex.from_frame(df[keys])
+
+
+def _key_list(index: pd.Index) -> list[tuple]:
+    # Zipping the levels is much faster than materializing the MultiIndex tuples
+    return list(zip(*(index.get_level_values(level).tolist() for level in range(index.nlevels))))
+
+
+def upsert(prev: pd.DataFrame,
+           parsed: pd.DataFrame,
+           keys: list[str],
+           value: str = 'Quantity'
+           ) -> tuple[pd.DataFrame, UpsertReport]:
+    """
+    Merges a batch of aggregates into the stored ones in one indexed operation.
+
+    Stored rows keep their order and get the parsed value of their key; keys that are not
+    stored are appended in the order of the batch. A key repeated in the batch takes its last value.
+
+    :param prev: Stored rows, e.g. (Year, Month, Quantity) or (Region, Year, Month, Quantity).
+    :param parsed: Rows to merge, with the same key columns and ``value``.
+    :param keys: Key columns.
+    :param value: Column with the aggregate.
+    :return: The merged rows and the report of the keys inserted, updated and unchanged.
+    """
+    parsed = parsed.drop_duplicates(subset=keys, keep='last')
+    if not prev.empty:
+        # Keys read from CSV and computed keys may differ in width (int64 and int32)
+        parsed = parsed.astype({key: prev[key].dtype for key in keys})
+
+    parsed_values = pd.Series(parsed[value].to_numpy(), index=_key_index(parsed, keys))
+    prev_index = _key_index(prev, keys)
+
+    new_values = parsed_values.reindex(prev_index)
+    matched = new_values.notna().to_numpy()
+    changed = matched & (new_values.to_numpy() != prev[value].to_numpy())
+
+    merged = prev.copy()
+    if changed.any():
+        merged.loc[changed, value] = new_values.to_numpy()[changed].astype(prev[value].dtype)
+
+    stored = parsed_values.index.isin(prev_index)
+    inserted = parsed[~stored]
+    if not inserted.empty:
+        merged = pd.concat([merged, inserted], axis=0, ignore_index=True) if not merged.empty else inserted.reset_index(drop=True)
+
+    report = UpsertReport(
+        inserted=_key_list(parsed_values.index[~stored]),
+        updated=_key_list(prev_index[changed].unique()),
+        unchanged=_key_list(prev_index[matched & ~changed].unique()),
+    )
+
+    return merged, report
@@ -0,0 +1,137 @@
+import json
+import os
+import shutil
+import time
+from io import BytesIO
+
+import pandas as pd
+import pendulum
+from loguru import logger
+
+STAGES = ['parsed', 'validated', 'aggregated', 'rendered', 'sent']
+
+
+class RunCheckpoint:
+    def __init__(self,
+                 state_dir: str,
+                 run_id: str | None = None,
+                 save_interval: float = 5.0
+                 ) -> None:
+        """
+        Progress of one run of the pipeline, kept on disk so a failed run resumes where it stopped.
+
+        The state file lists the fetched pages (response cache keys) and the finished stages,
+        each stage by item (region, plot); stage results that are needed later (validated
+        counts, rendered plots) are stored next to it. A state left by another run id
+        (by default, another day) is discarded.
+
+        :param state_dir: Directory of the state file and the stored results.
+        :param run_id: Identifier of the run, today's date (Moscow) by default.
+        :param save_interval: Minimum seconds between saves triggered by fetched pages.
+        """
+        self.state_dir = state_dir
+        self.run_id = run_id or pendulum.now('Europe/Moscow').to_date_string()
+        self._save_interval = save_interval
+        self._state_path = os.path.join(state_dir, 'state.json')
+        self._saved = time.monotonic()
+
+        state = None
+        if os.path.isfile(self._state_path):
+            try:
+                with open(self._state_path, 'r', encoding='utf-8') as file:
+                    state = json.load(file)
+            except Exception as e:
+                logger.warning(f'Run checkpoint is unreadable and will be reset: {e}')
+
+        if state is not None and state.get('run_id') == self.run_id:
+            self._state = state
+            logger.info(f'Resuming run {self.run_id}: {self.summary()}.')
+        else:
+            if state is not None:
+                shutil.rmtree(state_dir, ignore_errors=True)
+            self._state = {'run_id': self.run_id, 'pages': [], 'stages': {stage: [] for stage in STAGES}, 'data': dict()}
+        self._pages = set(self._state['pages'])
+
+        os.makedirs(state_dir, exist_ok=True)
+
+    def summary(self) -> str:
+        stages = ', '.join(f'{stage}: {len(items)}' for stage, items in self._state['stages'].items())
+        return f'{len(self._state["pages"])} pages, {stages}'
+
+    # ===== Pages =====
+
+    def has_page(self, key: str) -> bool:
+        return key in self._pages
+
+    def add_page(self, key: str) -> bool:
+        """
+        Records a fetched page.
+
+        :return: True when a save is due; the caller persists the pages first, then the checkpoint.
+        """
+        if key not in self._pages:
+            self._pages.add(key)
+            self._state['pages'].append(key)
+        return time.monotonic() - self._saved >= self._save_interval
+
+    # ===== Stages =====
+
+    def is_done(self, stage: str, item: str) -> bool:
+        return item in self._state['stages'][stage]
+
+    def mark_done(self, stage: str, item: str, data: dict | None = None) -> None:
+        """
+        Marks an item of a stage finished and saves the checkpoint.
+
+        :param data: JSON-serializable details needed on resume (e.g. a crawl watermark).
+        """
+        if item not in self._state['stages'][stage]:
+            self._state['stages'][stage].append(item)
+        if data is not None:
+            self._state['data'][f'{stage}:{item}'] = data
+        self.save()
+
+    def reset(self, stage: str, item: str) -> None:
+        """
+        Marks an item of a stage to be done again, e.g. a plot whose data changed, and saves the checkpoint.
+        """
+        if item in self._state['stages'][stage]:
+            self._state['stages'][stage].remove(item)
+            self._state['data'].pop(f'{stage}:{item}', None)
+            self.save()
+
+    def get_data(self, stage: str, item: str) -> dict | None:
+        return self._state['data'].get(f'{stage}:{item}')
+
+    def _result_path(self, name: str) -> str:
+        return os.path.join(self.state_dir, name)
+
+    def save_frame(self, name: str, df: pd.DataFrame) -> None:
+        df.to_csv(self._result_path(f'{name}.csv'), index=False, sep=';')
+
+    def load_frame(self, name: str) -> pd.DataFrame:
+        return pd.read_csv(self._result_path(f'{name}.csv'), sep=';')
+
+    def save_buffer(self, name: str, buf: BytesIO) -> None:
+        with open(self._result_path(name), 'wb') as file:
+            file.write(buf.getvalue())
+
+    def load_buffer(self, name: str) -> BytesIO:
+        with open(self._result_path(name), 'rb') as file:
+            return BytesIO(file.read())
+
+    def save(self) -> None:
+        # Written aside and swapped in, a crash never leaves a half-written state
+        tmp_path = f'{self._state_path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(self._state, file, ensure_ascii=False)
+        os.replace(tmp_path, self._state_path)
+        self._saved = time.monotonic()
+
+    def discard(self) -> None:
+        """
+        Removes the checkpoint of a finished run, the next run of the day starts anew.
+        """
+        shutil.rmtree(self.state_dir, ignore_errors=True)
+        self._pages = set()
+        self._state = {'run_id': self.run_id, 'pages': [], 'stages': {stage: [] for stage in STAGES}, 'data': dict()}
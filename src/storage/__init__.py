@@ -0,0 +1,7 @@
+from .aggregate_store import AggregateStore
+from .event_store import EventStore
+
+__all__ = [
+    'AggregateStore',
+    'EventStore'
+]
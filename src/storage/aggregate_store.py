@@ -0,0 +1,166 @@
+import calendar
+import os
+
+import pandas as pd
+import pendulum
+from loguru import logger
+
+from ..processing_data.upsert import UpsertReport
+from .sqlite_store import SqliteStore
+
+MONTH_NUMBERS = {name: number for number, name in enumerate(calendar.month_name) if name}
+
+# Granularity -> table and its key columns after the region, as (column, data file column)
+TABLES = {
+    'month': ('month_counts', [('year', 'Year'), ('month', 'Month')]),
+    'year': ('year_counts', [('year', 'Year')]),
+}
+
+# The primary keys are the indexes: rows of a region are stored together, ordered by date
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS month_counts (
+    region TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    month INTEGER NOT NULL CHECK (month BETWEEN 1 AND 12),
+    quantity INTEGER NOT NULL,
+    PRIMARY KEY (region, year, month)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS year_counts (
+    region TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    quantity INTEGER NOT NULL,
+    PRIMARY KEY (region, year)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS migrations (
+    name TEXT PRIMARY KEY,
+    applied_at TEXT NOT NULL
+);
+"""
+
+
+class AggregateStore(SqliteStore):
+    """
+    IPO counts of every region by month and by year, kept in an SQLite database.
+
+    Reads are range scans of the primary key of one region, upserts look up and write
+    only the keys of their batch, so neither depends on the length of the stored history.
+    Every upsert is a transaction; several of them are made atomic together with transaction().
+    """
+    SCHEMA = _SCHEMA
+
+    def read(self,
+             region: str,
+             period: str,
+             since_year: int | None = None
+             ) -> pd.DataFrame:
+        """
+        Reads the stored counts of a region in the layout of the data files, ordered by date.
+
+        :param region: Region, e.g. 'US'.
+        :param period: 'month' or 'year'.
+        :param since_year: First year read, all of them by default.
+        :return: Year, Month (a name) and Quantity columns; Year and Quantity for 'year'.
+        """
+        table, keys = TABLES[period]
+        columns = [column for column, _ in keys]
+        rows = self._connection.execute(
+            f'SELECT {", ".join(columns)}, quantity FROM {table} '
+            f'WHERE region = ? AND year >= ? ORDER BY {", ".join(columns)}',
+            (region, since_year if since_year is not None else -1),
+        ).fetchall()
+
+        df = pd.DataFrame(rows, columns=[name for _, name in keys] + ['Quantity'])
+        df = df.astype({'Year': 'int64', 'Quantity': 'int64'})
+        if period == 'month':
+            df['Month'] = df['Month'].map(dict(enumerate(calendar.month_name))).astype(object)
+
+        return df
+
+    def upsert(self,
+               region: str,
+               period: str,
+               df: pd.DataFrame
+               ) -> UpsertReport:
+        """
+        Writes a batch of counts of a region: new keys are inserted, stored ones get the new quantity.
+        A key repeated in the batch takes its last quantity.
+
+        :param region: Region, e.g. 'US'.
+        :param period: 'month' or 'year'.
+        :param df: Counts in the layout of the data files.
+        :return: The keys inserted, updated and left unchanged.
+        """
+        table, keys = TABLES[period]
+        columns = [column for column, _ in keys]
+        names = [name for _, name in keys]
+
+        batch = df.drop_duplicates(subset=names, keep='last')
+        report_keys = list(batch[names].itertuples(index=False, name=None))
+        values = [batch['Year'].astype('int64').tolist()]
+        if period == 'month':
+            months = batch['Month'].map(MONTH_NUMBERS)
+            if months.isna().any():
+                raise ValueError(f'Unknown months in the counts of {region}: {sorted(set(batch["Month"][months.isna()]))}')
+            values.append(months.astype('int64').tolist())
+        batch_keys = list(zip(*values))
+        quantities = batch['Quantity'].astype('int64').tolist()
+
+        report = UpsertReport()
+        if not batch_keys:
+            return report
+
+        with self.transaction():
+            # The batch covers a few recent years, only they are looked up
+            stored = {
+                tuple(row[:-1]): row[-1]
+                for row in self._connection.execute(
+                    f'SELECT {", ".join(columns)}, quantity FROM {table} WHERE region = ? AND year BETWEEN ? AND ?',
+                    (region, min(values[0]), max(values[0])),
+                )
+            }
+
+            changes = []
+            for key, report_key, quantity in zip(batch_keys, report_keys, quantities):
+                stored_quantity = stored.get(key)
+                if stored_quantity is None:
+                    report.inserted.append(report_key)
+                elif stored_quantity != quantity:
+                    report.updated.append(report_key)
+                else:
+                    report.unchanged.append(report_key)
+                    continue
+                changes.append((region, *key, quantity))
+
+            self._connection.executemany(
+                f'INSERT INTO {table} (region, {", ".join(columns)}, quantity) VALUES (?, {", ".join("?" * len(columns))}, ?) '
+                f'ON CONFLICT (region, {", ".join(columns)}) DO UPDATE SET quantity = excluded.quantity',
+                changes,
+            )
+
+        return report
+
+    def migrate_csv(self, files: dict[tuple[str, str], str]) -> None:
+        """
+        Imports the semicolon data files once; a file already imported is skipped,
+        so the files can stay in place after the migration.
+
+        :param files: ``{(region, period): path}`` of the data files.
+        """
+        for (region, period), path in files.items():
+            name = f'csv:{period}:{region}'
+            if self._connection.execute('SELECT 1 FROM migrations WHERE name = ?', (name,)).fetchone() is not None:
+                continue
+            if not os.path.isfile(path):
+                logger.warning(f'Data file {path} of {region} region is missing, nothing to migrate.')
+                continue
+
+            df = pd.read_csv(path, sep=';')
+            with self.transaction():
+                report = self.upsert(region, period, df)
+                self._connection.execute(
+                    'INSERT INTO migrations (name, applied_at) VALUES (?, ?)',
+                    (name, pendulum.now('Europe/Moscow').to_iso8601_string()),
+                )
+            logger.info(f'Migrated {path} into the store: {report.summary()}.')
@@ -0,0 +1,240 @@
+import calendar
+import hashlib
+
+import pandas as pd
+import pendulum
+from loguru import logger
+
+from ..utils.company_names import normalize_name
+from .sqlite_store import SqliteStore
+
+# Parsed columns of every source renamed to the event fields; 'region' is the country
+# column of sources crawling several countries
+SOURCES = {
+    'euronext': {'Date': 'date', 'Company name': 'company', 'Location': 'exchange'},
+    'preqveca': {'Дата окончания размещения': 'date', 'Название IPO / SPO': 'company', 'Цена размещения': 'price'},
+    'investings': {'Страна': 'region', 'Дата IPO': 'date', 'Компания': 'company', 'Биржа': 'exchange', 'Цена IPO': 'price'},
+    'stockanalysis': {'IPO Date': 'date', 'Company Name': 'company', 'IPO Price': 'price'},
+}
+
+FIELDS = ['source', 'region', 'company', 'exchange', 'date', 'price']
+
+# Events are keyed by the hash of their identity, a re-crawled event is ignored; the monthly
+# counts of every source and region follow the appended events in a trigger
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ipo_events (
+    event_key INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    region TEXT NOT NULL,
+    company TEXT NOT NULL,
+    exchange TEXT,
+    date TEXT NOT NULL,
+    price REAL,
+    recorded_at TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS ipo_events_region_date ON ipo_events (region, date);
+
+CREATE TABLE IF NOT EXISTS event_month_counts (
+    source TEXT NOT NULL,
+    region TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    month INTEGER NOT NULL,
+    quantity INTEGER NOT NULL,
+    PRIMARY KEY (source, region, year, month)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS ipo_events_count AFTER INSERT ON ipo_events
+BEGIN
+    INSERT INTO event_month_counts (source, region, year, month, quantity)
+    VALUES (NEW.source, NEW.region, CAST(substr(NEW.date, 1, 4) AS INTEGER), CAST(substr(NEW.date, 6, 2) AS INTEGER), 1)
+    ON CONFLICT (source, region, year, month) DO UPDATE SET quantity = quantity + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS ipo_events_no_update BEFORE UPDATE ON ipo_events
+BEGIN
+    SELECT RAISE(ABORT, 'IPO events are append-only');
+END;
+"""
+
+_NO_DELETE = """
+CREATE TRIGGER IF NOT EXISTS ipo_events_no_delete BEFORE DELETE ON ipo_events
+BEGIN
+    SELECT RAISE(ABORT, 'IPO events are append-only');
+END;
+"""
+
+# Version of the event keys, stored in PRAGMA user_version; keys of older versions are recomputed on open
+KEY_VERSION = 1
+
+
+def normalize_company(name: str) -> str:
+    return ' '.join(name.split())
+
+
+def event_key(source: str, region: str, company: str, date: str) -> int:
+    """
+    Signed 64-bit hash of the identity of an event: source, region, company and date.
+    The company is compared as ``EntityIndex`` does, through ``normalize_name``
+    (case, accents, quotes, punctuation and legal forms aside).
+
+    :param company: Name as stored in the event.
+    """
+    identity = '\x1f'.join((source, region, normalize_name(company) or company.casefold(), date))
+    return int.from_bytes(hashlib.blake2b(identity.encode('utf-8'), digest_size=8).digest(), 'big', signed=True)
+
+
+class EventStore(SqliteStore):
+    """
+    Append-only store of the parsed IPOs of every source, kept in an SQLite database.
+
+    Every parsed row is kept as an event (source, region, company, exchange, date, price).
+    Events are indexed on (region, date), an event crawled again is recognized by its key and
+    not stored twice. Monthly counts are kept up to date as events are appended, so the
+    counts of the whole history are read without a crawl.
+    """
+    SCHEMA = _SCHEMA + _NO_DELETE
+
+    def __init__(self, path: str) -> None:
+        super().__init__(path)
+        if self._connection.execute('PRAGMA user_version').fetchone()[0] < KEY_VERSION:
+            self._rekey()
+
+    def _rekey(self) -> None:
+        """
+        Recomputes the keys of events stored with an older identity; events that now share
+        a key are kept once (the first recorded) and the monthly counts are rebuilt.
+        """
+        rows = self._connection.execute(
+            'SELECT source, region, company, exchange, date, price, recorded_at FROM ipo_events ORDER BY recorded_at, rowid'
+        ).fetchall()
+
+        with self.transaction():
+            self._connection.execute('DROP TRIGGER ipo_events_no_delete')
+            self._connection.execute('DELETE FROM ipo_events')
+            self._connection.execute('DELETE FROM event_month_counts')
+            self._connection.execute(_NO_DELETE)
+            self._connection.executemany(
+                'INSERT OR IGNORE INTO ipo_events (event_key, source, region, company, exchange, date, price, recorded_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                [(event_key(row[0], row[1], row[2], row[4]), *row) for row in rows],
+            )
+            self._connection.execute(f'PRAGMA user_version = {KEY_VERSION}')
+
+        if rows:
+            kept = self._connection.execute('SELECT COUNT(*) FROM ipo_events').fetchone()[0]
+            logger.info(f'IPO events re-keyed: {kept} of {len(rows)} kept.')
+
+    @staticmethod
+    def normalize(source: str,
+                  region: str,
+                  batch: pd.DataFrame
+                  ) -> pd.DataFrame:
+        """
+        Turns parsed rows into events; rows without a date or a company are dropped.
+
+        :param source: Key of the source in ``SOURCES``.
+        :param region: Region of the rows, unless the source gives a country per row.
+        :param batch: Rows as a parser yields them, optional columns may be missing.
+        :return: Frame of ``FIELDS``, dates as 'YYYY-MM-DD' text.
+        """
+        columns = {name: field for name, field in SOURCES[source].items() if name in batch.columns}
+        df = batch[list(columns)].rename(columns=columns)
+
+        # Parsers decode the dates, text comes only from frames restored from a checkpoint (ISO)
+        dates = df['date'] if pd.api.types.is_datetime64_any_dtype(df['date']) else pd.to_datetime(df['date'], errors='coerce')
+        companies = df['company'].astype(object).where(df['company'].notna(), '').map(normalize_company)
+
+        events = pd.DataFrame({
+            'source': source,
+            'region': df['region'].astype(object) if 'region' in df.columns else region,
+            'company': companies,
+            'exchange': df['exchange'].astype(object).where(df['exchange'].notna(), None) if 'exchange' in df.columns else None,
+            'date': dates.dt.strftime('%Y-%m-%d'),
+            'price': df['price'].astype(float) if 'price' in df.columns else float('nan'),
+        }, index=df.index)
+        events = events[dates.notna() & (companies != '')]
+
+        return events.reset_index(drop=True)
+
+    def append(self,
+               source: str,
+               region: str,
+               batch: pd.DataFrame
+               ) -> int:
+        """
+        Appends parsed rows of a source as events in one transaction.
+
+        :return: Number of new events, rows seen before are skipped.
+        """
+        events = self.normalize(source, region, batch)
+        if events.empty:
+            return 0
+
+        recorded_at = pendulum.now('Europe/Moscow').to_iso8601_string()
+        rows = [
+            (event_key(source, event_region, company, date), source, event_region, company,
+             exchange or None, date, None if pd.isna(price) else float(price), recorded_at)
+            for event_region, company, exchange, date, price in events[['region', 'company', 'exchange', 'date', 'price']].itertuples(index=False, name=None)
+        ]
+
+        with self.transaction():
+            cursor = self._connection.executemany(
+                'INSERT OR IGNORE INTO ipo_events (event_key, source, region, company, exchange, date, price, recorded_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                rows,
+            )
+
+        return cursor.rowcount
+
+    def events(self,
+               region: str,
+               start: pendulum.Date | None = None,
+               end: pendulum.Date | None = None
+               ) -> pd.DataFrame:
+        """
+        Reads the events of a region between two dates (both included), ordered by date.
+
+        :return: Frame of ``FIELDS``.
+        """
+        rows = self._connection.execute(
+            f'SELECT {", ".join(FIELDS)} FROM ipo_events WHERE region = ? AND date BETWEEN ? AND ? ORDER BY date',
+            (region, start.to_date_string() if start is not None else '', end.to_date_string() if end is not None else '9999'),
+        ).fetchall()
+
+        return pd.DataFrame(rows, columns=FIELDS)
+
+    def month_counts(self,
+                     source: str,
+                     region: str,
+                     since_year: int | None = None
+                     ) -> pd.DataFrame:
+        """
+        Reads the IPOs of a region in a source by month, in the layout of the monthly data files.
+        """
+        rows = self._connection.execute(
+            'SELECT year, month, quantity FROM event_month_counts '
+            'WHERE source = ? AND region = ? AND year >= ? ORDER BY year, month',
+            (source, region, since_year if since_year is not None else -1),
+        ).fetchall()
+
+        df = pd.DataFrame(rows, columns=['Year', 'Month', 'Quantity']).astype({'Year': 'int64', 'Quantity': 'int64'})
+        df['Month'] = df['Month'].map(dict(enumerate(calendar.month_name))).astype(object)
+
+        return df
+
+    def year_counts(self,
+                    source: str,
+                    region: str,
+                    since_year: int | None = None
+                    ) -> pd.DataFrame:
+        """
+        Reads the IPOs of a region in a source by year, in the layout of the yearly data files.
+        """
+        rows = self._connection.execute(
+            'SELECT year, SUM(quantity) FROM event_month_counts '
+            'WHERE source = ? AND region = ? AND year >= ? GROUP BY year ORDER BY year',
+            (source, region, since_year if since_year is not None else -1),
+        ).fetchall()
+
+        return pd.DataFrame(rows, columns=['Year', 'Quantity']).astype({'Year': 'int64', 'Quantity': 'int64'})
@@ -0,0 +1,46 @@
+import os
+import sqlite3
+from contextlib import contextmanager
+from typing import Iterator
+
+
+class SqliteStore:
+    # Tables and indexes of the store, created when missing
+    SCHEMA = ''
+
+    def __init__(self, path: str) -> None:
+        """
+        Connection to an SQLite database shared by the stores (WAL journal, explicit transactions).
+
+        :param path: Path of the database file, created with the tables of the store when missing.
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Transactions are opened explicitly
+        self._connection = sqlite3.connect(path, isolation_level=None)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.executescript(self.SCHEMA)
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """
+        Commits everything written inside the block at once, or nothing if it raises.
+        A transaction opened inside another one joins it.
+        """
+        if self._connection.in_transaction:
+            yield
+            return
+
+        self._connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except BaseException:
+            self._connection.execute('ROLLBACK')
+            raise
+        self._connection.execute('COMMIT')
+
+    def close(self) -> None:
+        self._connection.close()
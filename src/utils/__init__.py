@@ -1,7 +1,9 @@
 from .file_validator import FileValidator
 from .file_handler import FileHandler
+from .company_names import normalize_name
 
 __all__ = [
     "FileValidator",
     "FileHandler",
+    "normalize_name",
 ]
@@ -0,0 +1,40 @@
+import re
+import unicodedata
+
+# Legal forms dropped from the end of a company name, Russian ones from its start as well
+LEGAL_FORMS = {
+    'inc', 'incorporated', 'corp', 'corporation', 'co', 'company', 'ltd', 'limited', 'llc', 'lp', 'plc',
+    'sa', 'ag', 'nv', 'se', 'spa', 'ab', 'asa', 'oyj', 'as', 'bv', 'pjsc', 'jsc',
+}
+RUSSIAN_LEGAL_FORMS = {'пао', 'ао', 'оао', 'зао', 'ооо', 'мкпао'}
+
+_SUFFIXES = LEGAL_FORMS | RUSSIAN_LEGAL_FORMS
+_WORD = re.compile(r'\w+')
+
+
+def normalize_name(name: str) -> str:
+    """
+    Reduces a company name to its words: accents, case, punctuation, quotes and legal forms aside,
+    e.g. 'ПАО «Сбербанк»' -> 'сбербанк', 'Nestlé S.A.' -> 'nestle'.
+    """
+    text = name
+    if not text.isascii():
+        text = ''.join(char for char in unicodedata.normalize('NFKD', text) if not unicodedata.combining(char))
+    # Runs of single letters are abbreviations written with dots or spaces ('S.A.', 'N V')
+    words = []
+    letters = False
+    for word in _WORD.findall(text.casefold()):
+        if len(word) == 1 and word.isalpha():
+            if letters:
+                words[-1] += word
+            else:
+                words.append(word)
+            letters = True
+        else:
+            words.append(word)
+            letters = False
+    while words and words[-1] in _SUFFIXES:
+        words.pop()
+    while words and words[0] in RUSSIAN_LEGAL_FORMS:
+        words.pop(0)
+    return ' '.join(words)
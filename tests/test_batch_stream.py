@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+
+from src.parsing_data.batch_stream import merge_streams
+
+
+async def _produce(count: int):
+    for i in range(count):
+        yield i
+
+
+async def _fail(delay: float):
+    await asyncio.sleep(delay)
+    raise RuntimeError('page failed')
+    yield
+
+
+def test_error_reaches_consumer_while_producers_wait_on_full_queue():
+    async def consume():
+        async for _ in merge_streams(_produce(1000), _produce(1000), _fail(0.05)):
+            # A slow consumer keeps the queue full, the producers are blocked on put
+            await asyncio.sleep(0.01)
+
+    with pytest.raises(RuntimeError, match='page failed'):
+        asyncio.run(asyncio.wait_for(consume(), timeout=5))
+
+
+def test_yields_every_item_of_every_stream():
+    async def consume():
+        return [item async for item in merge_streams(_produce(50), _produce(30))]
+
+    assert sorted(asyncio.run(consume())) == sorted(list(range(50)) + list(range(30)))
+
+
+def test_ordered_yields_in_stream_order_whatever_the_arrival():
+    async def delayed(name: str, delay: float, count: int):
+        await asyncio.sleep(delay)
+        for i in range(count):
+            yield f'{name}{i}'
+
+    async def consume():
+        streams = [delayed('a', 0.03, 2), delayed('b', 0.0, 3), delayed('c', 0.01, 1)]
+        return [item async for item in merge_streams(*streams, ordered=True)]
+
+    assert asyncio.run(consume()) == ['a0', 'a1', 'b0', 'b1', 'b2', 'c0']
@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+
+from src.parsing_data.column_builder import Column, ColumnBuilder
+
+
+@pytest.mark.parametrize('text, number', [
+    ('1,250', 1250.0),
+    ('$1,250', 1250.0),
+    ('1 250,5', 1250.5),
+    ('1,250.00', 1250.0),
+    ('$17.00', 17.0),
+    ('15.00 - 17.00', 15.0),
+    ('12,5 ₽', 12.5),
+    ('1,250,000', 1250000.0),
+    ('-', np.nan),
+    ('', np.nan),
+])
+def test_number_column_decodes_separators(text, number):
+    builder = ColumnBuilder([Column('Price', kind='number')])
+    builder.append([text])
+
+    assert builder.to_frame()['Price'].tolist() == pytest.approx([number], nan_ok=True)
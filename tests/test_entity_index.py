@@ -0,0 +1,44 @@
+import pandas as pd
+import pytest
+
+from src.parsing_data.entity_index import EntityIndex
+from src.utils.company_names import normalize_name
+
+
+@pytest.mark.parametrize('name, normalized', [
+    ('ПАО «Сбербанк»', 'сбербанк'),
+    ('ПАО "Сбербанк"', 'сбербанк'),
+    ('Nestlé S.A.', 'nestle'),
+    ('Acme Holdings, Inc.', 'acme holdings'),
+    ('Co-Diagnostics', 'co diagnostics'),
+])
+def test_normalize_name(name, normalized):
+    assert normalize_name(name) == normalized
+
+
+# (source, region, company, date) added in order -> kept, and the duplicates and matches counted
+@pytest.mark.parametrize('rows, kept, duplicates, matches', [
+    # The same IPO on two pages of a source is kept once
+    ([('euronext', 'Europe', 'Acme SA', '2025-01-02'), ('euronext', 'Europe', 'ACME S.A.', '2025-01-02')],
+     [True, False], {'euronext': 1}, 0),
+    # Another day is another IPO
+    ([('euronext', 'Europe', 'Acme SA', '2025-01-02'), ('euronext', 'Europe', 'Acme SA', '2025-01-03')],
+     [True, True], {}, 0),
+    # Another source listing it is a match, both rows are kept
+    ([('stockanalysis', 'US', 'Acme Inc.', '2025-01-02'), ('investings', 'US', 'Acme', '2025-01-02')],
+     [True, True], {}, 1),
+    # Rows without a company or a date are kept and not indexed
+    ([('preqveca', 'Russia', None, '2025-01-02'), ('preqveca', 'Russia', None, '2025-01-02'),
+      ('preqveca', 'Russia', 'X', None), ('preqveca', 'Russia', 'X', None)],
+     [True, True, True, True], {}, 0),
+])
+def test_entity_index_drops_duplicates_within_a_source(rows, kept, duplicates, matches):
+    index = EntityIndex()
+    mask = [
+        bool(index.add(source, region, [company], pd.Series(pd.to_datetime([date])))[0])
+        for source, region, company, date in rows
+    ]
+
+    assert mask == kept
+    assert dict(index.duplicates) == duplicates
+    assert sum(index.matches.values()) == matches
@@ -0,0 +1,54 @@
+import asyncio
+from urllib.parse import parse_qs
+
+import httpx
+import pendulum
+import pytest
+
+from src.parsing_data.investings_parser import InvestingsParser
+
+
+class CalendarTransport:
+    """
+    Answers the calendar queries with one row per listing of the window, cut at the row cap.
+    """
+
+    def __init__(self, listings: dict[str, int]) -> None:
+        self.listings = listings
+        self.windows = []
+
+    async def post(self, url: str, data, headers: dict) -> httpx.Response:
+        form = parse_qs(str(data))
+        start, end = form['dateFrom'][0], form['dateTo'][0]
+        self.windows.append((start, end))
+
+        rows = [
+            f'<tr><td>{day}</td><td><span class="elp">Company {day} {number}</span></td>'
+            f'<td>SSE</td><td></td><td>10.5</td></tr>'
+            for day, count in sorted(self.listings.items()) if start <= day <= end
+            for number in range(count)
+        ][:InvestingsParser.ROW_CAP]
+
+        request = httpx.Request('POST', url)
+        return httpx.Response(200, json={'data': ''.join(rows)}, request=request)
+
+
+def crawl(listings: dict[str, int], since: str, until: str) -> tuple[int, int]:
+    transport = CalendarTransport(listings)
+    parser = InvestingsParser(transport)
+    df, _ = asyncio.run(parser.parse_data(pendulum.parse(since).date(), pendulum.parse(until).date()))
+    return len(df), len(transport.windows)
+
+
+# listings per day -> rows collected and calendar queries made
+@pytest.mark.parametrize('listings, rows, windows', [
+    # Under the cap the range is fetched at once
+    ({'2025-01-02': 50, '2025-01-20': 149}, 199, 1),
+    # At the cap the range is split in halves until every window is under it
+    ({'2025-01-02': 150, '2025-01-30': 50}, 200, 3),
+    ({'2025-01-02': 150, '2025-01-05': 150, '2025-01-30': 10}, 310, 7),
+    # A single day at the cap cannot be split, its capped rows are kept
+    ({'2025-01-02': 250}, 200, 11),
+])
+def test_crawl_splits_windows_at_the_row_cap(listings, rows, windows):
+    assert crawl(listings, '2025-01-01', '2025-01-31') == (rows, windows)
@@ -0,0 +1,39 @@
+import pandas as pd
+import pytest
+
+from src.processing_data.upsert import upsert
+
+
+def months(*rows):
+    return pd.DataFrame(rows, columns=['Year', 'Month', 'Quantity'])
+
+
+@pytest.mark.parametrize('prev, parsed, merged, inserted, updated, unchanged', [
+    # New keys are appended in the order of the batch
+    (months((2024, 'May', 3)), months((2025, 'January', 1), (2024, 'June', 2)),
+     months((2024, 'May', 3), (2025, 'January', 1), (2024, 'June', 2)),
+     [(2025, 'January'), (2024, 'June')], [], []),
+    # Stored keys keep their place and get the parsed value
+    (months((2024, 'May', 3), (2024, 'June', 4)), months((2024, 'June', 5), (2024, 'May', 3)),
+     months((2024, 'May', 3), (2024, 'June', 5)),
+     [], [(2024, 'June')], [(2024, 'May')]),
+    # A key repeated in the batch takes its last value
+    (months((2024, 'May', 3)), months((2024, 'May', 7), (2024, 'May', 8)),
+     months((2024, 'May', 8)),
+     [], [(2024, 'May')], []),
+    # Keys missing from the batch are left as they are
+    (months((2023, 'May', 3), (2024, 'May', 1)), months((2024, 'May', 1)),
+     months((2023, 'May', 3), (2024, 'May', 1)),
+     [], [], [(2024, 'May')]),
+    # Nothing stored yet
+    (months(), months((2024, 'May', 2)),
+     months((2024, 'May', 2)),
+     [(2024, 'May')], [], []),
+])
+def test_upsert_merges_and_reports_keys(prev, parsed, merged, inserted, updated, unchanged):
+    result, report = upsert(prev, parsed, ['Year', 'Month'])
+
+    assert result.values.tolist() == merged.values.tolist()
+    assert report.inserted == inserted
+    assert report.updated == updated
+    assert report.unchanged == unchanged
@@ -0,0 +1,40 @@
+import pendulum
+import pytest
+
+from src.parsing_data.watermarks import WatermarkStore
+
+
+@pytest.mark.parametrize('last_date, margin, since', [
+    # The margin is re-crawled and the start moves back to the first day of its month
+    ('2025-03-20', 14, '2025-03-01'),
+    ('2025-03-10', 14, '2025-02-01'),
+    ('2025-01-05', 14, '2024-12-01'),
+    ('2025-03-20', 0, '2025-03-01'),
+    # Upcoming listings do not push the start past today
+    ('2025-09-30', 14, '2025-04-01'),
+])
+def test_since_covers_the_margin_in_whole_months(tmp_path, monkeypatch, last_date, margin, since):
+    today = pendulum.datetime(2025, 5, 10, tz='Europe/Moscow')
+    monkeypatch.setattr(pendulum, 'now', lambda tz=None: today)
+    store = WatermarkStore(str(tmp_path / 'watermarks.json'), safety_margin_days=margin)
+    store.update('source', pendulum.parse(last_date).date(), pages=1)
+
+    assert store.since('source') == pendulum.parse(since).date()
+
+
+def test_since_without_a_watermark(tmp_path):
+    store = WatermarkStore(str(tmp_path / 'watermarks.json'))
+    store.update('source', None, pages=0)
+
+    assert store.since('source') is None
+    assert store.since('other') is None
+
+
+def test_update_keeps_the_last_date_of_an_empty_crawl(tmp_path):
+    path = str(tmp_path / 'watermarks.json')
+    store = WatermarkStore(path)
+    store.update('source', pendulum.date(2025, 3, 20), pages=3)
+    store.update('source', None, pages=1)
+    store.save()
+
+    assert WatermarkStore(path).get('source')['last_date'] == '2025-03-20'